@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import parquet_log
+from log_store import TIMESTAMP_FORMAT, OUTCOME_COLUMN
+
+if parquet_log.available():
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+# Queries over the Parquet log (parquet_log.py).
+# Filters are pushed down to the dataset scan: the date range prunes whole
+# date=... directories, phone / emotion / outcome become Parquet row-group
+# predicates, and only the referenced columns are read.
+#
+#   python analytics.py [--since 2026-10-01] [--until 2026-10-08] [--phone +91...]
+
+# turns that mean the caller converted on the link-share bot
+CONVERTED_TURNS = ["[Product match]", "[Product match -> SMS sent]"]
+
+
+def _dataset(table):
+    path = parquet_log.table_dir(table)
+    if not os.path.isdir(path):
+        return None
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    return ds.dataset(path, format="parquet", schema=parquet_log.schema(table).append(pa.field("date", pa.string())),
+                      partitioning=partitioning, exclude_invalid_files=True)
+
+
+def parse_time(value):
+    """None, a datetime, "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"; ValueError otherwise."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    value = str(value)
+    return datetime.strptime(value, TIMESTAMP_FORMAT if len(value) > 10 else "%Y-%m-%d")
+
+
+def _filter(table, phone=None, since=None, until=None, emotion=None, outcome=None):
+    """Build the pushed-down predicate (None = everything)."""
+    conds = []
+    since, until = parse_time(since), parse_time(until)
+    if since:
+        conds.append(ds.field("date") >= since.date().isoformat())
+        conds.append(ds.field("Timestamp") >= pa.scalar(since, pa.timestamp("s")))
+    if until:
+        conds.append(ds.field("date") <= until.date().isoformat())
+        conds.append(ds.field("Timestamp") < pa.scalar(until, pa.timestamp("s")))
+    if phone:
+        conds.append(ds.field("PhoneNumber").isin(phone if isinstance(phone, (list, tuple, set)) else [phone]))
+    if emotion:
+        conds.append(ds.field("Emotion").isin(emotion if isinstance(emotion, (list, tuple, set)) else [emotion]))
+    if outcome:
+        column = OUTCOME_COLUMN[table]
+        conds.append(ds.field(column).isin(outcome if isinstance(outcome, (list, tuple, set)) else [outcome]))
+    predicate = None
+    for c in conds:
+        predicate = c if predicate is None else predicate & c
+    return predicate
+
+
+def query(table, columns=None, **filters):
+    """Filtered rows of a table as a pyarrow.Table (.to_pandas() for a DataFrame)."""
+    if not parquet_log.available():
+        raise RuntimeError("analytics needs pyarrow (pip install pyarrow)")
+    dataset = _dataset(table)
+    columns = columns or [f.name for f in parquet_log.schema(table)]
+    if dataset is None:
+        return parquet_log.schema(table).empty_table().select(columns)
+    return dataset.to_table(columns=columns, filter=_filter(table, **filters))
+
+
+def _counts(array):
+    return {str(item["values"]): item["counts"] for item in pc.value_counts(array).to_pylist()}
+
+
+def emotion_breakdown(table="turns", **filters):
+    """{emotion: count} over the filtered rows."""
+    return _counts(query(table, columns=["Emotion"], **filters)["Emotion"])
+
+
+def outcome_breakdown(table="turns", **filters):
+    column = OUTCOME_COLUMN[table]
+    return _counts(query(table, columns=[column], **filters)[column])
+
+
+def conversion(**filters):
+    """
+    Calls reached (distinct phones in the conversation log) vs converted
+    (a product link sent, or a lead saved) over the same filters.
+    """
+    filters.pop("outcome", None)
+    turns = query("turns", columns=["PhoneNumber", "Question"], **filters)
+    reached = set(pc.unique(turns["PhoneNumber"]).to_pylist())
+    converted_turns = turns.filter(pc.is_in(turns["Question"], value_set=pa.array(CONVERTED_TURNS)))
+    converted = set(pc.unique(converted_turns["PhoneNumber"]).to_pylist())
+    leads = query("leads", columns=["PhoneNumber"], **{k: v for k, v in filters.items() if k != "emotion"})
+    converted |= set(pc.unique(leads["PhoneNumber"]).to_pylist())
+    reached |= converted
+    reached.discard(None)
+    converted.discard(None)
+    return {
+        "reached": len(reached),
+        "converted": len(converted),
+        "rate": round(len(converted) / len(reached), 3) if reached else 0.0,
+    }
+
+
+def report(**filters):
+    return {
+        "conversion": conversion(**filters),
+        "emotions": emotion_breakdown(**filters),
+        "outcomes": outcome_breakdown(**filters),
+        "leads_by_interest": outcome_breakdown("leads", **{k: v for k, v in filters.items() if k != "emotion"}),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Call log analytics (Parquet)")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--phone")
+    parser.add_argument("--emotion")
+    parser.add_argument("--days", type=int, help="shortcut for --since N days ago")
+    args = parser.parse_args()
+    if not parquet_log.available():
+        print("pyarrow is not installed (pip install pyarrow)")
+        sys.exit(1)
+    if args.days:
+        args.since = (datetime.now() - timedelta(days=args.days)).strftime("%Y-%m-%d")
+    filters = {k: v for k, v in vars(args).items() if v and k != "days"}
+    started = time.perf_counter()
+    result = report(**filters)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"({1000 * (time.perf_counter() - started):.1f} ms)")
@@ -1,42 +1,51 @@
 import os
 import time
+import asyncio
+from contextlib import asynccontextmanager
 import pandas as pd
 from datetime import datetime
-import spacy
-from textblob import TextBlob
+import nlp_registry
+from emotion import detect_emotion
 import requests
-from difflib import SequenceMatcher
-from urllib.parse import quote
 import uvicorn
 from fastapi import FastAPI, Form, Response, Query, Request, BackgroundTasks
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from twilio.rest import Client
 from dotenv import load_dotenv
+import llm_client
+from translation_memory import translation_memory
+from keyword_matcher import KeywordMatcher
+from product_index import ProductIndex
+import state_token
+from state_token import StateCodec, StateTokenError, SmallInt, Flag, Phone
+from twiml_cache import TwimlCache
+from log_store import log_store
+from log_pipeline import log_pipeline
 
 #  NLP & Spacy 
-nlp = spacy.load("en_core_web_sm")
+# loaded on first use and shared by every router (see nlp_registry)
+nlp = nlp_registry.lazy("en_core_web_sm")
 
 # model alias used for translation 
-OLLAMA_MODEL = "gemma2:9b-q4_K_M"
+OLLAMA_MODEL = llm_client.TRANSLATE_MODEL
 
-# translate any English text to Hindi 
+# translate any English text to Hindi (remembered in translation_memory.json)
 def translate_to_hindi(text: str) -> str:
     """
     Translate English to natural, conversational Hindi for phone calls.
+    Known strings come from the translation memory; only new text hits the LLM.
     If translation fails, returns original English text.
     """
+    return translation_memory.translate(text, _translate_llm)
+
+def _translate_llm(text: str) -> str:
     prompt = (
         "Translate the following English text into natural spoken Hindi for a phone call. "
         "Keep it concise and friendly. Do not add extra words.\n\n"
         f"English: {text}\n\nHindi:"
     )
     try:
-        r = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": OLLAMA_MODEL, "prompt": prompt},
-            timeout=15
-        )
-        return r.json().get("response", "").strip() or text
+        return llm_client.generate(prompt, model=OLLAMA_MODEL, timeout=15) or text
     except Exception as e:
         print("Translation error:", e)
         return text
@@ -44,25 +53,11 @@ def translate_to_hindi(text: str) -> str:
 # prefer Gemma2 9B quantized for any generation 
 def ai_response(prompt, model_name=OLLAMA_MODEL):
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model_name, "prompt": prompt},
-            timeout=15
-        )
-        return response.json().get("response","").strip() or "I'm sorry, I didn’t catch that."
+        return llm_client.generate(prompt, model=model_name, timeout=15) or "I'm sorry, I didn’t catch that."
     except Exception as e:
         print("Ollama Error:", e)
         return "I'm sorry, I didn’t catch that."
 
-# Emotion detection 
-def detect_emotion(text):
-    blob = TextBlob(text)
-    s = blob.sentiment.polarity
-    if s > 0.3:
-        return "happy"
-    elif s < -0.3:
-        return "angry"
-    return "neutral"
 
 #  Load products from Excel 
 def load_products():
@@ -80,6 +75,15 @@ def load_products():
     print(f"Loaded {len(products)} products successfully from {excel_path}.")
     return products
 
+# greeting per time of day (all four are pre-translated at startup)
+GREETINGS_EN = ["Good morning!", "Good afternoon!", "Good evening!", "Hello!"]
+
+def greeting_en(greet_en):
+    return (
+        f"{greet_en} I am your sales agent from Creer Infotech. "
+        "Would you like to hear about our latest products?"
+    )
+
 # dynamic English greeting to Hindi at runtime
 def intro_message():
     hr = datetime.now().hour
@@ -91,11 +95,7 @@ def intro_message():
         greet_en = "Good evening!"
     else:
         greet_en = "Hello!"
-    base_greeting_en = (
-        f"{greet_en} I am your sales agent from Creer Infotech. "
-        "Would you like to hear about our latest products?"
-    )
-    return translate_to_hindi(base_greeting_en)
+    return translate_to_hindi(greeting_en(greet_en))
 
 # keep all keywords in English/Hinglish 
 AFFIRMATIVE = ["yes", "ya", "yup", "sure", "ha", "haan", "han", "ok", "okay", "of course", "why not", "alright", "theek", "thik", "thik hai", "हाँ", "ठीक", "ठीक है"]
@@ -104,6 +104,14 @@ CALL_KEYWORDS = ["call me", "talk to agent", "contact me", "speak to agent", "co
 
 INFO_KEYWORDS = ["tell me more", "details", "more info", "specs", "specifications", "explain", "description", "features", "जानकारी", "विवरण", "डिटेल"]
 
+# Hinglish + Devanagari lists compiled into one word-boundary matcher
+INTENT_MATCHER = KeywordMatcher({
+    "affirmative": AFFIRMATIVE,
+    "negative": NEGATIVE,
+    "call": CALL_KEYWORDS,
+    "info": INFO_KEYWORDS,
+})
+
 #  SMS via HSP 
 def send_sms_via_hsp(mobile_number, message):
     try:
@@ -121,9 +129,6 @@ def send_sms_via_hsp(mobile_number, message):
     except Exception as e:
         print("Failed to send SMS via HSP:", e)
 
-def similar(a, b): 
-    return SequenceMatcher(None, a, b).ratio()
-
 #  persuasion lines kept in ENGLISH. .
 OFFERS_LIST_EN = [
     "I understand, but today we are offering a 20% discount. Would you like to quickly check the products?",
@@ -136,46 +141,85 @@ OFFERS_LIST_EN = [
 
 # Load products once
 PRODUCTS_LIST = load_products()
+PRODUCT_INDEX = ProductIndex(PRODUCTS_LIST)
+
+# fixed bot lines (translated once, then served from the translation memory)
+RETRY_EN = "Sorry, I could not hear you clearly. Could you please say it again?"
+FINAL_RETRY_EN = "Sorry, we could not hear you even after several attempts. Goodbye."
+NO_SPEECH_EN = "Sorry, I couldn't hear you clearly. Could you please say that again?"
+BYE_EN = "Thank you for your time. Goodbye!"
+PERSUASION_END_EN = "No problem. Have a great day!"
+AGENT_WAIT_EN = "Please wait while I connect you to an agent..."
+AGENT_DONE_EN = "Connecting you to the agent. Thank you!"
+AGENT_LATER_EN = "Our agent will call you soon. Meanwhile, would you like me to tell you about our products?"
+
+def product_list_en():
+    product_text_en = "Here are our available products:\n"
+    for i, p in enumerate(PRODUCTS_LIST, start=1):
+        product_text_en += f"{i}. {p['product_name']}\n"
+    return product_text_en + "Please speak the name of the product you are interested in."
+
+def info_not_found_en():
+    names = ", ".join([p["product_name"] for p in PRODUCTS_LIST])
+    return f"Sorry, we don't have that product. We have: {names}. Which one would you like to know about?"
+
+def fallback_en():
+    names = ", ".join([p["product_name"] for p in PRODUCTS_LIST])
+    return f"Sorry, we don't have that product. Available products are: {names}. Which one would you prefer?"
+
+def static_prompts_en():
+    """Every English line the bot can say that doesn't depend on the caller."""
+    return (
+        [greeting_en(g) for g in GREETINGS_EN]
+        + OFFERS_LIST_EN
+        + [RETRY_EN, FINAL_RETRY_EN, NO_SPEECH_EN, BYE_EN, PERSUASION_END_EN,
+           AGENT_WAIT_EN, AGENT_DONE_EN, AGENT_LATER_EN]
+        + [product_list_en(), info_not_found_en(), fallback_en()]
+    )
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(SCRIPT_DIR, "Sales_Conversation_Twilio.xlsx")
-print(f" ‼ Logging conversations to: {LOG_FILE} ‼ ")
+# Excel copy: python log_store.py export turns Sales_Conversation_Twilio.xlsx
+print(f" ‼ Logging conversations to: {log_store.path} ‼ ")
 
 def log_turn(ai_question, user_response, emotion, ai_reply, phone_number):
-    new_log = pd.DataFrame({
-        "Question": [ai_question],
-        "User_Response": [user_response],
-        "Emotion": [emotion],
-        "AI_Reply": [ai_reply],
-        "PhoneNumber": [phone_number],
-        "Timestamp": [datetime.now()]
+    # just a queue put; the log writer thread appends it to the log store
+    log_pipeline.submit("turns", {
+        "Question": ai_question,
+        "User_Response": user_response,
+        "Emotion": emotion,
+        "AI_Reply": ai_reply,
+        "PhoneNumber": phone_number,
     })
-    try:
-        try:
-            import openpyxl
-        except ImportError:
-            print("ERROR: 'openpyxl' not found. pip install openpyxl")
-            return
-
-        if os.path.exists(LOG_FILE):
-            old = pd.read_excel(LOG_FILE)
-            df_log = pd.concat([old, new_log], ignore_index=True)
-        else:
-            df_log = new_log
-        df_log.to_excel(LOG_FILE, index=False)
-        print(f"--- Logged turn for {phone_number} ---")
-    except Exception as e:
-        print(f"CRITICAL ERROR logging to Excel: {e}  (file: {LOG_FILE})")
 
-app = FastAPI()
+# pre-translate the static lines in the background so startup isn't blocked;
+# anything already in translation_memory.json is skipped
+def warm_static():
+    translation_memory.warm_static(static_prompts_en(), _translate_llm)
+    warm_twiml()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # report a missing state-token secret at startup, not mid-call
+    state_token.secret()
+    warm = asyncio.create_task(asyncio.to_thread(warm_static))
+    yield
+    warm.cancel()
+    translation_memory.flush()
+    # write out every queued log row before exiting
+    log_pipeline.close()
+
+app = FastAPI(lifespan=lifespan)
 
 #  all TTS will be Hindi; speech input language hi-IN
-def create_twiml_response(
+def _build_gather(
     text_to_say_hindi: str, 
     action_url: str, 
     speech_timeout: int = 7,  
     num_retries: int = 2,
-    language: str = "hi-IN"
+    language: str = "hi-IN",
+    retry_msg_hi: str = "",
+    final_retry_hi: str = "",
 ):
     """
     Says the provided Hindi text and gathers speech in hi-IN.
@@ -192,8 +236,6 @@ def create_twiml_response(
     response.append(gather)
 
     # Retries
-    retry_msg_en = "Sorry, I could not hear you clearly. Could you please say it again?"
-    retry_msg_hi = translate_to_hindi(retry_msg_en)
     for _ in range(num_retries):
         response.say(retry_msg_hi, voice="Polly.Aditi")
         retry_gather = Gather(
@@ -202,16 +244,51 @@ def create_twiml_response(
         )
         response.append(retry_gather)
 
-    final_retry_en = "Sorry, we could not hear you even after several attempts. Goodbye."
-    final_retry_hi = translate_to_hindi(final_retry_en)
     response.say(final_retry_hi, voice="Polly.Aditi")
     response.hangup()
-    return Response(content=str(response), media_type="application/xml")
+    return str(response)
+
+# static prompts are rendered once; only the action URL is spliced in per request
+GATHER_TWIML = TwimlCache(_build_gather, "hindi")
+
+def create_twiml_response(
+    text_to_say_hindi: str, 
+    action_url: str, 
+    speech_timeout: int = 7,  
+    num_retries: int = 2,
+    language: str = "hi-IN",
+    static: bool = False,
+):
+    # the retry lines are part of the key, so a template built before the
+    # Hindi translation arrived is never served after it
+    content = GATHER_TWIML.render(
+        text_to_say_hindi, action_url, static,
+        speech_timeout=speech_timeout, num_retries=num_retries, language=language,
+        retry_msg_hi=translate_to_hindi(RETRY_EN), final_retry_hi=translate_to_hindi(FINAL_RETRY_EN),
+    )
+    return Response(content=content, media_type="application/xml")
+
+# pre-render the Hindi prompts once their translations are in memory
+def warm_twiml():
+    texts = [greeting_en(g) for g in GREETINGS_EN] + OFFERS_LIST_EN + [
+        NO_SPEECH_EN, AGENT_LATER_EN, product_list_en(), info_not_found_en(), fallback_en()]
+    GATHER_TWIML.warm(
+        [translate_to_hindi(t) for t in texts],
+        speech_timeout=7, num_retries=2, language="hi-IN",
+        retry_msg_hi=translate_to_hindi(RETRY_EN), final_retry_hi=translate_to_hindi(FINAL_RETRY_EN),
+    )
+
+# state travels in one signed token (?s=...)
+HINDI_STATE = StateCodec(3, [
+    ("persuasion", SmallInt()),
+    ("explained", Flag()),
+    ("phone", Phone()),
+])
 
 # Helper: build next state URL
 def build_next_url(pers, expl, phone):
-    safe_phone = quote(phone)
-    return f"/handle-conversation?persuasion={pers}&explained={int(expl)}&phone={safe_phone}"
+    token = HINDI_STATE.encode({"persuasion": pers, "explained": expl, "phone": phone})
+    return f"/handle-conversation?s={token}"
 
 # Start call
 @app.post("/start-call")
@@ -225,31 +302,39 @@ def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
     intro_hi = intro_message()
 
     log_turn(ai_question="[Call Started]", user_response="", emotion="", ai_reply=intro_hi, phone_number=user_phone)
-    return create_twiml_response(intro_hi, action_url)
+    return create_twiml_response(intro_hi, action_url, static=True)
 
 # Main conversation loop
 @app.post("/handle-conversation")
 def handle_conversation(
     background_tasks: BackgroundTasks,
     SpeechResult: str = Form(None),
-    persuasion: int = Query(0),
-    explained: int = Query(0),
-    phone: str = Query("Unknown")
+    s: str = Query(None),
 ):
     response = VoiceResponse()
-    product_explained = bool(explained)
-    persuasion_used = persuasion
+    persuasion_used, product_explained, phone = 0, False, "Unknown"
+    if s:
+        try:
+            decoded = HINDI_STATE.decode(s)
+        except StateTokenError as e:
+            print(f"Rejected state token: {e}")
+            response.say(translate_to_hindi(BYE_EN), voice="Polly.Aditi")
+            response.hangup()
+            return Response(content=str(response), media_type="application/xml")
+        persuasion_used, product_explained, phone = decoded["persuasion"], decoded["explained"], decoded["phone"]
 
     # Silence handling
     if SpeechResult is None or (isinstance(SpeechResult, str) and SpeechResult.strip() == ""):
-        retry_hi = translate_to_hindi("Sorry, I couldn't hear you clearly. Could you please say that again?")
+        retry_hi = translate_to_hindi(NO_SPEECH_EN)
         next_action_url = build_next_url(persuasion_used, product_explained, phone)
-        background_tasks.add_task(log_turn, "[No speech detected]", "", "", retry_hi, phone)
-        return create_twiml_response(retry_hi, next_action_url)
+        log_turn("[No speech detected]", "", "", retry_hi, phone)
+        return create_twiml_response(retry_hi, next_action_url, static=True)
 
     user_input = SpeechResult.strip()
     user_input_lower = user_input.lower()
     emotion = detect_emotion(user_input)
+    # single keyword scan for every intent below
+    intents = INTENT_MATCHER.intents(user_input_lower)
 
     print(f"User ({phone}) said: {user_input} (Emotion: {emotion})")
     print(f"Current state: persuasion={persuasion_used}, explained={product_explained}")
@@ -259,58 +344,54 @@ def handle_conversation(
 
     # Exit
     if user_input_lower in ["exit", "quit", "stop", "bye", "ok bye", "goodbye", "अलविदा", "बाय"]:
-        bye_hi = translate_to_hindi("Thank you for your time. Goodbye!")
+        bye_hi = translate_to_hindi(BYE_EN)
         response.say(bye_hi, voice="Polly.Aditi")
         response.hangup()
-        background_tasks.add_task(log_turn, "[Exit]", user_input, emotion, bye_hi, phone)
+        log_turn("[Exit]", user_input, emotion, bye_hi, phone)
         return Response(content=str(response), media_type="application/xml")
 
     # Handle NO with persuasion (up to 6)
-    if any(word in user_input_lower for word in NEGATIVE):
+    if "negative" in intents:
         persuasion_used += 1
         if persuasion_used <= len(OFFERS_LIST_EN):
             offer_hi = translate_to_hindi(OFFERS_LIST_EN[persuasion_used - 1])
-            background_tasks.add_task(log_turn, "[Persuasion]", user_input, emotion, offer_hi, phone)
-            return create_twiml_response(offer_hi, build_next_url(persuasion_used, product_explained, phone))
+            log_turn("[Persuasion]", user_input, emotion, offer_hi, phone)
+            return create_twiml_response(offer_hi, build_next_url(persuasion_used, product_explained, phone), static=True)
         else:
-            end_hi = translate_to_hindi("No problem. Have a great day!")
+            end_hi = translate_to_hindi(PERSUASION_END_EN)
             response.say(end_hi, voice="Polly.Aditi")
             response.hangup()
-            background_tasks.add_task(log_turn, "[Persuasion end]", user_input, emotion, end_hi, phone)
+            log_turn("[Persuasion end]", user_input, emotion, end_hi, phone)
             return Response(content=str(response), media_type="application/xml")
 
     # Handle YES → list products once
-    if any(word in user_input_lower for word in AFFIRMATIVE) and not product_explained:
+    if "affirmative" in intents and not product_explained:
         product_explained = True
         # Build English text then translate
-        product_text_en = "Here are our available products:\n"
-        for i, p in enumerate(PRODUCTS_LIST, start=1):
-            product_text_en += f"{i}. {p['product_name']}\n"
-        ask_en = "Please speak the name of the product you are interested in."
-        ai_reply_hi = translate_to_hindi(product_text_en + ask_en)
-        background_tasks.add_task(log_turn, "[Show products]", user_input, emotion, ai_reply_hi, phone)
-        return create_twiml_response(ai_reply_hi, next_url())
+        ai_reply_hi = translate_to_hindi(product_list_en())
+        log_turn("[Show products]", user_input, emotion, ai_reply_hi, phone)
+        return create_twiml_response(ai_reply_hi, next_url(), static=True)
 
     # Agent request
-    if any(kw in user_input_lower for kw in CALL_KEYWORDS):
+    if "call" in intents:
         hr = datetime.now().hour
         if 11 <= hr < 17:
-            say_hi = translate_to_hindi("Please wait while I connect you to an agent...")
+            say_hi = translate_to_hindi(AGENT_WAIT_EN)
             response.say(say_hi, voice="Polly.Aditi")
             response.pause(length=2)
-            done_hi = translate_to_hindi("Connecting you to the agent. Thank you!")
+            done_hi = translate_to_hindi(AGENT_DONE_EN)
             response.say(done_hi, voice="Polly.Aditi")
             # response.dial("+911234567890")  # hook your agent
             response.hangup()
-            background_tasks.add_task(log_turn, "[Agent connect]", user_input, emotion, say_hi, phone)
+            log_turn("[Agent connect]", user_input, emotion, say_hi, phone)
             return Response(content=str(response), media_type="application/xml")
         else:
-            later_hi = translate_to_hindi("Our agent will call you soon. Meanwhile, would you like me to tell you about our products?")
-            background_tasks.add_task(log_turn, "[Agent later]", user_input, emotion, later_hi, phone)
-            return create_twiml_response(later_hi, next_url())
+            later_hi = translate_to_hindi(AGENT_LATER_EN)
+            log_turn("[Agent later]", user_input, emotion, later_hi, phone)
+            return create_twiml_response(later_hi, next_url(), static=True)
 
     # Info request → try exact product
-    if any(kw in user_input_lower for kw in INFO_KEYWORDS):
+    if "info" in intents:
         found_product = None
         for p in PRODUCTS_LIST:
             if p["product_name"].lower() in user_input_lower:
@@ -325,20 +406,12 @@ def handle_conversation(
             )
             ai_reply_hi = translate_to_hindi(eng)
         else:
-            names = ", ".join([p["product_name"] for p in PRODUCTS_LIST])
-            ai_reply_hi = translate_to_hindi(
-                f"Sorry, we don't have that product. We have: {names}. Which one would you like to know about?"
-            )
-        background_tasks.add_task(log_turn, "[Info request]", user_input, emotion, ai_reply_hi, phone)
-        return create_twiml_response(ai_reply_hi, next_url())
+            ai_reply_hi = translate_to_hindi(info_not_found_en())
+        log_turn("[Info request]", user_input, emotion, ai_reply_hi, phone)
+        return create_twiml_response(ai_reply_hi, next_url(), static=found_product is None)
 
     # Product name match (send link & end call)
-    selected_product = None
-    for p in PRODUCTS_LIST:
-        name = p["product_name"].lower()
-        if similar(name, user_input_lower) > 0.6 or any(word in user_input_lower for word in name.split()):
-            selected_product = p
-            break
+    selected_product = PRODUCT_INDEX.best(user_input_lower)
 
     if selected_product:
         mobile_number = phone 
@@ -362,15 +435,13 @@ def handle_conversation(
 
         response.say(thanks_hi, voice="Polly.Aditi")
         response.hangup()
-        background_tasks.add_task(log_turn, "[Product match -> SMS sent]", user_input, emotion, thanks_hi, phone)
+        log_turn("[Product match -> SMS sent]", user_input, emotion, thanks_hi, phone)
         return Response(content=str(response), media_type="application/xml")
 
     # Fallback: restrict to catalog, apologize + list (EN -> HI)
-    names = ", ".join([p["product_name"] for p in PRODUCTS_LIST])
-    fallback_en = f"Sorry, we don't have that product. Available products are: {names}. Which one would you prefer?"
-    fallback_hi = translate_to_hindi(fallback_en)
-    background_tasks.add_task(log_turn, "[Fallback]", user_input, emotion, fallback_hi, phone)
-    return create_twiml_response(fallback_hi, next_url())
+    fallback_hi = translate_to_hindi(fallback_en())
+    log_turn("[Fallback]", user_input, emotion, fallback_hi, phone)
+    return create_twiml_response(fallback_hi, next_url(), static=True)
 
 # ENDPOINTS TO TRIGGER OUTBOUND CALLS
 
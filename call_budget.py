@@ -0,0 +1,138 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Deadline-aware LLM calls.
+# Every webhook gets a latency budget. If the LLM can't answer within what
+# is left of it, the caller gets a canned reply immediately and the
+# generation keeps running in the background (its result lands in the LLM
+# cache, so the next caller in the same spot gets the real reply).
+
+# seconds a webhook may spend before Twilio's caller hears dead air
+WEBHOOK_BUDGET = float(os.getenv("WEBHOOK_BUDGET", "2.5"))
+# kept back for building and sending the TwiML itself
+RESERVE = float(os.getenv("WEBHOOK_BUDGET_RESERVE", "0.2"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_BACKGROUND_WORKERS", "16")),
+    thread_name_prefix="llm-budget",
+)
+
+
+class Budget:
+    """Latency budget for one webhook, started when the handler is entered."""
+
+    def __init__(self, total=WEBHOOK_BUDGET):
+        self.total = total
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return max(0.0, self.total - self.elapsed() - RESERVE)
+
+
+#  Metrics
+_lock = threading.Lock()
+_counts = {
+    "calls": 0,
+    "answered": 0,         # LLM answered within the budget
+    "fallbacks": 0,        # canned reply served
+    "background_done": 0,  # late generation finished (cache warmed)
+    "background_failed": 0,
+}
+
+def _count(name):
+    with _lock:
+        _counts[name] += 1
+
+def stats():
+    with _lock:
+        out = dict(_counts)
+    out["fallback_rate"] = round(out["fallbacks"] / out["calls"], 3) if out["calls"] else 0.0
+    out["budget_seconds"] = WEBHOOK_BUDGET
+    return out
+
+
+def _finished_late(fut):
+    if fut.cancelled() or fut.exception() is not None:
+        _count("background_failed")
+    else:
+        _count("background_done")
+
+
+def run_within(budget, producer, canned):
+    """
+    Run producer() but wait at most budget.remaining() seconds for it.
+    On timeout (or error, or an empty reply) return `canned`; a timed-out
+    producer keeps running in the background.
+    """
+    _count("calls")
+    remaining = budget.remaining() if budget is not None else None
+    fut = _executor.submit(producer)
+    if remaining is not None and remaining <= 0:
+        # budget already spent: don't wait at all, just warm the cache
+        _count("fallbacks")
+        fut.add_done_callback(_finished_late)
+        return canned
+
+    try:
+        reply = fut.result(timeout=remaining)
+    except FutureTimeout:
+        _count("fallbacks")
+        fut.add_done_callback(_finished_late)
+        return canned
+    except Exception as e:
+        print("LLM error within budget:", e)
+        _count("fallbacks")
+        return canned
+
+    if not reply or len(reply.strip()) < 2:
+        _count("fallbacks")
+        return canned
+    _count("answered")
+    return reply
+
+
+# late async generations; the loop only keeps weak references to tasks
+_background = set()
+
+def _keep_running(task):
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    task.add_done_callback(_finished_late)
+
+
+async def arun_within(budget, producer, canned):
+    """
+    Async run_within: producer is a coroutine function. The webhook awaits
+    it for at most budget.remaining() seconds without holding a thread.
+    """
+    _count("calls")
+    remaining = budget.remaining() if budget is not None else None
+    task = asyncio.ensure_future(producer())
+    if remaining is not None and remaining <= 0:
+        _count("fallbacks")
+        _keep_running(task)
+        return canned
+
+    try:
+        # shield: timing out the wait must not cancel the generation
+        reply = await asyncio.wait_for(asyncio.shield(task), timeout=remaining)
+    except asyncio.TimeoutError:
+        _count("fallbacks")
+        _keep_running(task)
+        return canned
+    except Exception as e:
+        print("LLM error within budget:", e)
+        _count("fallbacks")
+        return canned
+
+    if not reply or len(reply.strip()) < 2:
+        _count("fallbacks")
+        return canned
+    _count("answered")
+    return reply
@@ -0,0 +1,115 @@
+import time
+import inspect
+import threading
+
+# Table-driven conversation state machine.
+# A flow is a dict of state -> ordered transitions. Each transition has a
+# guard (checked against the current turn) and an action that builds the
+# TwiML response. The table is compiled once at import time, so a webhook
+# only evaluates the guards of the state it is in. Actions may be plain
+# functions or coroutines; async webhooks use adispatch().
+
+
+class Turn:
+    """Everything a guard/action needs about one webhook call."""
+
+    def __init__(self, state, speech, phone, background_tasks=None, emotion_fn=None, matcher=None, **extra):
+        self.state = state
+        self.speech = speech or ""
+        self.text = self.speech.lower().strip()
+        self.phone = phone
+        self.background_tasks = background_tasks
+        self.extra = extra
+        self._emotion_fn = emotion_fn
+        self._emotion = None
+        self._matcher = matcher
+        self._intents = None
+
+    @property
+    def emotion(self):
+        # computed on first use only; many transitions never need it
+        if self._emotion is None:
+            self._emotion = self._emotion_fn(self.speech) if self._emotion_fn else "neutral"
+        return self._emotion
+
+    @property
+    def intents(self):
+        # one keyword scan per turn, shared by every guard of the state
+        if self._intents is None:
+            self._intents = self._matcher.intents(self.text) if self._matcher else set()
+        return self._intents
+
+
+class Transition:
+    __slots__ = ("name", "guard", "action")
+
+    def __init__(self, name, action, guard=None):
+        self.name = name
+        self.action = action
+        self.guard = guard     # None = always taken
+
+
+class Flow:
+    def __init__(self, name, states, default):
+        """
+        states:  {state_name: [Transition, ...]} in priority order
+        default: action used when the state is unknown or no guard matched
+        """
+        self.name = name
+        self.default = Transition("default", default)
+        self._table = self._compile(states)
+        self._lock = threading.Lock()
+        self._timings = {}     # (state, transition) -> [count, total_seconds]
+
+    def _compile(self, states):
+        table = {}
+        for state, transitions in states.items():
+            for t in transitions:
+                if not callable(t.action) or (t.guard is not None and not callable(t.guard)):
+                    raise ValueError(f"{self.name}: bad transition '{t.name}' in state '{state}'")
+            table[state] = tuple(transitions)
+        return table
+
+    @property
+    def states(self):
+        return list(self._table)
+
+    def _choose(self, turn):
+        for t in self._table.get(turn.state, ()):
+            if t.guard is None or t.guard(turn):
+                return t
+        return self.default
+
+    def dispatch(self, turn):
+        started = time.perf_counter()
+        chosen = self._choose(turn)
+        result = chosen.action(turn)
+        if inspect.isawaitable(result):
+            result.close()
+            raise TypeError(f"{self.name}: '{chosen.name}' is async, use adispatch()")
+        self._record(turn.state, chosen.name, time.perf_counter() - started)
+        return result
+
+    async def adispatch(self, turn):
+        started = time.perf_counter()
+        chosen = self._choose(turn)
+        result = chosen.action(turn)
+        if inspect.isawaitable(result):
+            result = await result
+        self._record(turn.state, chosen.name, time.perf_counter() - started)
+        return result
+
+    def _record(self, state, name, seconds):
+        key = (state, name)
+        with self._lock:
+            entry = self._timings.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def stats(self):
+        """Count and mean time (ms) per transition, guards included."""
+        with self._lock:
+            return {
+                f"{state}:{name}": {"count": n, "mean_ms": round(1000 * total / n, 2)}
+                for (state, name), (n, total) in self._timings.items()
+            }
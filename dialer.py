@@ -0,0 +1,231 @@
+import os
+import time
+import uuid
+import random
+import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # what the Twilio client raises when it never reached the API
+    from requests.exceptions import ConnectTimeout
+    from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+except ImportError:
+    ConnectTimeout = NewConnectionError = ConnectTimeoutError = ()
+
+# Outbound dialer for bulk campaigns.
+# A campaign is queued in one go and dialed in the background by a small
+# pool of workers. Every API call first takes a token from a bucket
+# refilled at DIAL_CPS, so throughput is set by the Twilio calls-per-second
+# quota rather than by a sleep in a loop, and the HTTP request that started
+# the campaign returns immediately. Every number ends up with its own result.
+#
+# calls.create is not idempotent: once Twilio may have accepted a request,
+# sending it again can ring the customer twice. So only errors that prove
+# the call was not created are retried (429 and failures to connect);
+# 5xx and read timeouts are recorded as Failed.
+
+DIAL_CPS = float(os.getenv("DIAL_CPS", "1"))            # Twilio account CPS
+DIAL_BURST = int(os.getenv("DIAL_BURST", "1"))
+DIAL_CONCURRENCY = int(os.getenv("DIAL_CONCURRENCY", "8"))
+DIAL_MAX_RETRIES = int(os.getenv("DIAL_MAX_RETRIES", "3"))
+DIAL_BACKOFF = float(os.getenv("DIAL_BACKOFF", "2"))     # seconds, doubled per retry
+DIAL_BACKOFF_MAX = 60.0
+# Twilio answers 429 when over the CPS limit, without creating the call
+RETRY_STATUSES = {429}
+MAX_JOBS = 50       # finished jobs kept for /dial-status
+
+
+def _causes(exc, depth=4):
+    """exc plus the errors it wraps (requests -> urllib3 MaxRetryError -> socket error)."""
+    seen = [exc]
+    for e in seen:
+        if len(seen) > depth * 4:
+            break
+        for inner in (e.__cause__, e.__context__, getattr(e, "reason", None), *getattr(e, "args", ())):
+            if isinstance(inner, BaseException) and inner not in seen:
+                seen.append(inner)
+    return seen
+
+
+def is_retryable(exc):
+    """True only if the call certainly wasn't created: rate limited, or never connected."""
+    if getattr(exc, "status", None) in RETRY_STATUSES:
+        return True
+    return any(
+        isinstance(e, (ConnectTimeout, NewConnectionError, ConnectTimeoutError, ConnectionRefusedError, socket.gaierror))
+        for e in _causes(exc)
+    )
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancel=None):
+        """
+        Block until a token is available and take it; returns seconds waited,
+        or None if the `cancel` Event was set while waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            if cancel is not None:
+                if cancel.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+            waited += delay
+
+
+class DialJob:
+    def __init__(self, numbers, campaign):
+        self.id = uuid.uuid4().hex[:12]
+        self.campaign = campaign
+        self.total = len(numbers)
+        self.results = {}       # number -> {"status", "sid"/"error", "attempts"}
+        self.counts = {}
+        self.retries = 0
+        self._cancel = threading.Event()
+        self.started = time.time()
+        self.finished = self.started if not numbers else None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        # wakes workers sleeping in the bucket or in a backoff
+        self._cancel.set()
+
+    def record(self, number, result):
+        with self._lock:
+            self.results[number] = result
+            self.counts[result["status"]] = self.counts.get(result["status"], 0) + 1
+            if len(self.results) == self.total:
+                self.finished = time.time()
+
+    def snapshot(self, results=False):
+        with self._lock:
+            elapsed = (self.finished or time.time()) - self.started
+            out = {
+                "job": self.id,
+                "campaign": self.campaign,
+                "total": self.total,
+                "done": len(self.results),
+                "counts": dict(self.counts),
+                "retries": self.retries,
+                "cancelled": self.cancelled,
+                "elapsed_s": round(elapsed, 1),
+                "calls_per_s": round(len(self.results) / elapsed, 2) if elapsed else 0.0,
+            }
+            if results:
+                out["results"] = dict(self.results)
+            return out
+
+
+class Dialer:
+    """
+    place_call(number, campaign) dials one number and returns the call SID
+    (raising on failure); on_result(campaign, number, result) is called once
+    per number with the final outcome.
+    """
+
+    def __init__(self, name, place_call, on_result=None, rate=DIAL_CPS, burst=DIAL_BURST,
+                 concurrency=DIAL_CONCURRENCY, max_retries=DIAL_MAX_RETRIES, backoff=DIAL_BACKOFF):
+        self.name = name
+        self.place_call = place_call
+        self.on_result = on_result
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"dial-{name}")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, numbers, campaign):
+        """Queue every number of a campaign and return its DialJob right away."""
+        # results are keyed by number: dial a repeated one once, keeping the order
+        numbers = list(dict.fromkeys(numbers))
+        job = DialJob(numbers, campaign)
+        with self._lock:
+            self._jobs[job.id] = job
+            # forget the oldest finished jobs; running ones stay cancellable
+            finished = [j.id for j in self._jobs.values() if j.finished is not None]
+            for job_id in finished[:max(0, len(self._jobs) - MAX_JOBS)]:
+                del self._jobs[job_id]
+        print(f" Dialer {self.name}: job {job.id} queued {job.total} numbers (campaign {campaign}, {self.bucket.rate} CPS) ")
+        for number in numbers:
+            self._pool.submit(self._dial, job, number)
+        return job
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        if job:
+            job.cancel()
+        return job
+
+    def _backoff_delay(self, attempt):
+        delay = min(DIAL_BACKOFF_MAX, self.backoff * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)     # jitter: retries don't line up
+
+    def _dial(self, job, number):
+        attempt = 0
+        while True:
+            if job.cancelled or self.bucket.acquire(job._cancel) is None:
+                return self._finish(job, number, {"status": "Cancelled", "attempts": attempt})
+            attempt += 1
+            try:
+                sid = self.place_call(number, job.campaign)
+            except Exception as e:
+                if attempt <= self.max_retries and is_retryable(e):
+                    with job._lock:
+                        job.retries += 1
+                    job._cancel.wait(self._backoff_delay(attempt))
+                    continue
+                print(f" Error making call to {number}: {e} ")
+                return self._finish(job, number, {"status": "Failed", "error": str(e), "attempts": attempt})
+            return self._finish(job, number, {"status": "Call initiated", "sid": sid, "attempts": attempt})
+
+    def _finish(self, job, number, result):
+        job.record(number, result)
+        if self.on_result:
+            try:
+                self.on_result(job.campaign, number, result)
+            except Exception as e:
+                print(f"Dialer {self.name}: on_result failed for {number}:", e)
+
+    def shutdown(self):
+        """Cancel every job without waiting; numbers not dialed yet stay Queued."""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "cps": self.bucket.rate,
+            "concurrency": self.concurrency,
+            "max_retries": self.max_retries,
+            "jobs": [j.snapshot() for j in jobs],
+        }
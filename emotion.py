@@ -0,0 +1,157 @@
+import re
+import sys
+import time
+from functools import lru_cache
+
+# Lightweight emotion classifier shared by all routers.
+# A small precompiled polarity lexicon (English + Hinglish + Devanagari)
+# replaces TextBlob: same happy / angry / neutral buckets at +-0.3, with
+# negation ("not good") and intensifiers ("very bad") handled like
+# TextBlob does, but without building a TextBlob per utterance.
+
+HAPPY_THRESHOLD = 0.3
+ANGRY_THRESHOLD = -0.3
+
+LEXICON = {
+    # English, positive
+    "good": 0.7, "great": 0.8, "excellent": 1.0, "amazing": 0.6, "awesome": 1.0,
+    "nice": 0.6, "love": 0.5, "lovely": 0.5, "happy": 0.8, "glad": 0.5,
+    "interesting": 0.5, "interested": 0.25, "wonderful": 1.0, "perfect": 1.0,
+    "fine": 0.42, "best": 1.0, "better": 0.5, "cool": 0.35, "sure": 0.5,
+    "beautiful": 0.85, "fantastic": 0.4, "super": 0.33, "brilliant": 0.9,
+    "helpful": 0.5, "pleased": 0.5, "thanks": 0.2, "thank": 0.2, "welcome": 0.8,
+    "exciting": 0.3, "excited": 0.4, "fair": 0.7, "right": 0.29,
+    # English, negative
+    "bad": -0.7, "worst": -1.0, "worse": -0.4, "terrible": -1.0, "horrible": -1.0,
+    "hate": -0.8, "angry": -0.5, "annoying": -0.8, "annoyed": -0.4, "stupid": -0.8,
+    "useless": -0.5, "waste": -0.2, "irritating": -0.6, "irritated": -0.6,
+    "disgusting": -1.0, "rubbish": -0.6, "nonsense": -0.4, "poor": -0.4,
+    "wrong": -0.5, "boring": -1.0, "sad": -0.5, "upset": -0.5, "fraud": -0.6,
+    "scam": -0.6, "pathetic": -1.0, "spam": -0.5, "disturbing": -0.5,
+    "ridiculous": -0.33, "awful": -1.0, "mad": -0.6, "sick": -0.7, "fake": -0.5,
+    # Hinglish (romanized)
+    "accha": 0.6, "acha": 0.6, "achha": 0.6, "badhiya": 0.8, "badiya": 0.8,
+    "mast": 0.7, "sahi": 0.5, "khush": 0.8, "shukriya": 0.3, "dhanyavad": 0.3,
+    "bekar": -0.7, "bakwas": -0.8, "ganda": -0.6, "bura": -0.6, "pagal": -0.6,
+    "gussa": -0.7, "pareshan": -0.6, "faltu": -0.6, "wahiyat": -0.9,
+    # Devanagari
+    "अच्छा": 0.6, "बढ़िया": 0.8, "खुश": 0.8, "धन्यवाद": 0.3, "शुक्रिया": 0.3,
+    "बेकार": -0.7, "बकवास": -0.8, "बुरा": -0.6, "गुस्सा": -0.7, "परेशान": -0.6,
+    "फालतू": -0.6, "पागल": -0.6,
+}
+INTENSIFIERS = {
+    "very": 1.3, "really": 1.3, "so": 1.3, "too": 1.3, "extremely": 1.5,
+    "totally": 1.3, "bahut": 1.3, "bohot": 1.3, "बहुत": 1.3,
+}
+NEGATORS = {"not", "never"}
+# Hindi puts the negation after the word ("accha nahi"); before a word it
+# works like "not"
+POST_NEGATORS = {"nahi", "nahin", "नहीं"}
+
+_TOKEN = re.compile(r"[a-z\u0900-\u097F]+")
+
+
+def polarity(text):
+    """Mean polarity of the lexicon words in text, in -1..1 (0 if none)."""
+    tokens = _TOKEN.findall(text.replace("n't", " not"))
+    scores = []
+    modifier = 1.0
+    negate = False
+    last_scored = False
+    for tok in tokens:
+        if tok in POST_NEGATORS and last_scored:
+            scores[-1] *= -0.5
+            last_scored = False
+            continue
+        if tok in NEGATORS or tok in POST_NEGATORS:
+            negate = True
+            continue
+        if tok in INTENSIFIERS:
+            modifier *= INTENSIFIERS[tok]
+            continue
+        value = LEXICON.get(tok)
+        if value:
+            value = max(-1.0, min(1.0, value * modifier))
+            if negate:
+                # TextBlob-style: "not good" is mildly negative, not -good
+                value *= -0.5
+            scores.append(value)
+        last_scored = bool(value)
+        modifier = 1.0
+        negate = False
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def _normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+@lru_cache(maxsize=4096)
+def _classify(normalized):
+    s = polarity(normalized)
+    if s > HAPPY_THRESHOLD:
+        return "happy"
+    elif s < ANGRY_THRESHOLD:
+        return "angry"
+    return "neutral"
+
+
+# Emotion detection
+def detect_emotion(text):
+    normalized = _normalize(text)
+    if not normalized:
+        return "neutral"
+    return _classify(normalized)
+
+
+def detect_emotions(texts):
+    """Batch API for offline scoring of logged conversations."""
+    return [detect_emotion(t) for t in texts]
+
+
+def cache_info():
+    return _classify.cache_info()._asdict()
+
+
+#  Offline scoring / benchmark against TextBlob
+#  python emotion.py [Sales_Conversation_Twilio.xlsx]
+if __name__ == "__main__":
+    samples = [
+        "yes that sounds great", "no I am not interested", "this is a stupid waste of my time",
+        "okay tell me more", "very good offer", "not good", "bakwas mat karo", "bahut accha",
+        "I hate these calls", "", "what products do you have", "that's awesome thank you",
+    ]
+    if len(sys.argv) > 1:
+        import pandas as pd
+        df = pd.read_excel(sys.argv[1])
+        column = "User_Response" if "User_Response" in df.columns else df.columns[0]
+        samples = df[column].fillna("").astype(str).tolist()
+        print(f"Scoring {len(samples)} rows from {sys.argv[1]} ({column})")
+
+    started = time.perf_counter()
+    ours = detect_emotions(samples)
+    t_ours = time.perf_counter() - started
+    print(f"lexicon : {1e6 * t_ours / len(samples):.1f} us/utterance (cold cache)")
+    counts = {e: ours.count(e) for e in ("happy", "neutral", "angry")}
+    print("distribution:", counts)
+
+    try:
+        from textblob import TextBlob
+    except ImportError:
+        print("textblob not installed, skipping comparison")
+        sys.exit(0)
+
+    def textblob_emotion(text):
+        s = TextBlob(text).sentiment.polarity
+        if s > 0.3:
+            return "happy"
+        elif s < -0.3:
+            return "angry"
+        return "neutral"
+
+    started = time.perf_counter()
+    theirs = [textblob_emotion(t) for t in samples]
+    t_theirs = time.perf_counter() - started
+    agree = sum(a == b for a, b in zip(ours, theirs)) / len(samples)
+    print(f"textblob: {1e6 * t_theirs / len(samples):.1f} us/utterance")
+    print(f"agreement with textblob: {100 * agree:.1f}%")
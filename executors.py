@@ -0,0 +1,115 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated, bounded thread pools for the blocking work left on the async
+# webhook path (Excel/pandas I/O, the SMS gateway). Keeping it off
+# Starlette's shared threadpool means a slow disk or SMS API can't starve
+# the webhooks, and max_pending makes callers wait (instead of piling up
+# unbounded work) once a pool is backed up.
+
+# summary upserts and analytics scans: short jobs, one worker is plenty
+IO_WORKERS = int(os.getenv("IO_WORKERS", "1"))
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "8"))
+# streaming exports; a big download can't hold up the io pool
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+# Parquet scans for /analytics-report, kept away from the call path
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "1"))
+MAX_PENDING = int(os.getenv("EXECUTOR_MAX_PENDING", "256"))
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_pending=MAX_PENDING):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = None      # asyncio.Semaphore, created on the serving loop
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this pool and await the result."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            with self._lock:
+                self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.pending -= 1
+            with self._lock:
+                self.completed += 1
+            return result
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn from synchronous code (no await, never blocks); returns the
+        Future, or None when max_pending jobs are already waiting.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+
+        def done(future):
+            with self._lock:
+                self.pending -= 1
+                if future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                    print(f"{self.name} task {getattr(fn, '__name__', fn)} failed:", future.exception())
+
+        future = self._pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(done)
+        return future
+
+    async def run_logged(self, fn, *args, **kwargs):
+        """Fire-and-forget variant for BackgroundTasks: errors are printed, not raised."""
+        try:
+            await self.run(fn, *args, **kwargs)
+        except Exception as e:
+            print(f"{self.name} task {getattr(fn, '__name__', fn)} failed:", e)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+# store writes / Excel / pandas
+io_executor = BoundedExecutor("io", IO_WORKERS)
+# outbound HTTP that has no async client (SMS gateway)
+http_executor = BoundedExecutor("http", HTTP_WORKERS)
+# pages of /export downloads
+export_executor = BoundedExecutor("export", EXPORT_WORKERS)
+# analytics reports
+analytics_executor = BoundedExecutor("analytics", ANALYTICS_WORKERS, max_pending=16)
+
+
+def stats():
+    return {
+        "io": io_executor.stats(),
+        "http": http_executor.stats(),
+        "export": export_executor.stats(),
+        "analytics": analytics_executor.stats(),
+    }
@@ -0,0 +1,176 @@
+import io
+import csv
+import json
+import hashlib
+import tempfile
+
+from fastapi import APIRouter, Request, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from log_store import log_store, TABLES, TIMESTAMP_FORMAT
+from summary_store import summary_store, COLUMNS as SUMMARY_COLUMNS
+from executors import export_executor
+from analytics import parse_time
+
+try:
+    from openpyxl import Workbook
+except ImportError:     # optional: pip install openpyxl (xlsx only)
+    Workbook = None
+
+# Streaming exports of the conversation log, leads and call summary.
+# Rows are read from the stores page by page and encoded in chunks on the
+# export pool, so a 1M-row export holds one page in memory and never runs
+# on the webhook threads. xlsx goes through openpyxl's write-only mode
+# (rows are spooled to disk, not kept as cells).
+#
+#   GET /export/turns?format=csv&since=2026-10-01&phone=+91...
+#   GET /export/summary?format=xlsx&campaign=diwali&outcome=Completed
+#
+# Every response carries an ETag built from the store's version and the
+# filters; a client sending it back in If-None-Match gets a 304 until new
+# rows arrive.
+
+router = APIRouter()
+
+SOURCES = {
+    "turns": TABLES["turns"],
+    "leads": TABLES["leads"],
+    "summary": SUMMARY_COLUMNS,
+}
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+CHUNK_ROWS = 500
+FILE_CHUNK = 64 * 1024
+
+
+def source_rows(source, campaign=None, **filters):
+    if source == "summary":
+        return summary_store.rows(campaign=campaign, **filters)
+    return log_store.rows(source, **filters)
+
+
+def version(source):
+    return summary_store.version() if source == "summary" else log_store.version(source)
+
+
+def etag(source, fmt, filters):
+    key = json.dumps([fmt, sorted(filters.items())])
+    return f'W/"{source}-{version(source)}-{hashlib.sha1(key.encode()).hexdigest()[:12]}"'
+
+
+def iter_csv(rows, columns):
+    buf = io.StringIO()
+    # BOM so Excel opens the ₹ / Hindi text as utf-8
+    buf.write("\ufeff")
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([row.get(c) for c in columns])
+        if i % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_jsonl(rows, columns):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False))
+        if len(lines) == CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_xlsx(rows, columns):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(columns)
+    for i, row in enumerate(rows, 1):
+        ws.append([row.get(c) for c in columns])
+        if i % CHUNK_ROWS == 0:
+            yield b""       # hand the worker back between pages
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(FILE_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+ENCODERS = {"csv": iter_csv, "jsonl": iter_jsonl, "xlsx": iter_xlsx}
+
+
+async def _on_export_pool(chunks):
+    # each chunk (one page read + encode) is a separate job on the export pool
+    try:
+        while True:
+            chunk = await export_executor.run(next, chunks, None)
+            if chunk is None:
+                return
+            if chunk:
+                yield chunk
+    finally:
+        try:
+            chunks.close()
+        except ValueError:
+            pass    # client went away mid-chunk; the worker finishes it and the generator is collected
+
+
+async def export_response(request: Request, source: str, fmt: str = "csv", filename: str = None, **filters):
+    """Streamed export of one source (or 304 if the client's copy is current)."""
+    if source not in SOURCES:
+        return JSONResponse({"error": f"unknown source {source!r}, expected one of {sorted(SOURCES)}"}, status_code=404)
+    if fmt not in FORMATS:
+        return JSONResponse({"error": f"unknown format {fmt!r}, expected one of {sorted(FORMATS)}"}, status_code=400)
+    if fmt == "xlsx" and Workbook is None:
+        return JSONResponse({"error": "xlsx export needs openpyxl (pip install openpyxl)"}, status_code=503)
+    if filters.get("campaign") and source != "summary":
+        return JSONResponse({"error": "campaign only applies to the summary"}, status_code=400)
+    filters = {k: v for k, v in filters.items() if v}
+    # the stores compare timestamps as text: only well-formed ones may reach them
+    try:
+        for key in ("since", "until"):
+            if key in filters:
+                filters[key] = parse_time(filters[key]).strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        return JSONResponse({"error": "since/until must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}, status_code=400)
+
+    tag = await export_executor.run(etag, source, fmt, filters)
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    client_tags = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+    if tag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="{filename or f"{source}.{fmt}"}"'
+    chunks = ENCODERS[fmt](source_rows(source, **filters), SOURCES[source])
+    return StreamingResponse(_on_export_pool(chunks), media_type=FORMATS[fmt], headers=headers)
+
+
+@router.get("/{source}")
+async def export(
+    request: Request,
+    source: str,
+    fmt: str = Query("csv", alias="format"),
+    campaign: str = None,
+    phone: str = None,
+    since: str = None,
+    until: str = None,
+    outcome: str = None,
+):
+    """
+    turns / leads / summary as csv, jsonl or xlsx.
+    since/until take "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"; outcome is the
+    Question (turns), Interest (leads) or status (summary) value.
+    """
+    return await export_response(
+        request, source, fmt,
+        campaign=campaign, phone=phone, since=since, until=until, outcome=outcome,
+    )
@@ -0,0 +1,84 @@
+import re
+import time
+
+# Compiled multi-pattern keyword matcher.
+# All intent keyword lists are folded into ONE word-boundary regex, so an
+# utterance is scanned once and every intent hit comes back with its
+# position. Word boundaries stop "no" matching inside "know" and "ha"
+# inside "what". Devanagari vowel signs are not \w in Python, so the
+# boundary class includes the Devanagari block, except the danda and
+# double danda (U+0964/U+0965), which end a sentence like "." does.
+
+_WORD = r"[\w\u0900-\u0963\u0966-\u097F]"
+
+
+class KeywordMatcher:
+    def __init__(self, groups):
+        """groups: {intent_name: [keyword or phrase, ...]}"""
+        self.groups = {name: list(words) for name, words in groups.items()}
+        self._intents = {}     # normalized phrase -> (intent, ...)
+        for name, words in self.groups.items():
+            for w in words:
+                key = self._normalize(w)
+                if key:
+                    self._intents[key] = self._intents.get(key, ()) + (name,)
+        # longest first so "not interested" wins over "not"/"no"
+        phrases = sorted(self._intents, key=len, reverse=True)
+        alternation = "|".join(r"\s+".join(map(re.escape, p.split(" "))) for p in phrases)
+        self._regex = re.compile(rf"(?<!{_WORD})(?:{alternation})(?!{_WORD})")
+
+    @staticmethod
+    def _normalize(text):
+        return " ".join((text or "").lower().split())
+
+    def scan(self, text):
+        """Return [(intent, phrase, start, end), ...] for every hit in text."""
+        hits = []
+        for m in self._regex.finditer((text or "").lower()):
+            phrase = " ".join(m.group(0).split())
+            for intent in self._intents[phrase]:
+                hits.append((intent, phrase, m.start(), m.end()))
+        return hits
+
+    def intents(self, text):
+        """Set of intents present in text (one scan)."""
+        found = set()
+        for m in self._regex.finditer((text or "").lower()):
+            found.update(self._intents[" ".join(m.group(0).split())])
+        return found
+
+
+#  Benchmark against the old any(word in text ...) loops
+if __name__ == "__main__":
+    from speechLinkShare import AFFIRMATIVE, NEGATIVE, CALL_KEYWORDS, INFO_KEYWORDS
+
+    lists = {"affirmative": AFFIRMATIVE, "negative": NEGATIVE, "call": CALL_KEYWORDS, "info": INFO_KEYWORDS}
+    matcher = KeywordMatcher(lists)
+    samples = [
+        "yes please tell me more about the phone",
+        "I don't know what you are talking about",
+        "no thanks not interested",
+        "can you call me later",
+        "what are the specifications of the laptop",
+        "haan ji bataiye",
+        "",
+    ] * 2000
+
+    def old(text):
+        return {name for name, words in lists.items() if any(w in text for w in words)}
+
+    started = time.perf_counter()
+    for s in samples:
+        old(s.lower())
+    t_old = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for s in samples:
+        matcher.intents(s)
+    t_new = time.perf_counter() - started
+
+    n = len(samples)
+    print(f"any() loops : {1e6 * t_old / n:.2f} us/utterance")
+    print(f"one regex   : {1e6 * t_new / n:.2f} us/utterance")
+    for s in samples[:7]:
+        print(f"{s!r:50} old={sorted(old(s.lower()))} new={sorted(matcher.intents(s))}")
@@ -7,17 +7,28 @@ from datetime import datetime
 # import edge_tts                 
 # import tempfile                 
 # import pygame                   
-import spacy
-from textblob import TextBlob
+import nlp_registry
+from emotion import detect_emotion
 import requests
 import uvicorn
 from fastapi import FastAPI, Form, Response, Query, Request, BackgroundTasks, APIRouter
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from twilio.rest import Client
 from dotenv import load_dotenv
-from urllib.parse import quote
 from multi_agent_core import run_multi_agent
-from urllib.parse import quote
+import llm_client
+from llm_cache import llm_cache
+from reply_bank import reply_bank
+import model_warmup
+import call_budget
+from conversation_flow import Flow, Transition, Turn
+from keyword_matcher import KeywordMatcher
+from session_store import session_store
+from state_token import StateCodec, StateTokenError, Enum, Phone
+from twiml_cache import TwimlCache
+from log_store import log_store
+from log_pipeline import log_pipeline
+from exports import export_response
 import os
 
 
@@ -26,47 +37,51 @@ load_dotenv()
 
 router = APIRouter()
 # NLP & Spacy
-nlp = spacy.load("en_core_web_sm")
+# loaded on first use and shared by every router (see nlp_registry)
+nlp = nlp_registry.lazy("en_core_web_sm")
 
-# golab variable 
-CONV_STATE = {} 
+
+# cached + deadline-aware generation shared by ai_response / simple_llm
+def _llm_within_budget(prompt, model_name, budget, canned, variants=1):
+    cached = llm_cache.get(prompt, model_name, variants)
+    if cached is not None:
+        return cached
+
+    def produce():
+        # no tight timeout here: if the webhook gave up, a late reply still warms the cache
+        reply = llm_client.generate_first_sentence(prompt, model=model_name)
+        llm_cache.put(prompt, model_name, reply, variants)
+        return reply
+
+    return call_budget.run_within(budget or call_budget.Budget(), produce, canned)
+
+# same as _llm_within_budget, but awaits the LLM without holding a thread
+async def _allm_within_budget(prompt, model_name, budget, canned, variants=1):
+    cached = llm_cache.get(prompt, model_name, variants)
+    if cached is not None:
+        return cached
+
+    async def produce():
+        reply = await llm_client.agenerate_first_sentence(prompt, model=model_name)
+        llm_cache.put(prompt, model_name, reply, variants)
+        return reply
+
+    return await call_budget.arun_within(budget or call_budget.Budget(), produce, canned)
 
 # Ollama text generation
-def ai_response(prompt, model_name="phi3:mini"):
+def ai_response(prompt, model_name=llm_client.CHAT_MODEL, budget=None):
     """Generate AI response using Ollama local API."""
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model_name, "prompt": prompt}
-        )
-        return response.json()["response"].strip()
-    except Exception as e:
-        print("Ollama Error:", e)
-        return "I'm sorry, I didn’t catch that."
+    return _llm_within_budget(prompt, model_name, budget, "I'm sorry, I didn’t catch that.")
     
     # simple llm 
-def simple_llm(prompt):
-    """Lightweight LLM for short conversational output."""
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": "phi3:mini", "prompt": prompt},
-            timeout=2
-        )
-        return response.json().get("response", "").strip()
-    except:
-        return ""
+def simple_llm(prompt, variants=1, budget=None, canned=""):
+    """Lightweight LLM for short conversational output (cached, within the webhook budget)."""
+    return _llm_within_budget(prompt, llm_client.CHAT_MODEL, budget, canned, variants)
+
+async def asimple_llm(prompt, variants=1, budget=None, canned=""):
+    return await _allm_within_budget(prompt, llm_client.CHAT_MODEL, budget, canned, variants)
     
     
-# Emotion detection
-def detect_emotion(text):
-    blob = TextBlob(text)
-    s = blob.sentiment.polarity
-    if s > 0.3:
-        return "happy"
-    elif s < -0.3:
-        return "angry"
-    return "neutral"
 
 # Greeting message
 def intro_message():
@@ -81,44 +96,38 @@ def intro_message():
 AFFIRMATIVE = ["yes", "ya", "yup", "sure", "ha", "haan", "okay", "ok", "of course", "why not", "alright", "yeah", "yes please"]
 NEGATIVE = ["no", "not now", "later", "maybe next time", "nah", "nope", "cancel"]
 
+# one compiled word-boundary matcher for both lists
+INTENT_MATCHER = KeywordMatcher({"affirmative": AFFIRMATIVE, "negative": NEGATIVE})
+
+# persuasion lines used when the user says no (variants pre-generated in reply_bank.py)
+PERSUASIVE_LINES = [
+    "Sir, just 10 seconds please, I promise this is helpful.",
+    "Sir, this will really benefit you, just hear me out for a moment.",
+    "Sir, one quick thing — this offer is really worthwhile.",
+    "Sir, just a moment, I believe this can help you a lot.",
+    "Sir, trust me, this information may be important for you."
+]
+
 #  lead loading
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(SCRIPT_DIR, "Sales_Leads.xlsx") 
-print(f" ‼ Logging leads to: {LOG_FILE} ‼ ")
+# exported from the log store on demand (see /download-leads)
+print(f" ‼ Logging leads to: {log_store.path} ‼ ")
 
 # data store in the excel sheet 
 def log_lead_excel(user_name, interest, emotion, phone_number):
-    new_lead = pd.DataFrame({
-        "Name": [user_name],
-        "Interest": [interest],
-        "Emotion": [emotion],
-        "PhoneNumber": [phone_number],
-        "Timestamp": [datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+    # queued for the log writer thread; Sales_Leads.xlsx is exported on demand
+    log_pipeline.submit("leads", {
+        "Name": user_name,
+        "Interest": interest,
+        "Emotion": emotion,
+        "PhoneNumber": phone_number,
     })
-    
-    try:
-        # Check for openpyxl
-        try:
-            import openpyxl
-        except ImportError:
-            print(" ERROR: 'openpyxl' not found. Please 'pip install openpyxl' ")
-            return
-
-        if os.path.exists(LOG_FILE):
-            old = pd.read_excel(LOG_FILE)
-            df_leads = pd.concat([old, new_lead], ignore_index=True)
-        else:
-            df_leads = new_lead
-        
-        df_leads.to_excel(LOG_FILE, index=False)
-        print(f" Lead saved for {user_name} ")
-    
-    except Exception as e:
-        print(f" CRITICAL ERROR logging lead to Excel: {e} ")
+    print(f" Lead saved for {user_name} ")
         
         
 #  Helper function for TwiML responses with silence retry 
-def create_twiml_response(text_to_say: str, action_url: str):
+def _build_gather(text_to_say: str, action_url: str):
     response = VoiceResponse()
     gather = Gather(
         input="speech", 
@@ -148,18 +157,37 @@ def create_twiml_response(text_to_say: str, action_url: str):
 
     # response.say("We still didn't hear a response. Goodbye.")
     # response.hangup()
-    return Response(content=str(response), media_type="application/xml")
+    return str(response)
+
+def _build_hangup(text: str, action_url: str = None):
+    response = VoiceResponse()
+    response.say(text)
+    response.hangup()
+    return str(response)
+
+# static prompts are rendered once; only the action URL is spliced in per request
+GATHER_TWIML = TwimlCache(_build_gather, "lead")
+HANGUP_TWIML = TwimlCache(_build_hangup, "lead-hangup")
+
+def create_twiml_response(text_to_say: str, action_url: str, static: bool = False):
+    return Response(content=GATHER_TWIML.render(text_to_say, action_url, static), media_type="application/xml")
+
+#  Conversation state travels in one signed token (?s=...) 
+LEAD_STATE = StateCodec(1, [
+    ("state", Enum("awaiting_interest", "awaiting_name")),
+    ("phone", Phone()),
+])
 
 #  Helper function to build the next URL with state 
 def build_next_url(state: str, phone: str):
-    safe_phone = quote(phone)
-    return f"/lead/handle-conversation?state={state}&phone={safe_phone}"
+    token = LEAD_STATE.encode({"state": state, "phone": phone})
+    return f"/lead/handle-conversation?s={token}"
 
 #  This endpoint starts the call captures user's number 
 # @app.post("/start-call")
 @router.post("/start-call")
 @router.get("/start-call")
-def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
+async def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
     """ This is the first endpoint Twilio calls. Catches the 'To' number. """
     print(f" New Call Started. From: {From}, To: {To} ")
     
@@ -171,137 +199,180 @@ def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
     intro = intro_message()
     
     # We don't log a lead yet, just start the conversation
-    return create_twiml_response(intro, action_url)
+    return create_twiml_response(intro, action_url, static=True)
+
+#  Conversation flow (compiled once into a dispatch table) 
+ASK_NAME_TEXT = "That’s great! May I know your good name, please?"
+REPEAT_NAME_TEXT = "I'm sorry, I didn't quite catch your name. Could you please tell me your name?"
+PERSUASION_END_TEXT = "No problem.Thank you for your time! Have a great day."
+LOST_PLACE_TEXT = "I'm sorry, I seem to have lost my place. Goodbye."
+
+def _hangup(text, static=False):
+    return Response(content=HANGUP_TWIML.render(text, static=static), media_type="application/xml")
+
+def _is_affirmative(turn):
+    return "affirmative" in turn.intents
+
+def _is_negative(turn):
+    return "negative" in turn.intents
+
+def _is_name(turn):
+    # Check if it's a valid name not just "yes" or "no" or empty
+    cleaned = turn.text
+    return cleaned not in ["", "no response"] and cleaned not in AFFIRMATIVE and cleaned not in NEGATIVE
+
+# If user shows interest -> ask the name
+async def _ask_name(turn):
+    await session_store.aset(turn.extra["session"], {"retries": 0})
+    next_action_url = build_next_url("awaiting_name", turn.phone) 
+    return create_twiml_response(ASK_NAME_TEXT, next_action_url, static=True)
+
+# if users says no 
+async def _persuade(turn):
+    session = await session_store.aupdate(
+        turn.extra["session"], lambda s: {**s, "retries": s.get("retries", 0) + 1}, {"retries": 0}
+    )
+    retry_count = session["retries"]
+
+    print(f"Persuasion attempt #{retry_count} for {turn.phone}")
+
+    if retry_count >= 5:
+        await session_store.adelete(turn.extra["session"])
+        return _hangup(PERSUASION_END_TEXT, static=True)
+
+    persuasive_line = PERSUASIVE_LINES[(retry_count - 1) % len(PERSUASIVE_LINES)]
+    # pre-generated phrasing first, live LLM only if the bank doesn't have this line
+    persuasive_reply = reply_bank.pick("persuasion", persuasive_line)
+    # banked lines are a fixed set, worth keeping pre-rendered
+    banked = bool(persuasive_reply)
+    if not persuasive_reply:
+        # same five lines every call -> keep a few phrasings per line
+        persuasive_reply = await asimple_llm(persuasive_line, variants=3, budget=turn.extra["budget"], canned=persuasive_line)
+
+    if not persuasive_reply or len(persuasive_reply.strip()) < 2:
+        persuasive_reply = "Sir, just give me 10 seconds, this is really beneficial for you."
+
+    next_action_url = build_next_url("awaiting_interest", turn.phone)
+    return create_twiml_response(persuasive_reply, next_action_url, static=banked)
+
+# unclear ask again: short/empty replies get a banked line for the
+# emotion, only real open-ended utterances go to the LLM
+async def _ask_again(turn):
+    fallback_reply = ""
+    if len(turn.text.split()) < 3:
+        fallback_reply = reply_bank.pick("fallback", turn.emotion) or ""
+    banked = bool(fallback_reply)
+    if not fallback_reply:
+        fallback_prompt = (
+            f"You are a friendly sales agent. "
+            f"User said:'{turn.speech}'. Emotion: {turn.emotion}. "
+            "Ask again politely if they are interested in one short line. " 
+        )
+        fallback_reply = await asimple_llm(
+            fallback_prompt, budget=turn.extra["budget"],
+            canned="Just checking again sir, would like to know about our offers?",
+        )
+    if not fallback_reply.strip():
+        fallback_reply = "Just checking again sir, would like to know about our offers?"
+    next_action_url = build_next_url("awaiting_interest", turn.phone)
+    return create_twiml_response(fallback_reply, next_action_url, static=banked)
+
+#  Capture name 
+async def _save_lead(turn):
+    user_name = turn.speech
+    
+    #  This is your final message 
+    ai_reply_text = (
+        f"Thank you {user_name}! Our agent will contact you shortly for further assistance. "
+        "We appreciate your time. Have a wonderful day! "
+        "If you have any query feel free to contact us on 20215"
+    )
+    
+     #  This is your lead-saving logic
+    log_lead_excel(user_name, "Interested", turn.emotion, turn.phone)
+    await session_store.adelete(turn.extra["session"])
+    
+    # This part now runs instantly
+    return _hangup(ai_reply_text)
+
+def _repeat_name(turn):
+    # User said something other than a name
+    next_action_url = build_next_url("awaiting_name", turn.phone) 
+    return create_twiml_response(REPEAT_NAME_TEXT, next_action_url, static=True)
+
+#  Default fallback if state is unknown 
+def _lost_place(turn):
+    return _hangup(LOST_PLACE_TEXT, static=True)
+
+LEAD_FLOW = Flow(
+    "lead",
+    {
+        "awaiting_interest": [
+            Transition("yes", _ask_name, _is_affirmative),
+            Transition("no", _persuade, _is_negative),
+            Transition("unclear", _ask_again),
+        ],
+        "awaiting_name": [
+            Transition("name", _save_lead, _is_name),
+            Transition("no_name", _repeat_name),
+        ],
+    },
+    default=_lost_place,
+)
+
+GATHER_TWIML.warm([intro_message(), ASK_NAME_TEXT, REPEAT_NAME_TEXT])
+HANGUP_TWIML.warm([PERSUASION_END_TEXT, LOST_PLACE_TEXT])
 
 #  This endpoint handles the entire conversation loop 
 # @app.post("/handle-conversation")
 @router.post("/handle-conversation")
 @router.get("/handle-conversation")
-def handle_conversation(
+async def handle_conversation(
     background_tasks: BackgroundTasks, 
     SpeechResult: str = Form(None),
-    state: str = Query("awaiting_interest"), 
-    phone: str = Query("Unknown"),
+    s: str = Query(None),
+    CallSid: str = Form(None),
     ):
     """
-    This is the main "loop" based on your new script's logic.
+    This is the main "loop": the current state picks the transition from LEAD_FLOW.
     """
-    response = VoiceResponse()
-    
-    # initialize retry counter for this phone 
-    if phone not in CONV_STATE:
-        CONV_STATE[phone] = {"retries":0}
-        
-    user_input = SpeechResult if SpeechResult else ""
-    user_input_lower = user_input.lower().strip()
-    emotion = detect_emotion(user_input)
-    
-    print(f"User ({phone}) said: {user_input} (State: {state})")
-
-    affirmative_match = any(word in user_input_lower for word in AFFIRMATIVE)
-    negative_match = any(word in user_input_lower for word in NEGATIVE)
-
-    # If user shows interest 
-    if state == "awaiting_interest":
-        # if user says yes
-        if affirmative_match:
-            CONV_STATE[phone]["retries"] = 0
-            ai_reply_text = "That’s great! May I know your good name, please?"
-            next_action_url = build_next_url("awaiting_name", phone) 
-            return create_twiml_response(ai_reply_text, next_action_url)
-        
-        # elif negative_match or user_input_lower in ["exit", "quit", "stop", "bye", "goodbye", "ok bye"]:
-        #     ai_reply_text = "No problem. Thank you for your time! Have a great day."
-        #     response.say(ai_reply_text)
-        #     response.hangup()
-        #     return Response(content=str(response), media_type="application/xml")
-        
-        # if users says no 
-        if negative_match:
-            CONV_STATE[phone]["retries"] += 1
-            retry_count = CONV_STATE[phone]["retries"]
-
-            print(f"Persuasion attempt #{retry_count} for {phone}")
-
-            if retry_count >= 5:
-                response.say("No problem.Thank you for your time! Have a great day.")
-                response.hangup()
-                return Response(content=str(response), media_type="application/xml")
-
-            PERSUASIVE_LINES = [
-                "Sir, just 10 seconds please, I promise this is helpful.",
-                "Sir, this will really benefit you, just hear me out for a moment.",
-                "Sir, one quick thing — this offer is really worthwhile.",
-                "Sir, just a moment, I believe this can help you a lot.",
-                "Sir, trust me, this information may be important for you."
-            ]
-
-            persuasive_reply = PERSUASIVE_LINES[(retry_count - 1) % len(PERSUASIVE_LINES)]
-            persuasive_reply = simple_llm(persuasive_reply)
-
-            if not persuasive_reply or len(persuasive_reply.strip()) < 2:
-                persuasive_reply = "Sir, just give me 10 seconds, this is really beneficial for you."
-
-            next_action_url = build_next_url("awaiting_interest", phone)
-            return create_twiml_response(persuasive_reply, next_action_url)
-        
-        # unclear ask again using ai 
-        fallback_prompt = (
-            f"You are a friendly sales agent. "
-            f"User said:'{user_input}'. Emotion: {emotion}. "
-            "Ask again politely if they are interested in one short line. " 
-        )
-        
-        fallback_reply = simple_llm(fallback_prompt)
-        if not fallback_reply.strip():
-            fallback_reply = "Just checking again sir, would like to know about our offers?"
-        next_action_url = build_next_url("awaiting_interest", phone)
-        return create_twiml_response(fallback_reply,next_action_url)
-        
-        # # Fallback for this state if not yes/no
-        # prompt = f"You are a friendly sales agent. User said: '{user_input}'. User emotion: {emotion}. Your goal is to ask if they are interested. Respond naturally and briefly."
-        # ai_reply = ai_response(prompt)
-        # next_action_url = build_next_url("awaiting_interest", phone) 
-        # return create_twiml_response(ai_reply, next_action_url)
-
-    #  Capture name 
-    elif state == "awaiting_name":
-        # Check if it's a valid name not just "yes" or "no" or empty
-        cleaned = user_input_lower.strip()
-        if cleaned not in ["", "no response"] and cleaned not in AFFIRMATIVE and cleaned not in NEGATIVE:
-            user_name = SpeechResult 
-            
-            #  This is your final message 
-            ai_reply_text = (
-                f"Thank you {user_name}! Our agent will contact you shortly for further assistance. "
-                "We appreciate your time. Have a wonderful day! "
-                "If you have any query feel free to contact us on 20215"
-            )
-            
-             #  This is your lead-saving logic
-            background_tasks.add_task(log_lead_excel, user_name, "Interested", emotion, phone)
-            
-            # This part now runs instantly
-            response.say(ai_reply_text)
-            response.hangup()
-            return Response(content=str(response), media_type="application/xml")
-        
-        else:
-            # User said something other than a name
-            ai_reply_text = "I'm sorry, I didn't quite catch your name. Could you please tell me your name?"
-            next_action_url = build_next_url("awaiting_name", phone) 
-            return create_twiml_response(ai_reply_text, next_action_url)
-            
-    #  Default fallback if state is unknown 
-    ai_reply_text = "I'm sorry, I seem to have lost my place. Goodbye."
-    response.say(ai_reply_text)
-    response.hangup()
-    return Response(content=str(response), media_type="application/xml")
+    state, phone = "awaiting_interest", "Unknown"
+    if s:
+        try:
+            decoded = LEAD_STATE.decode(s)
+            state, phone = decoded["state"], decoded["phone"]
+        except StateTokenError as e:
+            # tampered/expired token: no state matches, LEAD_FLOW ends the call
+            print(f"Rejected state token: {e}")
+            state = "invalid"
+    print(f"User ({phone}) said: {SpeechResult or ''} (State: {state})")
+
+    turn = Turn(
+        state, SpeechResult, phone, background_tasks,
+        emotion_fn=detect_emotion,
+        matcher=INTENT_MATCHER,
+        # latency budget for this webhook; LLM calls fall back to canned lines past it
+        budget=call_budget.Budget(),
+        # retry counters live in the session store, one record per call
+        session=CallSid or phone,
+    )
+    return await LEAD_FLOW.adispatch(turn)
+
+
+#  Leads as .xlsx, exported from the log store on request 
+@router.get("/download-leads")
+async def download_leads(request: Request, since: str = None, until: str = None):
+    # streamed from the log store (see /export/leads for csv / jsonl)
+    return await export_response(request, "leads", "xlsx", filename="Sales_Leads.xlsx", since=since, until=until)
 
 
 #  ENDPOINTS TO TRIGGER OUTBOUND CALLS 
 def _initiate_call(user_number: str):
     """Helper function to load env vars and make a single call."""
+    # don't dial while the LLM is cold, the caller would hear silence
+    if not model_warmup.models_ready():
+        return {"status": "Failed", "error": "LLM models are still warming up, try again shortly", "to": user_number}
+
     load_dotenv()
 
     account_sid = os.getenv("TWILIO_ACCOUNT_SID")
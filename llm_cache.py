@@ -0,0 +1,105 @@
+import os
+import re
+import time
+import random
+import threading
+from collections import OrderedDict
+
+# Bounded LRU + TTL cache in front of the LLM.
+# Key = (model, normalized prompt). Each key can hold a few different
+# generations so repeated callers don't always hear the exact same line.
+
+CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))   # seconds
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", (prompt or "").lower()).strip()
+    return text.rstrip(" .!?")
+
+
+class LLMCache:
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, [replies])
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, prompt, model):
+        return (model, normalize_prompt(prompt))
+
+    def get(self, prompt, model, variants=1):
+        """
+        Return a cached reply or None.
+        With variants > 1 the key counts as a miss until it holds that many
+        different replies; after that one is picked at random.
+        """
+        key = self._key(prompt, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < now:
+                del self._data[key]
+                entry = None
+            if entry is None or len(entry[1]) < variants:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry[1])
+
+    def put(self, prompt, model, reply, variants=1):
+        if not reply:
+            return
+        key = self._key(prompt, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                replies = []
+            else:
+                replies = entry[1]
+            # duplicates still fill a slot so a deterministic model can't
+            # keep the key missing forever
+            replies.append(reply)
+            # keep only the newest `variants` replies
+            del replies[:-max(variants, 1)]
+            self._data[key] = (now + self.ttl, replies)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_generate(self, prompt, model, producer, variants=1):
+        """Serve from cache, otherwise call producer() and store its reply."""
+        reply = self.get(prompt, model, variants)
+        if reply is not None:
+            return reply
+        reply = producer()
+        self.put(prompt, model, reply, variants)
+        return reply
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# shared instance used by the routers
+llm_cache = LLMCache()
@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import time
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from llm_dispatcher import dispatcher
+
+# Shared Ollama client used by every LLM call site.
+# One pooled keep-alive session (sync) and one async client, so a turn
+# never pays for a fresh TCP connection to the inference box.
+
+#  Config (single place for URLs, models and timeouts)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
+
+# model used for short conversational replies and the agents
+CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "phi3:mini")
+# model used for Hindi translation / generation in the Hindi bot
+TRANSLATE_MODEL = os.getenv("OLLAMA_TRANSLATE_MODEL", "gemma2:9b-q4_K_M")
+
+# seconds to open a connection vs. seconds to wait for the generation
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "1.0"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "15"))
+
+# how many pooled connections we keep open to Ollama
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "64"))
+
+# how long Ollama keeps a model loaded after each request ("-1" = forever)
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+
+# stream tokens and stop at the first complete sentence (prompts ask for one line)
+STREAMING = os.getenv("OLLAMA_STREAMING", "1") == "1"
+
+
+class LLMError(Exception):
+    """Raised when Ollama can't be reached or returns an unusable body."""
+
+
+#  Sync session (keep-alive pool)
+_session = None
+
+def get_session():
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _session = s
+    return _session
+
+
+#  Async client (keep-alive pool)
+_async_client = None
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=OLLAMA_URL,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _async_client
+
+
+def _timeout(timeout):
+    # requests wants (connect, read); callers just pass the read budget
+    return (CONNECT_TIMEOUT, timeout if timeout is not None else READ_TIMEOUT)
+
+
+def _keep_alive():
+    # Ollama accepts a duration string ("30m") or a number of seconds
+    try:
+        return int(KEEP_ALIVE)
+    except ValueError:
+        return KEEP_ALIVE
+
+
+def _generate_body(prompt, model, options, extra):
+    # every request re-arms keep_alive, otherwise Ollama resets it to 5 minutes
+    body = {"model": model or CHAT_MODEL, "prompt": prompt, "stream": False, "keep_alive": _keep_alive()}
+    if options:
+        body["options"] = options
+    if extra:
+        body.update(extra)
+    return body
+
+
+def _chat_body(messages, model, options, extra):
+    body = {"model": model or CHAT_MODEL, "messages": messages, "stream": False, "keep_alive": _keep_alive()}
+    if options:
+        body["options"] = options
+    if extra:
+        body.update(extra)
+    return body
+
+
+def _dispatch_key(kind, path, body):
+    # identical request bodies in flight share one Ollama call
+    return (kind, path, json.dumps(body, sort_keys=True, ensure_ascii=False))
+
+
+def _extract(data, key):
+    if key == "response":
+        return data.get("response", "")
+    return data.get("message", {}).get("content", "")
+
+
+#  Sync API
+def _post_sync(path, body, key, timeout):
+    try:
+        r = get_session().post(f"{OLLAMA_URL}{path}", json=body, timeout=_timeout(timeout))
+        r.raise_for_status()
+        return _extract(r.json(), key).strip()
+    except (requests.RequestException, ValueError) as e:
+        raise LLMError(str(e)) from e
+
+
+def generate(prompt, model=None, timeout=None, options=None, **extra):
+    """Run /api/generate and return the stripped response text."""
+    body = _generate_body(prompt, model, options, extra)
+    return dispatcher.run(
+        _dispatch_key("full", "/api/generate", body),
+        lambda: _post_sync("/api/generate", body, "response", timeout),
+    )
+
+
+def chat(messages, model=None, timeout=None, options=None, **extra):
+    """Run /api/chat and return the assistant message content."""
+    body = _chat_body(messages, model, options, extra)
+    return dispatcher.run(
+        _dispatch_key("full", "/api/chat", body),
+        lambda: _post_sync("/api/chat", body, "message", timeout),
+    )
+
+
+#  Streaming: stop at the first complete sentence
+# sentence ends on . ! ? or the Hindi danda, followed by whitespace; a newline
+# after some text also counts since the prompts ask for a single line
+_SENTENCE_END = re.compile(r"^(.*?\S.*?(?:[.!?।]+(?=\s)|(?=\n)))", re.S)
+
+
+def first_sentence(text):
+    """Return the first complete sentence in text, or None if there isn't one yet."""
+    m = _SENTENCE_END.match(text.lstrip())
+    if not m:
+        return None
+    return m.group(1).strip()
+
+
+def _stream_until_sentence(chunks, deadline, cancel=None):
+    buf = ""
+    for chunk in chunks:
+        if cancel is not None and cancel.is_set():
+            raise LLMError("cancelled")
+        buf += chunk
+        sentence = first_sentence(buf)
+        if sentence:
+            return sentence
+        if deadline is not None and time.monotonic() > deadline:
+            raise LLMError("timed out before the first sentence")
+    # stream finished without a terminator: whatever we got is the answer
+    return buf.strip()
+
+
+def _iter_stream(response, key):
+    for line in response.iter_lines():
+        if not line:
+            continue
+        data = json.loads(line)
+        yield _extract(data, key)
+        if data.get("done"):
+            break
+
+
+def _stream_sync(path, body, key, timeout, cancel=None):
+    if cancel is not None and cancel.is_set():
+        raise LLMError("cancelled")
+    body = dict(body, stream=True)
+    budget = timeout if timeout is not None else READ_TIMEOUT
+    deadline = time.monotonic() + budget
+    try:
+        with get_session().post(
+            f"{OLLAMA_URL}{path}", json=body, timeout=_timeout(timeout), stream=True
+        ) as r:
+            r.raise_for_status()
+            # leaving the with-block closes the socket, which also makes
+            # Ollama abort the rest of the generation
+            return _stream_until_sentence(_iter_stream(r, key), deadline, cancel)
+    except (requests.RequestException, ValueError) as e:
+        raise LLMError(str(e)) from e
+
+
+def generate_first_sentence(prompt, model=None, timeout=None, options=None, **extra):
+    """Like generate(), but returns as soon as the first sentence is complete."""
+    if not STREAMING:
+        return first_sentence(generate(prompt, model, timeout, options, **extra) + "\n") or ""
+    body = _generate_body(prompt, model, options, extra)
+    return dispatcher.run(
+        _dispatch_key("sentence", "/api/generate", body),
+        lambda: _stream_sync("/api/generate", body, "response", timeout),
+    )
+
+
+def chat_first_sentence(messages, model=None, timeout=None, options=None, cancel=None, **extra):
+    """
+    Like chat(), but returns as soon as the first sentence is complete.
+    Setting the `cancel` Event aborts the stream at the next chunk (LLMError),
+    which frees the dispatcher slot and stops the generation in Ollama.
+    """
+    if not STREAMING:
+        return first_sentence(chat(messages, model, timeout, options, **extra) + "\n") or ""
+    body = _chat_body(messages, model, options, extra)
+    key = _dispatch_key("sentence", "/api/chat", body)
+    if cancel is not None:
+        # a cancellable call must not hand its cancellation to a coalesced caller
+        key += (id(cancel),)
+    return dispatcher.run(key, lambda: _stream_sync("/api/chat", body, "message", timeout, cancel))
+
+
+#  Async API
+async def _post_async(path, body, key, timeout):
+    try:
+        r = await get_async_client().post(
+            path, json=body, timeout=httpx.Timeout(timeout or READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        r.raise_for_status()
+        return _extract(r.json(), key).strip()
+    except (httpx.HTTPError, ValueError) as e:
+        raise LLMError(str(e)) from e
+
+
+async def agenerate(prompt, model=None, timeout=None, options=None, **extra):
+    body = _generate_body(prompt, model, options, extra)
+    return await dispatcher.arun(
+        _dispatch_key("full", "/api/generate", body),
+        lambda: _post_async("/api/generate", body, "response", timeout),
+    )
+
+
+async def achat(messages, model=None, timeout=None, options=None, **extra):
+    body = _chat_body(messages, model, options, extra)
+    return await dispatcher.arun(
+        _dispatch_key("full", "/api/chat", body),
+        lambda: _post_async("/api/chat", body, "message", timeout),
+    )
+
+
+async def _astream(path, body, key, timeout):
+    body = dict(body, stream=True)
+    budget = timeout or READ_TIMEOUT
+    deadline = time.monotonic() + budget
+    buf = ""
+    try:
+        async with get_async_client().stream(
+            "POST", path, json=body, timeout=httpx.Timeout(budget, connect=CONNECT_TIMEOUT)
+        ) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                buf += _extract(data, key)
+                sentence = first_sentence(buf)
+                if sentence:
+                    return sentence
+                if data.get("done"):
+                    break
+                if time.monotonic() > deadline:
+                    raise LLMError("timed out before the first sentence")
+        return buf.strip()
+    except (httpx.HTTPError, ValueError) as e:
+        raise LLMError(str(e)) from e
+
+
+async def agenerate_first_sentence(prompt, model=None, timeout=None, options=None, **extra):
+    if not STREAMING:
+        return first_sentence(await agenerate(prompt, model, timeout, options, **extra) + "\n") or ""
+    body = _generate_body(prompt, model, options, extra)
+    return await dispatcher.arun(
+        _dispatch_key("sentence", "/api/generate", body),
+        lambda: _astream("/api/generate", body, "response", timeout),
+    )
+
+
+async def achat_first_sentence(messages, model=None, timeout=None, options=None, **extra):
+    if not STREAMING:
+        return first_sentence(await achat(messages, model, timeout, options, **extra) + "\n") or ""
+    body = _chat_body(messages, model, options, extra)
+    return await dispatcher.arun(
+        _dispatch_key("sentence", "/api/chat", body),
+        lambda: _astream("/api/chat", body, "message", timeout),
+    )
+
+
+async def aclose():
+    """Close the async pool (call on server shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
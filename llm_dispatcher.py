@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+# LLM request dispatcher.
+# - single-flight: identical in-flight requests share one Ollama call
+# - concurrency cap: at most MAX_CONCURRENCY requests reach Ollama at once,
+#   the rest wait in line (queue depth and wait time are tracked)
+#
+# Ollama has no multi-prompt /api/generate; it batches concurrent requests
+# itself up to OLLAMA_NUM_PARALLEL, so the cap defaults to that value and the
+# box always gets a full batch without an ever-growing queue behind it.
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+
+
+class LLMDispatcher:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._sem = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight = {}          # key -> Future (sync callers)
+        self._ainflight = {}         # key -> asyncio.Future (async callers)
+        self._asem = None
+        self._asem_loop = None
+        self.queued = 0              # waiting for a slot right now
+        self.running = 0             # holding a slot right now
+        self.coalesced = 0
+        self.dispatched = 0
+        self._waits = deque(maxlen=1000)
+
+    #  sync (threadpool handlers)
+    def run(self, key, fn):
+        """Run fn() through the dispatcher; identical keys in flight share one result."""
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                fut = Future()
+                self._inflight[key] = fut
+                leader = True
+        if not leader:
+            return fut.result()
+
+        try:
+            self._acquire()
+            try:
+                result = fn()
+            finally:
+                self._release()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _acquire(self):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+        self._sem.acquire()
+        self._mark_started(started)
+
+    def _release(self):
+        with self._lock:
+            self.running -= 1
+        self._sem.release()
+
+    def _mark_started(self, started):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.dispatched += 1
+            self._waits.append(time.perf_counter() - started)
+
+    #  async (event-loop handlers)
+    def _async_sem(self):
+        loop = asyncio.get_running_loop()
+        if self._asem is None or self._asem_loop is not loop:
+            self._asem = asyncio.Semaphore(self.max_concurrency)
+            self._asem_loop = loop
+            self._ainflight = {}
+        return self._asem
+
+    async def arun(self, key, coro_fn):
+        sem = self._async_sem()
+        fut = self._ainflight.get(key)
+        if fut is not None:
+            with self._lock:
+                self.coalesced += 1
+            # shield: one follower giving up must not cancel the shared call
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._ainflight[key] = fut
+        try:
+            started = time.perf_counter()
+            with self._lock:
+                self.queued += 1
+            try:
+                await sem.acquire()
+            except BaseException:
+                with self._lock:
+                    self.queued -= 1
+                raise
+            self._mark_started(started)
+            try:
+                result = await coro_fn()
+            finally:
+                sem.release()
+                with self._lock:
+                    self.running -= 1
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            if fut.done():
+                pass
+            elif isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                # mark retrieved so asyncio doesn't warn when nobody coalesced
+                fut.exception()
+            raise
+        finally:
+            self._ainflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            out = {
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "dispatched": self.dispatched,
+                "coalesced": self.coalesced,
+            }
+        if waits:
+            out["wait_mean_ms"] = round(1000 * sum(waits) / len(waits), 1)
+            out["wait_p95_ms"] = round(1000 * waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1)
+        return out
+
+
+# shared instance used by llm_client
+dispatcher = LLMDispatcher()
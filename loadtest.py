@@ -0,0 +1,126 @@
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from html import unescape
+
+import httpx
+
+# Webhook load test: simulates N concurrent Twilio calls against a running
+# server (one uvicorn worker) and reports latency percentiles and errors.
+# Each simulated call POSTs start-call, then follows the <Gather action=...>
+# URL of every reply with the next utterance, like Twilio does.
+#
+#   python loadtest.py --calls 500 --concurrency 200 --router link
+#   python loadtest.py --fake-ollama 11500 ...   (start the server with
+#       OLLAMA_URL=http://127.0.0.1:11500 to measure without a GPU)
+
+UTTERANCES = {
+    "lead": ["no", "not now", "hmm what is this about", "yes", "Rahul Sharma"],
+    "link": ["no", "maybe later", "yes", "tell me more", "bye"],
+}
+_ACTION = re.compile(r'action="([^"]+)"')
+
+
+async def one_call(client, router, turns, latencies, errors):
+    phone = f"+9198{random.randint(10000000, 99999999)}"
+    call_sid = f"CA{random.getrandbits(128):032x}"
+    form = {"From": "+10000000000", "To": phone, "CallSid": call_sid}
+    url = f"/{router}/start-call"
+    for i in range(turns + 1):
+        started = time.perf_counter()
+        try:
+            r = await client.post(url, data=form)
+            r.raise_for_status()
+        except Exception as e:
+            errors.append(f"{url.split('?')[0]}: {type(e).__name__} {e}")
+            return
+        latencies.append(time.perf_counter() - started)
+        m = _ACTION.search(r.text)
+        if not m:
+            return      # call ended (hangup)
+        url = unescape(m.group(1))
+        form = {"SpeechResult": UTTERANCES[router][i % len(UTTERANCES[router])], "CallSid": call_sid}
+
+
+async def run(args):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def guarded():
+            async with slots:
+                await one_call(client, args.router, args.turns, latencies, errors)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(guarded() for _ in range(args.calls)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    n = len(latencies)
+
+    def pct(p):
+        return 1000 * latencies[min(n - 1, int(p * n))] if n else 0.0
+
+    print(f"{args.calls} calls, {args.concurrency} concurrent, router={args.router}")
+    print(f"requests: {n} ok, {len(errors)} failed in {wall:.1f}s ({n / wall:.1f} req/s)")
+    print(f"latency ms: p50={pct(0.50):.0f} p95={pct(0.95):.0f} p99={pct(0.99):.0f} max={pct(1.0):.0f}")
+    for e in sorted(set(errors))[:10]:
+        print("  error:", e)
+
+
+#  Minimal stand-in for Ollama: fixed latency, NDJSON streaming
+async def fake_ollama(port, delay):
+    async def handle(reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(re.search(rb"(?i)content-length:\s*(\d+)", head).group(1))
+            body = json.loads(await reader.readexactly(length) or b"{}")
+            await asyncio.sleep(delay)
+            text = "Sure, we have a special offer for you today. Would you like to hear it?"
+            if body.get("stream", True):
+                words = text.split(" ")
+                payload = b"".join(
+                    json.dumps({"response": w + " ", "done": False}).encode() + b"\n" for w in words
+                ) + json.dumps({"response": "", "done": True}).encode() + b"\n"
+                ctype = b"application/x-ndjson"
+            else:
+                payload = json.dumps({"response": text, "message": {"content": text}, "done": True}).encode()
+                ctype = b"application/json"
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: " + ctype
+                + b"\r\nContent-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+            )
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"fake Ollama on http://127.0.0.1:{port} ({delay}s per request)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent webhook load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--router", choices=sorted(UTTERANCES), default="link")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--fake-ollama", type=int, metavar="PORT",
+                        help="only run a fake Ollama server on PORT (no load test)")
+    parser.add_argument("--fake-delay", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.fake_ollama:
+        asyncio.run(fake_ollama(args.fake_ollama, args.fake_delay))
+        sys.exit(0)
+    asyncio.run(run(args))
@@ -0,0 +1,199 @@
+import os
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+from log_store import log_store
+from executors import io_executor
+import parquet_log
+
+# Single-writer log pipeline.
+# Webhooks only put a row on a bounded queue; one writer thread takes rows
+# off in batches and appends each batch to the log store in a single
+# transaction, when BATCH_SIZE rows are waiting or FLUSH_INTERVAL has
+# passed. submit() never blocks (it runs on the event loop): when the queue
+# is full the row is written as its own job on the io pool, and only if
+# that pool is backed up too is it dropped and counted. close() drains
+# everything before the process exits.
+# Sinks get every written batch too (the Parquet analytics copy), with the
+# log id of its last row. A sink may also have backfill(store), run by the
+# writer thread when it starts, and tick(), run whenever the queue is idle.
+
+MAX_QUEUE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+
+_STOP = object()
+
+
+class LogPipeline:
+    def __init__(self, store=log_store, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.overflow = 0       # rows written through the io pool (queue full)
+        self.dropped = 0        # queue and io pool both full
+        self.failed = 0
+        self.sinks = []         # callables(table, rows, last_id) run after each write
+
+    def add_sink(self, fn):
+        self.sinks.append(fn)
+
+    def start(self):
+        """Start the writer thread now (and with it the sinks' backfill)."""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, table, row):
+        """Queue one row; the timestamp is taken now, not when it is flushed."""
+        row = dict(row)
+        row.setdefault("Timestamp", datetime.now())
+        with self._lock:
+            self.submitted += 1
+        if self._closed:
+            self._write(table, [row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            # never write on the caller's thread: that's the event loop
+            if io_executor.submit(self._write, table, [row]) is None:
+                with self._lock:
+                    self.dropped += 1
+                    dropped = self.dropped
+                if dropped == 1 or dropped % 1000 == 0:
+                    print(f"Log queue and io pool full: {dropped} rows dropped so far")
+                return
+            with self._lock:
+                self.overflow += 1
+
+    def _write(self, table, rows):
+        try:
+            last_id = self.store.append_many(table, rows)
+            with self._lock:
+                self.written += len(rows)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(rows)
+            print(f"CRITICAL ERROR writing {len(rows)} {table} rows to the log: {e}")
+            return
+        for fn in self.sinks:
+            try:
+                fn(table, rows, last_id)
+            except Exception as e:
+                print(f"Log sink {getattr(fn, '__module__', fn)} failed for {len(rows)} {table} rows: {e}")
+
+    def _sink_hook(self, name, *args):
+        for fn in self.sinks:
+            hook = getattr(fn, name, None)
+            if hook is None:
+                continue
+            try:
+                hook(*args)
+            except Exception as e:
+                print(f"Log sink {type(fn).__name__} {name} failed: {e}")
+
+    def _flush(self, batch):
+        by_table = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        for table, rows in by_table.items():
+            self._write(table, rows)
+        with self._lock:
+            self.batches += 1
+
+    def _drain(self):
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rest
+            if item is not _STOP:
+                rest.append(item)
+
+    def _run(self):
+        # rows the log has but a sink lost (crash while it was buffering)
+        self._sink_hook("backfill", self.store)
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # quiet line: time-based sink flushes still happen
+                self._sink_hook("tick")
+                continue
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                break
+        # drain whatever is still queued
+        rest = self._drain()
+        for i in range(0, len(rest), self.batch_size):
+            self._flush(rest[i:i + self.batch_size])
+
+    def close(self, timeout=30):
+        """Stop taking new rows on the queue and wait until everything is written."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        # rows a racing submit() queued after the writer's last drain
+        rest = self._drain()
+        if rest:
+            self._flush(rest)
+        # sinks that buffer (Parquet) write out what they hold
+        self._sink_hook("close")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "overflow": self.overflow,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+log_pipeline = LogPipeline()
+if parquet_log.available():
+    log_pipeline.add_sink(parquet_log.sink)
+# last resort if the server didn't shut down through its lifespan hook
+atexit.register(log_pipeline.close)
@@ -0,0 +1,165 @@
+import os
+import sys
+import sqlite3
+import threading
+from datetime import datetime
+
+# Append-only conversation / lead log.
+# Each turn is one INSERT into a WAL-mode SQLite file, so logging costs
+# the same on row 10 as on row 100,000 (the old Excel logs re-read and
+# re-wrote the whole workbook per turn). Excel is only an export format,
+# produced on demand with the same columns the old files had.
+#
+#   python log_store.py import turns Sales_Conversation_Twilio.xlsx
+#   python log_store.py export turns Sales_Conversation_Twilio.xlsx
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DB = os.getenv("LOG_DB", os.path.join(SCRIPT_DIR, "conversation_log.db"))
+
+# table -> columns, in export order (names match the old Excel headers)
+TABLES = {
+    "turns": ["Question", "User_Response", "Emotion", "AI_Reply", "PhoneNumber", "Timestamp"],
+    "leads": ["Name", "Interest", "Emotion", "PhoneNumber", "Timestamp"],
+    # one row per product sent (call_summary.xlsx had the same data)
+    "summary": ["PhoneNumber", "Product", "Call_Status", "Timestamp"],
+}
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# which column holds the "what happened" value for each table
+OUTCOME_COLUMN = {"turns": "Question", "leads": "Interest", "summary": "Call_Status"}
+PAGE_SIZE = 1000
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LogStore:
+    def __init__(self, path=LOG_DB):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        for table, columns in TABLES.items():
+            cols = ", ".join(f"{_quote(c)} TEXT" for c in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_phone ON {table} (PhoneNumber)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (Timestamp)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: a crash can lose the last few turns, never corrupt the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _values(table, row):
+        values = []
+        for c in TABLES[table]:
+            v = row.get(c)
+            if c == "Timestamp" and v is None:
+                v = datetime.now()
+            if isinstance(v, datetime):
+                v = v.strftime(TIMESTAMP_FORMAT)
+            values.append(None if v is None else str(v))
+        return values
+
+    def _insert_sql(self, table):
+        columns = TABLES[table]
+        return (
+            f"INSERT INTO {table} ({', '.join(map(_quote, columns))}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+
+    def append(self, table, row):
+        """Append one row (dict keyed by column name); Timestamp defaults to now."""
+        self._conn().execute(self._insert_sql(table), self._values(table, row))
+
+    def append_many(self, table, rows):
+        """Append several rows in one transaction; returns the id of the last one."""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(self._insert_sql(table), [self._values(table, r) for r in rows])
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return last_id
+
+    def count(self, table):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def version(self, table):
+        """Changes whenever rows are added (the table is append-only)."""
+        return self._conn().execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+    def rows(self, table, phone=None, since=None, until=None, outcome=None, after=0, through=None, page_size=PAGE_SIZE):
+        """
+        Yield rows as dicts in insertion order, optionally filtered
+        (after/through bound the row id). Rows are read in id-keyed pages,
+        so no read transaction stays open between pages and the generator
+        may be resumed on another thread.
+        """
+        where, params = [], []
+        if through is not None:
+            where.append("id <= ?")
+            params.append(through)
+        if phone:
+            where.append("PhoneNumber = ?")
+            params.append(phone)
+        if since:
+            where.append("Timestamp >= ?")
+            params.append(str(since))
+        if until:
+            where.append("Timestamp < ?")
+            params.append(str(until))
+        if outcome:
+            where.append(f"{_quote(OUTCOME_COLUMN[table])} = ?")
+            params.append(outcome)
+        columns = TABLES[table]
+        sql = f"SELECT id, {', '.join(map(_quote, columns))} FROM {table} WHERE " + " AND ".join(where + ["id > ?"])
+        last_id = after
+        while True:
+            page = self._conn().execute(sql + " ORDER BY id LIMIT ?", params + [last_id, page_size]).fetchall()
+            for values in page:
+                yield dict(zip(columns, values[1:]))
+            if len(page) < page_size:
+                return
+            last_id = page[-1][0]
+
+    def export_excel(self, table, path, **filters):
+        """Write the table (or a filtered slice) to .xlsx and return the path."""
+        import pandas as pd
+        df = pd.DataFrame(list(self.rows(table, **filters)), columns=TABLES[table])
+        df.to_excel(path, index=False)
+        return path
+
+    def import_excel(self, table, path):
+        """One-off migration of an old Excel log; returns the number of rows added."""
+        import pandas as pd
+        df = pd.read_excel(path)
+        df = df.reindex(columns=TABLES[table])
+        df = df.astype(object).where(df.notna(), None)
+        self.append_many(table, df.to_dict(orient="records"))
+        return len(df)
+
+    def stats(self):
+        return {"path": self.path, **{table: self.count(table) for table in TABLES}}
+
+
+log_store = LogStore()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export") or sys.argv[2] not in TABLES:
+        print(f"usage: python log_store.py import|export {'|'.join(TABLES)} FILE.xlsx")
+        sys.exit(1)
+    command, table, path = sys.argv[1:]
+    if command == "import":
+        print(f"Imported {log_store.import_excel(table, path)} rows from {path} into {table}")
+    else:
+        print(f"Exported {log_store.count(table)} rows to {log_store.export_excel(table, path)}")
@@ -1,18 +1,72 @@
 # main.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from leadGathering import (
     router as lead_router,
     _initiate_call as _initiate_lead_call,
+    LEAD_FLOW,
+    GATHER_TWIML as LEAD_GATHER_TWIML,
+    HANGUP_TWIML as LEAD_HANGUP_TWIML,
     # start_excel_call_list as lead_excel_call_list,
     )
 from speechLinkShare import (
     router as link_router,
     _initiate_call as initiate_link_call,
     start_excel_call_list as link_excel_call_list,
+    link_dialer,
+    LINK_FLOW,
+    GATHER_TWIML as LINK_GATHER_TWIML,
+    HANGUP_TWIML as LINK_HANGUP_TWIML,
     )
 from fastapi.middleware.cors import CORSMiddleware
+from llm_cache import llm_cache
+from llm_dispatcher import dispatcher
+import call_budget
+from multi_agent_core import agent_stats
+from reply_bank import reply_bank
+import llm_client
+import model_warmup
+import emotion
+import nlp_registry
+from session_store import session_store
+import executors
+from log_store import log_store
+from log_pipeline import log_pipeline
+from summary_store import summary_store
+import parquet_log
+import analytics
+import state_token
+from exports import router as export_router
 
-app = FastAPI()
+# STARTUP / SHUTDOWN
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load models in the background so the server binds right away;
+    # /health reports "warming" and dialing is refused until they're ready
+    warmup_task = asyncio.create_task(model_warmup.run())
+    # read the state-token key now: a missing secret is reported (or, with
+    # STATE_TOKEN_STRICT=1, stops the server) at startup, not mid-call
+    state_token.secret()
+    reply_bank.load()
+    # spaCy is lazy; NLP_PRELOAD=en_core_web_sm loads it in the background
+    nlp_registry.preload()
+    # the log writer starts by re-exporting rows Parquet missed (crash)
+    log_pipeline.start()
+    yield
+    warmup_task.cancel()
+    # stop bulk campaigns without waiting; numbers not dialed yet stay Queued
+    link_dialer.shutdown()
+    await llm_client.aclose()
+    # write out every queued log row, then let queued Excel writes / SMS finish
+    log_pipeline.close()
+    executors.io_executor.shutdown()
+    executors.http_executor.shutdown()
+    executors.export_executor.shutdown()
+    executors.analytics_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], 
@@ -36,6 +90,94 @@ def start_outbound_call_link(phone: str):
         return {"error": "Phone missing"}
     return initiate_link_call(phone)
 
+# model-ready status (503 while the models are still loading)
+@app.get("/health")
+def health():
+    status = model_warmup.health()
+    return JSONResponse(status, status_code=200 if model_warmup.models_ready() else 503)
+
+# LLM response cache hit/miss counters
+@app.get("/llm-cache-stats")
+def llm_cache_stats():
+    return llm_cache.stats()
+
+# LLM dispatcher queue depth, wait time and coalesced requests
+@app.get("/llm-queue-stats")
+def llm_queue_stats():
+    return dispatcher.stats()
+
+# how often webhooks fell back to a canned reply because the LLM was too slow
+@app.get("/llm-budget-stats")
+def llm_budget_stats():
+    return call_budget.stats()
+
+# per-transition timing of both conversation flows
+@app.get("/flow-stats")
+def flow_stats():
+    return {"lead": LEAD_FLOW.stats(), "link": LINK_FLOW.stats()}
+
+# multi-agent latency per mode (serial / fused / speculative)
+@app.get("/agent-stats")
+def multi_agent_stats():
+    return agent_stats()
+
+# emotion classifier cache (repeated utterances skip the lexicon pass)
+@app.get("/emotion-stats")
+def emotion_stats():
+    return emotion.cache_info()
+
+# spaCy models loaded so far, their load time and memory cost
+@app.get("/nlp-stats")
+def nlp_stats():
+    return nlp_registry.stats()
+
+# live call sessions (retry counters) and evictions
+@app.get("/session-stats")
+def session_stats():
+    return session_store.stats()
+
+# blocking work (Excel I/O, SMS) queued on the dedicated pools
+@app.get("/executor-stats")
+def executor_stats():
+    return executors.stats()
+
+# rows in the append-only conversation / lead log
+@app.get("/log-stats")
+def log_stats():
+    return {"store": log_store.stats(), "pipeline": log_pipeline.stats()}
+
+# bulk dial jobs: progress, outcome counts, retries, achieved calls/s
+@app.get("/dialer-stats")
+def dialer_stats():
+    return link_dialer.stats()
+
+# call summary rows per campaign and status
+@app.get("/summary-stats")
+def summary_stats():
+    return summary_store.stats()
+
+# conversion / emotion / outcome aggregates from the Parquet log
+@app.get("/analytics-report")
+async def analytics_report(since: str = None, until: str = None, phone: str = None, emotion: str = None):
+    if not parquet_log.available():
+        return JSONResponse({"error": "analytics needs pyarrow (pip install pyarrow)"}, status_code=503)
+    try:
+        analytics.parse_time(since)
+        analytics.parse_time(until)
+    except ValueError:
+        return JSONResponse({"error": "since/until must be YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}, status_code=400)
+    filters = {k: v for k, v in {"since": since, "until": until, "phone": phone, "emotion": emotion}.items() if v}
+    # own pool: a full scan must not hold up io work on the call path
+    return await executors.analytics_executor.run(analytics.report, **filters)
+
+# pre-rendered TwiML templates and how often a request could use one
+@app.get("/twiml-stats")
+def twiml_stats():
+    return {
+        "lead": {"gather": LEAD_GATHER_TWIML.stats(), "hangup": LEAD_HANGUP_TWIML.stats()},
+        "link": {"gather": LINK_GATHER_TWIML.stats(), "hangup": LINK_HANGUP_TWIML.stats()},
+    }
+
 # bulk calling from the excel
 
 # lead gathering bulk
@@ -60,6 +202,8 @@ def start_outbound_call_link(phone: str):
 # MOUNT TWILIO WEBHOOKS
 app.include_router(lead_router, prefix="/lead")
 app.include_router(link_router, prefix="/link")
+# streaming csv / jsonl / xlsx exports of the stores
+app.include_router(export_router, prefix="/export")
 
 # START SERVER
 # if __name__ == "__main__":
@@ -0,0 +1,77 @@
+import os
+import time
+import asyncio
+
+import llm_client
+
+# Model warm-up and keep-alive.
+# On startup every configured model is loaded into Ollama (an empty prompt
+# loads the model without generating), then a heartbeat re-arms keep_alive
+# and notices if a model got unloaded. Outbound calls are only dialed once
+# the models the call path needs (DIAL_MODELS, the chat model) are ready;
+# the others are warmed too but never hold up dialing.
+
+WARMUP_MODELS = [
+    m.strip() for m in os.getenv(
+        "WARMUP_MODELS", f"{llm_client.CHAT_MODEL},{llm_client.TRANSLATE_MODEL}"
+    ).split(",") if m.strip()
+]
+# models that must be warm before we dial out
+DIAL_MODELS = [m.strip() for m in os.getenv("DIAL_MODELS", llm_client.CHAT_MODEL).split(",") if m.strip()]
+# cold loads of a 9B model can take a while
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "180"))
+HEARTBEAT_INTERVAL = float(os.getenv("WARMUP_HEARTBEAT", "60"))
+# set to 0 to dial even while models are still loading
+REQUIRE_WARM_MODELS = os.getenv("REQUIRE_WARM_MODELS", "1") == "1"
+
+# model -> {"status": "pending|loading|ready|error", "load_seconds", "last_ok", "error"}
+MODEL_STATUS = {m: {"status": "pending"} for m in WARMUP_MODELS + DIAL_MODELS}
+
+
+def models_ready():
+    """True once every DIAL_MODELS model answered a warm-up/heartbeat."""
+    if not REQUIRE_WARM_MODELS:
+        return True
+    return all(MODEL_STATUS[m]["status"] == "ready" for m in DIAL_MODELS)
+
+
+def health():
+    return {
+        "status": "ok" if models_ready() else "warming",
+        "keep_alive": llm_client.KEEP_ALIVE,
+        "models": MODEL_STATUS,
+    }
+
+
+async def warm_model(model):
+    status = MODEL_STATUS.setdefault(model, {})
+    if status.get("status") != "ready":
+        status["status"] = "loading"
+    started = time.perf_counter()
+    try:
+        # empty prompt: Ollama loads the model and applies keep_alive
+        await llm_client.agenerate("", model=model, timeout=WARMUP_TIMEOUT)
+        status.update(
+            status="ready",
+            load_seconds=round(time.perf_counter() - started, 2),
+            last_ok=time.strftime("%Y-%m-%d %H:%M:%S"),
+            error=None,
+        )
+    except llm_client.LLMError as e:
+        status.update(status="error", error=str(e))
+        print(f"Warm-up failed for {model}: {e}")
+
+
+async def warm_up():
+    print(f"Warming up models: {', '.join(MODEL_STATUS)}")
+    await asyncio.gather(*(warm_model(m) for m in MODEL_STATUS))
+    for model, s in MODEL_STATUS.items():
+        print(f"  {model}: {s['status']} ({s.get('load_seconds')}s)")
+
+
+async def run():
+    """Warm everything, then keep models resident with a periodic heartbeat."""
+    await warm_up()
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await asyncio.gather(*(warm_model(m) for m in MODEL_STATUS))
@@ -1,12 +1,77 @@
-import ollama
+import os
 import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import llm_client
 
-# Low-latency LLM call
-def call_llm(messages):
-    response = ollama.chat(
-        model="phi3:mini",
-    )
-    return response["message"]["content"]
+# How a turn is produced:
+#   serial      - planner, then worker (two LLM round-trips)
+#   fused       - one prompt returns both the action and the spoken line
+#   speculative - worker for the most likely action runs alongside the planner
+AGENT_MODE = os.getenv("AGENT_MODE", "serial")
+AGENT_MODES = ("serial", "fused", "speculative")
+
+ALLOWED_ACTIONS = ["ask_interest", "persuade", "ask_name", "fallback"]
+
+# most likely planner action for each conversation state (used to speculate)
+LIKELY_ACTION = {
+    "awaiting_interest": "ask_interest",
+    "awaiting_name": "ask_name",
+}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_WORKERS", "8")))
+
+# Ollama structured output: the planner can only emit one allowed action
+PLANNER_SCHEMA = {
+    "type": "object",
+    "properties": {"action": {"type": "string", "enum": ALLOWED_ACTIONS}},
+    "required": ["action"],
+}
+# {"action":"ask_interest"} is ~10 tokens; stop at the closing brace
+PLANNER_OPTIONS = {"temperature": 0, "num_predict": 24, "stop": ["}"]}
+
+FUSED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ALLOWED_ACTIONS},
+        "reply": {"type": "string"},
+    },
+    "required": ["action", "reply"],
+}
+
+# Low-latency LLM call (shared pooled Ollama client)
+# first_sentence=True streams and stops at the first complete sentence
+def call_llm(messages, first_sentence=False, **kwargs):
+    if first_sentence:
+        return llm_client.chat_first_sentence(messages, model=llm_client.CHAT_MODEL, **kwargs)
+    return llm_client.chat(messages, model=llm_client.CHAT_MODEL, **kwargs)
+
+#  Planner parse-failure tracking 
+# parse_failures are replies the JSON/schema check rejected; llm_errors
+# (timeouts, transport errors) never produced a reply and are kept apart
+_planner_counts = {"calls": 0, "parse_failures": 0, "llm_errors": 0}
+_planner_lock = threading.Lock()
+
+def _planner_result(action, reason, counter=None):
+    with _planner_lock:
+        _planner_counts["calls"] += 1
+        if counter:
+            _planner_counts[counter] += 1
+    return {"action": action, "reason": reason}
+
+def parse_planner_reply(reply):
+    """Validate the planner output against the allowed actions; None if unusable."""
+    text = reply.strip()
+    # the stop sequence eats the closing brace
+    if text.startswith("{") and not text.endswith("}"):
+        text += "}"
+    try:
+        action = json.loads(text).get("action")
+    except (ValueError, AttributeError):
+        return None
+    return action if action in ALLOWED_ACTIONS else None
 
 # Decides what the assistant should do next
 
@@ -21,40 +86,27 @@ def planner_agent(user_msg,state):
       - fallback
       
        Output ONLY valid JSON:
-    {
-      "action":"ask_interest | persuade | ask_name | fallback",
-      "reason":".... "
-    }
+    {"action":"ask_interest | persuade | ask_name | fallback"}
     """
     
     user_input = f"Conversation state:{state} \nUser said: {user_msg}"
     
-    reply = call_llm([
-        {"role":"system", "content": system},
-        {"role":"user","content":user_input}
-    ])
-    
-    start = reply.find("{")
-    end = reply.rfind("}")
-    
-    # if no json founf -> fallback 
-    if start == -1 or end == -1:
-        return{
-            "action": "fallback",
-            "reason":"LLM did not return JSON"
-        }
-    json_text = reply[start:end +1]
-    
     try:
-        return json.loads(json_text)
-    except:
-        return{
-            "action":"fallback",
-            "reason":"JSON parse error"
-        }
+        reply = call_llm([
+            {"role":"system", "content": system},
+            {"role":"user","content":user_input}
+        ], format=PLANNER_SCHEMA, options=PLANNER_OPTIONS)
+    except llm_client.LLMError as e:
+        return _planner_result("fallback", f"LLM error: {e}", "llm_errors")
+    
+    action = parse_planner_reply(reply)
+    if action is None:
+        print("Planner returned invalid output:", repr(reply))
+        return _planner_result("fallback", "JSON parse error", "parse_failures")
+    return _planner_result(action, "planner")
 # working agent 
 
-def worker_agent(action, user_msg, emotion):
+def worker_agent(action, user_msg, emotion, cancel=None):
     system = f""" 
     You are a friendly sales agent 
     keep responses SHORT (one sentence).
@@ -66,13 +118,114 @@ def worker_agent(action, user_msg, emotion):
     reply = call_llm([
         {"role": "system", "content": system},
         {"role":"user", "content": user_msg}
-    ])
+    ], first_sentence=True, cancel=cancel)
     
     return reply.strip()
 
-# main entry used by fastapi bot 
-def run_multi_agent(user_message, conversation_state="awaiting_interest", emotion="neutral"):
-    plan = planner_agent(user_message, conversation_state)
+# planner + worker in a single constrained prompt
+def fused_agent(user_msg, state, emotion):
+    system = f"""
+    You are a friendly sales agent.
+    First decide the NEXT ACTION, then say it to the user.
+    Allowed actions: {", ".join(ALLOWED_ACTIONS)}
+    Conversation state: {state}
+    User emotion: {emotion}
+    The reply must be SHORT (one sentence) in natural spoken English/Hinglish.
+    Output ONLY valid JSON:
+    {{"action":"<one allowed action>","reply":"<what you say>"}}
+    """
+
+    try:
+        raw = call_llm([
+            {"role": "system", "content": system},
+            {"role": "user", "content": user_msg}
+        ], format=FUSED_SCHEMA, options={"num_predict": 80})
+        data = json.loads(raw)
+        action = data.get("action")
+        reply = str(data.get("reply", "")).strip()
+    except Exception:
+        action, reply = None, ""
+
+    if action not in ALLOWED_ACTIONS or not reply:
+        # broken output -> one worker call is still cheaper than serial mode
+        return worker_agent("fallback", user_msg, emotion)
+    return reply
+
+# worker for the predicted action runs while the planner thinks
+def speculative_agent(user_msg, state, emotion):
+    guess = LIKELY_ACTION.get(state, "ask_interest")
+    cancel = threading.Event()
+    speculative = _executor.submit(worker_agent, guess, user_msg, emotion, cancel)
+
+    plan = planner_agent(user_msg, state)
     action = plan["action"]
 
-    return worker_agent(action, user_message, emotion)
\ No newline at end of file
+    if action == guess:
+        _record_speculation(True)
+        return speculative.result()
+
+    # prediction missed: stop the speculative call (if it hasn't started,
+    # cancel() drops it; if it is streaming, the event aborts it at the next
+    # chunk and frees its dispatcher slot) and run the real one
+    _record_speculation(False)
+    if not speculative.cancel():
+        cancel.set()
+    return worker_agent(action, user_msg, emotion)
+
+#  Per-mode latency stats 
+_stats_lock = threading.Lock()
+_latencies = {mode: deque(maxlen=1000) for mode in AGENT_MODES}
+_speculation = {"hits": 0, "misses": 0}
+
+def _record_latency(mode, seconds):
+    with _stats_lock:
+        _latencies[mode].append(seconds)
+
+def _record_speculation(hit):
+    with _stats_lock:
+        _speculation["hits" if hit else "misses"] += 1
+
+def agent_stats():
+    """Count, mean, p50 and p95 latency (ms) over the last 1000 turns per mode."""
+    out = {"mode": AGENT_MODE}
+    with _stats_lock:
+        for mode, values in _latencies.items():
+            samples = sorted(values)
+            if not samples:
+                out[mode] = {"count": 0}
+                continue
+            out[mode] = {
+                "count": len(samples),
+                "mean_ms": round(1000 * sum(samples) / len(samples), 1),
+                "p50_ms": round(1000 * samples[len(samples) // 2], 1),
+                "p95_ms": round(1000 * samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+            }
+        out["speculation"] = dict(_speculation)
+    with _planner_lock:
+        counts = dict(_planner_counts)
+    # share of the replies that failed validation (LLM errors had no reply)
+    replies = counts["calls"] - counts["llm_errors"]
+    out["planner"] = {
+        **counts,
+        "parse_failure_rate": round(counts["parse_failures"] / replies, 3) if replies else 0.0,
+    }
+    return out
+
+# main entry used by fastapi bot 
+def run_multi_agent(user_message, conversation_state="awaiting_interest", emotion="neutral", mode=None):
+    mode = mode or AGENT_MODE
+    if mode not in AGENT_MODES:
+        mode = "serial"
+
+    started = time.perf_counter()
+    if mode == "fused":
+        reply = fused_agent(user_message, conversation_state, emotion)
+    elif mode == "speculative":
+        reply = speculative_agent(user_message, conversation_state, emotion)
+    else:
+        plan = planner_agent(user_message, conversation_state)
+        action = plan["action"]
+        reply = worker_agent(action, user_message, emotion)
+    _record_latency(mode, time.perf_counter() - started)
+
+    return reply
\ No newline at end of file
@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+
+# Shared, lazily loaded spaCy pipelines.
+# Every router used to call spacy.load() at import time, so each uvicorn
+# worker paid for one pipeline per module before it could bind, even though
+# no webhook uses them. Now a pipeline is loaded on first use (or by
+# preload() in the background) and one instance is shared by all modules.
+
+DEFAULT_MODEL = "en_core_web_sm"
+# comma separated models to load in the background at startup ("" = none)
+PRELOAD_MODELS = [m for m in os.getenv("NLP_PRELOAD", "").split(",") if m.strip()]
+
+_models = {}
+_load_info = {}        # name -> {"load_s": .., "rss_mb": ..}
+_lock = threading.Lock()
+
+
+def rss_mb():
+    """Resident set size of this process in MB (None if unknown)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        # peak, not current, but the best we get off Linux (bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+    except Exception:
+        return None
+
+
+def get(name=DEFAULT_MODEL):
+    """Return the shared pipeline, loading it on first call."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _models:
+            import spacy
+            before = rss_mb()
+            started = time.perf_counter()
+            _models[name] = spacy.load(name)
+            after = rss_mb()
+            _load_info[name] = {
+                "load_s": round(time.perf_counter() - started, 2),
+                "rss_mb": round(after - before, 1) if before is not None and after is not None else None,
+            }
+            print(f"Loaded spaCy model {name} in {_load_info[name]['load_s']}s (+{_load_info[name]['rss_mb']} MB)")
+        return _models[name]
+
+
+class LazyModel:
+    """Stands in for a module-level `nlp = spacy.load(...)`; loads on first call."""
+
+    def __init__(self, name=DEFAULT_MODEL):
+        self.name = name
+
+    def __call__(self, text, **kwargs):
+        return get(self.name)(text, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(get(self.name), attr)
+
+
+def lazy(name=DEFAULT_MODEL):
+    return LazyModel(name)
+
+
+def preload(names=None):
+    """Load models in a daemon thread so the first caller doesn't wait."""
+    names = PRELOAD_MODELS if names is None else names
+
+    def run():
+        for name in names:
+            try:
+                get(name.strip())
+            except Exception as e:
+                print(f"Could not load spaCy model {name}:", e)
+
+    if names:
+        threading.Thread(target=run, name="nlp-preload", daemon=True).start()
+
+
+def stats():
+    return {
+        "loaded": {name: dict(info) for name, info in _load_info.items()},
+        "preload": PRELOAD_MODELS,
+        "process_rss_mb": rss_mb(),
+    }
@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import threading
+from datetime import datetime, date
+
+from log_store import TABLES, TIMESTAMP_FORMAT
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # optional: pip install pyarrow
+    pa = None
+    pq = None
+
+# Date-partitioned Parquet copy of the conversation log, for analytics.
+# The log pipeline hands every flushed batch to the sink, which buffers
+# rows and writes one zstd segment per (table, day) once SINK_ROWS rows
+# or SINK_SECONDS have accumulated:
+#   analytics_data/<table>/date=YYYY-MM-DD/part-<ms>-<id>.parquet
+# Queries (analytics.py) prune by the date directory and read only the
+# columns they need. compact() merges a day's segments into one file; the
+# sink runs it on past days once a day and on today when it passes
+# MAX_SEGMENTS. Without pyarrow this module is a no-op.
+#
+# The sink is idle-flushed by the pipeline's tick, and _watermark.json keeps
+# the last log id written per table: on startup, rows the SQLite log has past
+# it (lost from the buffer by a crash) are exported again.
+#
+#   python parquet_log.py migrate     old .xlsx logs -> Parquet
+#   python parquet_log.py compact     merge segments of past days
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join(SCRIPT_DIR, "analytics_data"))
+ENABLED = pa is not None and os.getenv("ANALYTICS_ENABLED", "1") == "1"
+ROW_GROUP_SIZE = int(os.getenv("ANALYTICS_ROW_GROUP_SIZE", "8192"))
+SINK_ROWS = int(os.getenv("ANALYTICS_SINK_ROWS", "5000"))
+SINK_SECONDS = float(os.getenv("ANALYTICS_SINK_SECONDS", "60"))
+MAX_SEGMENTS = int(os.getenv("ANALYTICS_MAX_SEGMENTS", "64"))
+WATERMARK_FILE = os.path.join(ANALYTICS_DIR, "_watermark.json")
+
+# the Excel files written before the log store existed
+EXCEL_SOURCES = {
+    "turns": "Sales_Conversation_Twilio.xlsx",
+    "leads": "Sales_Leads.xlsx",
+    "summary": "call_summary.xlsx",
+}
+# call_summary.xlsx used lowercase headers
+RENAMES = {"summary": {"phone": "PhoneNumber", "product": "Product", "call_status": "Call_Status", "timestamp": "Timestamp"}}
+# ...and mostly left "phone" empty: the number is in these, tried in order
+PHONE_FALLBACKS = {"summary": ["normalized_phone", "original_phone"]}
+
+_lock = threading.Lock()
+
+
+def available():
+    return ENABLED
+
+
+def schema(table):
+    return pa.schema([
+        (c, pa.timestamp("s") if c == "Timestamp" else pa.string()) for c in TABLES[table]
+    ])
+
+
+def table_dir(table):
+    return os.path.join(ANALYTICS_DIR, table)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0, tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if value:
+        try:
+            return datetime.strptime(str(value)[:19], TIMESTAMP_FORMAT)
+        except ValueError:
+            pass
+    return None
+
+
+def write_rows(table, rows):
+    """Write rows (dicts keyed by column) as one segment per day; returns segments written."""
+    if not ENABLED or not rows:
+        return 0
+    by_day = {}
+    for row in rows:
+        ts = _as_datetime(row.get("Timestamp")) or datetime.now().replace(microsecond=0)
+        by_day.setdefault(ts.date().isoformat(), []).append({
+            **{c: (None if row.get(c) is None else str(row.get(c))) for c in TABLES[table]},
+            "Timestamp": ts,
+        })
+    for day, day_rows in by_day.items():
+        _write_segment(table, day, pa.Table.from_pylist(day_rows, schema=schema(table)))
+    return len(by_day)
+
+
+def _write_segment(table, day, arrow_table, row_group_size=None):
+    folder = os.path.join(table_dir(table), f"date={day}")
+    os.makedirs(folder, exist_ok=True)
+    name = f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = os.path.join(folder, "." + name)
+    pq.write_table(arrow_table, tmp, compression="zstd", row_group_size=row_group_size)
+    # readers never see a half-written segment
+    os.replace(tmp, os.path.join(folder, name))
+
+
+def compact(table, day):
+    """Merge all segments of one day into a single file."""
+    folder = os.path.join(table_dir(table), f"date={day}")
+    if not ENABLED or not os.path.isdir(folder):
+        return 0
+    with _lock:
+        parts = sorted(f for f in os.listdir(folder) if f.endswith(".parquet"))
+        if len(parts) < 2:
+            return len(parts)
+        merged = pa.concat_tables(pq.read_table(os.path.join(folder, f), schema=schema(table)) for f in parts)
+        # phone-sorted row groups let a phone filter skip most of the file
+        merged = merged.sort_by([("PhoneNumber", "ascending"), ("Timestamp", "ascending")])
+        _write_segment(table, day, merged, row_group_size=ROW_GROUP_SIZE)
+        for f in parts:
+            os.remove(os.path.join(folder, f))
+    return len(parts)
+
+
+def compact_all(before=None):
+    """Compact every day older than `before` (default: today)."""
+    before = before or date.today().isoformat()
+    merged = 0
+    for table in TABLES:
+        if not os.path.isdir(table_dir(table)):
+            continue
+        for entry in sorted(os.listdir(table_dir(table))):
+            if entry.startswith("date=") and entry[5:] < before:
+                merged += compact(table, entry[5:])
+    return merged
+
+
+def _excel_phone(value, normalize):
+    # a number column with gaps is read as float: 919510038048.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    # same E.164 form the live summary rows use
+    return normalize(value) or str(value)
+
+
+def migrate_excel(folder=SCRIPT_DIR, replace=False):
+    """
+    Copy the old Excel logs into Parquet; returns {table: rows}.
+    Rows without a timestamp are skipped (they would land on today), and
+    so are summary rows without a phone number.
+    """
+    import pandas as pd
+    from summary_store import normalize_phone
+    migrated = {}
+    for table, filename in EXCEL_SOURCES.items():
+        path = os.path.join(folder, filename)
+        if not os.path.exists(path):
+            continue
+        if replace and os.path.isdir(table_dir(table)):
+            shutil.rmtree(table_dir(table))
+        df = pd.read_excel(path).rename(columns=RENAMES.get(table, {}))
+        fallbacks = [c for c in PHONE_FALLBACKS.get(table, []) if c in df.columns]
+        if fallbacks:
+            phone = df["PhoneNumber"] if "PhoneNumber" in df.columns else pd.Series(None, index=df.index, dtype=object)
+            for column in fallbacks:
+                phone = phone.fillna(df[column])
+            df["PhoneNumber"] = phone.map(lambda v: None if pd.isna(v) else _excel_phone(v, normalize_phone))
+        df = df.reindex(columns=TABLES[table])
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce")
+        keep = df["Timestamp"].notna()
+        if fallbacks:
+            keep &= df["PhoneNumber"].notna()
+        skipped = int((~keep).sum())
+        df = df[keep].astype(object).where(df[keep].notna(), None)
+        rows = df.to_dict(orient="records")
+        write_rows(table, rows)
+        migrated[table] = len(rows)
+        print(f"Migrated {len(rows)} rows from {filename} into {table_dir(table)} ({skipped} skipped)")
+    compact_all(before="9999-12-31")
+    return migrated
+
+
+def _segment_count(table, day):
+    folder = os.path.join(table_dir(table), f"date={day}")
+    if not os.path.isdir(folder):
+        return 0
+    return sum(1 for f in os.listdir(folder) if f.endswith(".parquet"))
+
+
+class ParquetSink:
+    """
+    LogPipeline sink: buffers flushed batches so Parquet gets a few large
+    segments instead of one small file per pipeline flush, and keeps the
+    segment count bounded by compacting.
+    """
+
+    def __init__(self, max_rows=SINK_ROWS, max_seconds=SINK_SECONDS, watermark_file=WATERMARK_FILE):
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.watermark_file = watermark_file
+        self._buffer = {}
+        self._last_ids = {}         # table -> log id of the last buffered row
+        self._marks = None          # table -> log id of the last row in Parquet
+        self._since = time.monotonic()
+        self._compacted_day = None
+        self._lock = threading.Lock()
+
+    def __call__(self, table, rows, last_id=None):
+        with self._lock:
+            if not self._buffer:
+                # the age of the oldest buffered row, not of the last flush
+                self._since = time.monotonic()
+            self._buffer.setdefault(table, []).extend(rows)
+            if last_id is not None:
+                self._last_ids[table] = max(last_id, self._last_ids.get(table, 0))
+            due = (sum(map(len, self._buffer.values())) >= self.max_rows
+                   or time.monotonic() - self._since >= self.max_seconds)
+        if due:
+            self.flush()
+
+    def tick(self):
+        """Flush rows that have waited max_seconds even if no new batch comes."""
+        with self._lock:
+            due = self._buffer and time.monotonic() - self._since >= self.max_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            last_ids, self._last_ids = self._last_ids, {}
+            self._since = time.monotonic()
+        written = {}
+        try:
+            for table, rows in buffer.items():
+                write_rows(table, rows)
+                if table in last_ids:
+                    written[table] = last_ids[table]
+        finally:
+            self._advance(written)
+        self._maybe_compact(buffer)
+
+    def _load_marks(self):
+        if self._marks is None:
+            try:
+                with open(self.watermark_file, encoding="utf-8") as f:
+                    self._marks = json.load(f)
+            except (OSError, ValueError):
+                self._marks = {}
+        return self._marks
+
+    def _advance(self, written):
+        if not written:
+            return
+        with self._lock:
+            marks = self._load_marks()
+            for table, last_id in written.items():
+                marks[table] = max(last_id, marks.get(table, 0))
+            os.makedirs(os.path.dirname(self.watermark_file), exist_ok=True)
+            tmp = self.watermark_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(marks, f)
+            os.replace(tmp, self.watermark_file)
+
+    def backfill(self, store):
+        """Export the log rows past the watermark; returns {table: rows}."""
+        if not ENABLED:
+            return {}
+        with self._lock:
+            marks = dict(self._load_marks())
+        exported = {}
+        for table in TABLES:
+            top = store.version(table)
+            mark = marks.get(table)
+            if mark is None and os.path.isdir(table_dir(table)):
+                # Parquet written before there was a watermark: start from here
+                self._advance({table: top})
+                continue
+            mark = mark or 0
+            if top <= mark:
+                continue
+            rows, count = [], 0
+            for row in store.rows(table, after=mark, through=top):
+                rows.append(row)
+                if len(rows) >= self.max_rows:
+                    write_rows(table, rows)
+                    count += len(rows)
+                    rows = []
+            write_rows(table, rows)
+            count += len(rows)
+            self._advance({table: top})
+            exported[table] = count
+            print(f"Parquet backfill: {count} {table} rows past log id {mark}")
+        return exported
+
+    def _maybe_compact(self, tables):
+        today = date.today().isoformat()
+        if self._compacted_day != today:
+            # first flush of a new day: merge every finished day
+            self._compacted_day = today
+            compact_all(before=today)
+        for table in tables:
+            if _segment_count(table, today) > MAX_SEGMENTS:
+                compact(table, today)
+
+    def close(self):
+        self.flush()
+
+
+sink = ParquetSink()
+
+
+if __name__ == "__main__":
+    if not ENABLED:
+        print("pyarrow is not installed (pip install pyarrow)")
+        sys.exit(1)
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        migrate_excel(replace="--replace" in sys.argv)
+    elif command == "compact":
+        print(f"Merged {compact_all()} segments")
+    else:
+        print("usage: python parquet_log.py migrate [--replace] | compact")
+        sys.exit(1)
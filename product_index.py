@@ -0,0 +1,210 @@
+import re
+import math
+import time
+import heapq
+from collections import Counter, defaultdict
+
+# Product index for matching what the caller said (ASR text) to a catalog entry.
+# Built once when the catalog loads:
+#   - token inverted index          exact word hits ("iphone")
+#   - phonetic index (Soundex-ish)  ASR misspellings ("ifone", "samsang")
+#   - character trigram index       partial / run-together words ("galaxys23")
+# A lookup intersects the postings of the words in the utterance and then
+# fully scores a short list of candidates, so it never walks the whole catalog.
+#
+# Name words are weighted by how rare they are in the catalog (IDF): one
+# distinctive word ("iphone", "galaxy") is enough for a match, a word many
+# products share ("phone", "pro") is not. A run-together word that covers
+# most of a name's trigrams matches on those alone.
+
+MATCH_THRESHOLD = 0.45
+# weight of the word score vs the trigram score in the blend
+TOKEN_WEIGHT = 0.7
+# a word only heard phonetically counts this much of an exact hit
+SOUND_WEIGHT = 0.7
+# trigram containment from which the trigrams alone can carry a match
+STRONG_TRIGRAM = 0.6
+# how many candidates get the full (token + trigram) score
+CANDIDATES = 50
+# trigrams shared by more products than this don't help pick candidates
+RARE_TRIGRAM_LIMIT = 200
+
+_TOKEN = re.compile(r"[a-z0-9\u0900-\u097F]+")
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall((text or "").lower()) if len(t) > 1]
+
+
+def trigrams(text):
+    s = f"  {' '.join(tokenize(text))} "
+    # a trigram spanning two words ("e c" in "phone case") says nothing
+    return {s[i:i + 3] for i in range(len(s) - 2) if s[i + 1] != " "}
+
+
+_SOUNDEX = str.maketrans("bfpvcgjkqsxzdtlmnr", "111122222222334556")
+
+def phonetic(token):
+    """Soundex-style key: first letter + consonant classes, vowels dropped (words only)."""
+    # a model number has no sound: "galaxys23" must not collide with "g423"
+    if not token or not token.isalpha() or not token.isascii():
+        return None
+    head, tail = token[0], token[1:].replace("ph", "f")
+    digits = tail.translate(_SOUNDEX)
+    out = []
+    for ch in digits:
+        if ch.isdigit() and (not out or out[-1] != ch):
+            out.append(ch)
+    return (head + "".join(out))[:5]
+
+
+class ProductIndex:
+    def __init__(self, products, name_key="product_name"):
+        self.products = list(products)
+        self._tokens = defaultdict(set)
+        self._phonetic = defaultdict(set)
+        self._trigrams = defaultdict(set)
+        self._name_tokens = []
+        self._name_trigrams = []
+        self._name_sounds = []
+        for pid, p in enumerate(self.products):
+            name = str(p.get(name_key, ""))
+            toks = set(tokenize(name))
+            grams = frozenset(trigrams(name))
+            self._name_tokens.append(toks)
+            self._name_trigrams.append(grams)
+            self._name_sounds.append({phonetic(t) for t in toks} - {None})
+            for t in toks:
+                self._tokens[t].add(pid)
+                key = phonetic(t)
+                if key:
+                    self._phonetic[key].add(pid)
+            for g in grams:
+                self._trigrams[g].add(pid)
+
+        # idf, scaled so a word found in a single product weighs 1.0
+        n = len(self.products)
+        top = math.log(n + 1) or 1.0
+        self._token_idf = {t: math.log((n + 1) / len(pids)) / top for t, pids in self._tokens.items()}
+        self._gram_idf = {g: math.log((n + 1) / len(pids)) for g, pids in self._trigrams.items()}
+        self._name_gram_mass = [sum(self._gram_idf[g] for g in grams) or 1.0 for grams in self._name_trigrams]
+
+    def __len__(self):
+        return len(self.products)
+
+    def search(self, text, limit=5):
+        """Ranked [(product, score), ...]; score in 0..1."""
+        q_tokens = set(tokenize(text))
+        if not q_tokens or not self.products:
+            return []
+        q_sounds = {phonetic(t) for t in q_tokens} - {None}
+        q_grams = trigrams(text)
+
+        # candidate generation: intersect the postings of the said words,
+        # rarest first (set ops run in C). A word that would empty every
+        # group starts its own group instead, so one ASR mistake can't hide
+        # the right product.
+        postings = []
+        for t in q_tokens:
+            # the phonetic posting already contains the exact one
+            key = phonetic(t)
+            posting = self._phonetic.get(key) if key else None
+            posting = posting or self._tokens.get(t)
+            if posting:
+                postings.append(posting)
+        postings.sort(key=len)
+
+        groups = []
+        for posting in postings:
+            merged = False
+            for i, group in enumerate(groups):
+                inter = group & posting
+                if inter:
+                    groups[i] = inter
+                    merged = True
+            if not merged:
+                groups.append(posting)
+
+        candidates = set()
+        for group in groups:
+            if len(group) > CANDIDATES:
+                # too many to score fully: keep the products sharing the most
+                # words / sounds with the utterance (pid breaks ties, so the
+                # cut never depends on set order)
+                group = heapq.nsmallest(CANDIDATES, group, key=lambda pid: (
+                    -len(self._name_tokens[pid] & q_tokens) - len(self._name_sounds[pid] & q_sounds), pid,
+                ))
+            candidates.update(group)
+
+        # plus the products sharing the most rare trigrams, so a run-together
+        # or partial word is found even when another word matched something
+        shared = Counter()
+        for g in q_grams:
+            grams = self._trigrams.get(g, ())
+            if len(grams) <= RARE_TRIGRAM_LIMIT:
+                shared.update(grams)
+        candidates.update(pid for pid, _ in shared.most_common(CANDIDATES))
+
+        scored = []
+        for pid in candidates:
+            # word score: idf mass of the name words that were said (or
+            # sounded alike), where one fully distinctive word is enough
+            mass = 0.0
+            for t in self._name_tokens[pid]:
+                if t in q_tokens:
+                    mass += self._token_idf[t]
+                elif phonetic(t) in q_sounds:
+                    mass += SOUND_WEIGHT * self._token_idf[t]
+            words = min(1.0, mass)
+            # trigram containment: idf-weighted share of the name's trigrams found in the utterance
+            name_grams = self._name_trigrams[pid]
+            containment = sum(self._gram_idf[g] for g in q_grams & name_grams) / self._name_gram_mass[pid]
+            score = TOKEN_WEIGHT * words + (1 - TOKEN_WEIGHT) * containment
+            if containment >= STRONG_TRIGRAM:
+                # a strong trigram hit stands on its own (run-together words)
+                score = max(score, containment)
+            scored.append((score, pid))
+        top = heapq.nlargest(limit, scored)
+        return [(self.products[pid], round(score, 3)) for score, pid in top]
+
+    def best(self, text, threshold=MATCH_THRESHOLD):
+        """Best product above threshold, or None."""
+        ranked = self.search(text, limit=1)
+        if ranked and ranked[0][1] >= threshold:
+            return ranked[0][0]
+        return None
+
+
+#  Benchmark on a synthetic catalog
+if __name__ == "__main__":
+    import random
+
+    brands = ["samsung", "apple", "oneplus", "redmi", "realme", "vivo", "oppo", "nokia", "sony", "lg"]
+    kinds = ["phone", "tablet", "earbuds", "watch", "charger", "speaker", "laptop", "monitor"]
+    series = ["galaxy", "nord", "note", "narzo", "bravia", "xperia", "pad", "buds", "book", "vision"]
+    random.seed(7)
+    catalog = [
+        {"product_name": (
+            f"{random.choice(brands)} {random.choice(series)} "
+            f"{random.choice('abcdefgkmsxz')}{random.randint(1, 999)} "
+            f"{random.choice(kinds)} {random.choice(['pro', 'max', 'lite', 'plus', ''])}"
+        )}
+        for i in range(10000)
+    ]
+    catalog[1234]["product_name"] = "samsung galaxy s23 watch pro"
+    started = time.perf_counter()
+    index = ProductIndex(catalog)
+    print(f"built index for {len(index)} products in {1000 * (time.perf_counter() - started):.1f} ms")
+
+    queries = [
+        "i want the samsang galaxy s23 watch",
+        "galaxys23",
+        "tell me about the sony bravia speaker",
+        "nothing useful here",
+    ]
+    for q in queries:
+        started = time.perf_counter()
+        for _ in range(100):
+            ranked = index.search(q)
+        per = 1000 * (time.perf_counter() - started) / 100
+        print(f"{q!r}: {per:.3f} ms -> {[(p['product_name'], s) for p, s in ranked[:3]]}")
@@ -0,0 +1,139 @@
+import os
+import json
+import random
+import argparse
+from datetime import datetime
+
+import llm_client
+
+# Offline pre-generated reply bank.
+# A batch job asks the LLM for N phrasings of every fixed line (persuasion
+# lines, offers, "ask again" fallbacks per emotion) and stores them on disk.
+# At runtime the routers pick one in O(1) instead of calling the LLM live.
+#
+# Build:  python reply_bank.py --variants 5
+#
+# Bank layout:
+# {
+#   "version": 1,
+#   "created": "...", "model": "phi3:mini", "variants": 5,
+#   "entries": {"persuasion": {line: [..]}, "offer": {line: [..]}, "fallback": {emotion: [..]}}
+# }
+
+BANK_VERSION = 1
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BANK_FILE = os.getenv("REPLY_BANK_FILE", os.path.join(SCRIPT_DIR, "reply_bank.json"))
+
+EMOTIONS = ["happy", "neutral", "angry"]
+
+REPHRASE_PROMPT = (
+    "You are a friendly sales agent on a phone call. "
+    "Rephrase this line in one short, polite spoken sentence. "
+    "Keep the meaning and any offer details. Line: {line}"
+)
+FALLBACK_PROMPT = (
+    "You are a friendly sales agent. The user's emotion is {emotion}. "
+    "Ask again politely if they are interested in one short line."
+)
+
+
+class ReplyBank:
+    def __init__(self, path=BANK_FILE):
+        self.path = path
+        self._entries = None
+
+    def load(self):
+        entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == BANK_VERSION:
+                    entries = data.get("entries", {})
+                    print(f"Loaded reply bank from {self.path} ({data.get('created')})")
+                else:
+                    print(f"Reply bank {self.path} has version {data.get('version')}, expected {BANK_VERSION}; ignoring it")
+            except Exception as e:
+                print("Could not load reply bank:", e)
+        self._entries = entries
+        return self
+
+    def pick(self, kind, key):
+        """Return a random pre-generated variant, or None if the bank doesn't have one."""
+        if self._entries is None:
+            self.load()
+        variants = self._entries.get(kind, {}).get(key)
+        if not variants:
+            return None
+        return random.choice(variants)
+
+    def __len__(self):
+        if self._entries is None:
+            self.load()
+        return sum(len(v) for kind in self._entries.values() for v in kind.values())
+
+
+# shared instance used by the routers
+reply_bank = ReplyBank()
+
+
+#  Batch build
+def _variants(prompt, n, model):
+    out = []
+    for _ in range(n):
+        try:
+            # temperature > 0 so the n generations actually differ
+            text = llm_client.generate_first_sentence(
+                prompt, model=model, timeout=60, options={"temperature": 0.9}
+            )
+        except llm_client.LLMError as e:
+            print("  generation failed:", e)
+            continue
+        text = text.strip().strip('"')
+        if len(text) >= 2 and text not in out:
+            out.append(text)
+    return out
+
+
+def build_bank(variants=5, model=None, path=BANK_FILE):
+    # imported here so loading the bank at runtime never imports the routers
+    from leadGathering import PERSUASIVE_LINES
+    from speechLinkShare import OFFERS_LIST
+
+    model = model or llm_client.CHAT_MODEL
+    entries = {"persuasion": {}, "offer": {}, "fallback": {}}
+
+    for line in PERSUASIVE_LINES:
+        print(f"[persuasion] {line}")
+        entries["persuasion"][line] = _variants(REPHRASE_PROMPT.format(line=line), variants, model)
+    for line in OFFERS_LIST:
+        print(f"[offer] {line}")
+        entries["offer"][line] = _variants(REPHRASE_PROMPT.format(line=line), variants, model)
+    for emotion in EMOTIONS:
+        print(f"[fallback] {emotion}")
+        entries["fallback"][emotion] = _variants(FALLBACK_PROMPT.format(emotion=emotion), variants, model)
+
+    data = {
+        "version": BANK_VERSION,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "model": model,
+        "variants": variants,
+        "entries": entries,
+    }
+    # write to a temp file first so a running server never reads half a bank
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    total = sum(len(v) for kind in entries.values() for v in kind.values())
+    print(f"Saved {total} replies to {path}")
+    return data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate the reply bank")
+    parser.add_argument("--variants", type=int, default=5, help="phrasings per line")
+    parser.add_argument("--model", default=None, help="Ollama model (default: chat model)")
+    parser.add_argument("--out", default=BANK_FILE, help="output JSON file")
+    args = parser.parse_args()
+    build_bank(args.variants, args.model, args.out)
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from executors import io_executor
+
+# Per-call conversation state (retry counters etc.), keyed by Twilio CallSid.
+#   memory  bounded LRU with TTL; one process only
+#   sqlite  one WAL database file shared by every uvicorn worker on the host
+# Records are stored as compact JSON text in both backends, so switching
+# SESSION_BACKEND never changes what a handler reads back.
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+# a call that hasn't hit a webhook for this long is gone
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_DB = os.getenv("SESSION_DB", os.path.join(SCRIPT_DIR, "sessions.db"))
+
+
+def _dump(data):
+    return json.dumps(data, separators=(",", ":"))
+
+
+class SessionStore:
+    """Interface shared by the backends."""
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, data):
+        raise NotImplementedError
+
+    def update(self, key, fn, default=None):
+        """Atomically replace the session with fn(current or default) and return it."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    # awaitable variants for the async webhooks: a backend whose calls can
+    # block (disk, lock waits) runs them on the io pool, off the event loop
+    blocking = False
+
+    async def _call(self, fn, *args):
+        if self.blocking:
+            return await io_executor.run(fn, *args)
+        return fn(*args)
+
+    async def aget(self, key, default=None):
+        return await self._call(self.get, key, default)
+
+    async def aset(self, key, data):
+        return await self._call(self.set, key, data)
+
+    async def aupdate(self, key, fn, default=None):
+        return await self._call(self.update, key, fn, default)
+
+    async def adelete(self, key):
+        return await self._call(self.delete, key)
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_size=SESSION_MAX, ttl=SESSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()     # key -> (expires_at, json text)
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def _load(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._data[key]
+            self.expired += 1
+            return None
+        return json.loads(entry[1])
+
+    def _store(self, key, data, now):
+        self._data[key] = (now + self.ttl, _dump(data))
+        self._data.move_to_end(key)
+        # entries are in last-touched order, so the oldest are at the front
+        while self._data and (len(self._data) > self.max_size or next(iter(self._data.values()))[0] < now):
+            _, (expires, _) = self._data.popitem(last=False)
+            if expires < now:
+                self.expired += 1
+            else:
+                self.evicted += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            data = self._load(key, time.time())
+        return default if data is None else data
+
+    def set(self, key, data):
+        with self._lock:
+            self._store(key, data, time.time())
+
+    def update(self, key, fn, default=None):
+        with self._lock:
+            now = time.time()
+            current = self._load(key, now)
+            data = fn(dict(default or {}) if current is None else current)
+            self._store(key, data, now)
+            return data
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    # purge expired rows every this many writes
+    PURGE_EVERY = 200
+    # BEGIN IMMEDIATE can wait up to the 5 s busy timeout
+    blocking = True
+
+    def __init__(self, path=SESSION_DB, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)")
+
+    def _conn(self):
+        # one connection per thread; WAL lets workers read while one writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_write(self, conn, now):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, data):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (key, data, expires_at) VALUES (?, ?, ?)",
+            (key, _dump(data), now + self.ttl),
+        )
+        self._after_write(conn, now)
+
+    def update(self, key, fn, default=None):
+        conn = self._conn()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two workers can't
+        # both read the old counter and write the same new value
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            data = fn(dict(default or {}) if row is None else json.loads(row[0]))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, expires_at) VALUES (?, ?, ?)",
+                (key, _dump(data), now + self.ttl),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write(conn, now)
+        return data
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def stats(self):
+        count, live = self._conn().execute(
+            "SELECT COUNT(*), SUM(expires_at >= ?) FROM sessions", (time.time(),)
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": live or 0,
+            "expired_rows": count - (live or 0),
+            "ttl": self.ttl,
+        }
+
+
+def make_store(backend=SESSION_BACKEND):
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend != "memory":
+        print(f"Unknown SESSION_BACKEND '{backend}', using memory")
+    return MemorySessionStore()
+
+
+session_store = make_store()
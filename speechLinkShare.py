@@ -3,48 +3,56 @@ import time
 # import speech_recognition as sr  
 import pandas as pd
 from datetime import datetime
+from urllib.parse import quote
 # import asyncio                  
 # import edge_tts                 
 # import tempfile                 
 # import pygame                   
-import spacy
-from textblob import TextBlob
+import nlp_registry
+from emotion import detect_emotion
 import requests
-from difflib import SequenceMatcher
-from urllib.parse import quote
 import uvicorn
 from fastapi import FastAPI, Form, Response, Query, Request,BackgroundTasks,APIRouter,UploadFile,File
 from twilio.twiml.voice_response import VoiceResponse, Gather
 from twilio.rest import Client
 from dotenv import load_dotenv
-from fastapi.responses import FileResponse
+import llm_client
+from llm_cache import llm_cache
+from reply_bank import reply_bank
+import model_warmup
+import call_budget
+from conversation_flow import Flow, Transition, Turn
+from keyword_matcher import KeywordMatcher
+from product_index import ProductIndex
+from state_token import StateCodec, StateTokenError, SmallInt, Flag, Text, Phone
+from twiml_cache import TwimlCache
+from log_store import log_store
+from log_pipeline import log_pipeline
+from summary_store import summary_store, normalize_phone, DEFAULT_CAMPAIGN
+from executors import io_executor, http_executor
+from exports import export_response
+from dialer import Dialer
 
 router = APIRouter() 
 #  NLP & Spacy 
-nlp = spacy.load("en_core_web_sm")
+# loaded on first use and shared by every router (see nlp_registry)
+nlp = nlp_registry.lazy("en_core_web_sm")
 
 #  Ollama text generation 
-def ai_response(prompt, model_name="phi3:mini"):
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model_name, "prompt": prompt},
-            timeout=4
-        )
-        return response.json()["response"].strip()
-    except Exception as e:
-        print("Ollama Error:", e)
-        return "I'm sorry, I didn’t catch that."
-
-# Emotion detection
-def detect_emotion(text):
-    blob = TextBlob(text)
-    s = blob.sentiment.polarity
-    if s > 0.3:
-        return "happy"
-    elif s < -0.3:
-        return "angry"
-    return "neutral"
+def ai_response(prompt, model_name=llm_client.CHAT_MODEL, budget=None):
+    cached = llm_cache.get(prompt, model_name)
+    if cached is not None:
+        return cached
+
+    def produce():
+        reply = llm_client.generate_first_sentence(prompt, model=model_name)
+        llm_cache.put(prompt, model_name, reply)
+        return reply
+
+    # past the webhook budget the caller gets the canned line and the
+    # generation finishes in the background to warm the cache
+    return call_budget.run_within(budget or call_budget.Budget(), produce, "I'm sorry, I didn’t catch that.")
+
 
 #  Load products 
 def load_products():
@@ -80,6 +88,14 @@ CALL_KEYWORDS = ["call me", "talk to agent", "contact me", "speak to agent", "co
 
 INFO_KEYWORDS = ["tell me more", "details", "more info", "specs", "specifications", "explain", "description", "features"]
 
+# all intent lists compiled into one matcher (single scan per utterance)
+INTENT_MATCHER = KeywordMatcher({
+    "affirmative": AFFIRMATIVE,
+    "negative": NEGATIVE,
+    "call": CALL_KEYWORDS,
+    "info": INFO_KEYWORDS,
+})
+
 #  SMS via HSP 
 def send_sms_via_hsp(mobile_number, message):
     try:
@@ -97,9 +113,6 @@ def send_sms_via_hsp(mobile_number, message):
     except Exception as e:
         print("Failed to send SMS via HSP:", e)
 
-# This function was defined inside the loop, moved to global 
-def similar(a, b): return SequenceMatcher(None, a, b).ratio()
-
 # Moved offers list to global scope 
 OFFERS_LIST = [
     "I completely understand! But before you go — we’re giving a 20% discount just for today. Would you like to take a quick look?",
@@ -112,56 +125,40 @@ OFFERS_LIST = [
 
 # Load products once on server startup 
 # PRODUCTS_LIST = load_products()
+PRODUCTS_LIST = []
+PRODUCT_INDEX = ProductIndex(PRODUCTS_LIST)
+
+# swap in a new catalog and rebuild the product index for it
+def set_products(products):
+    global PRODUCTS_LIST, PRODUCT_INDEX
+    PRODUCT_INDEX = ProductIndex(products)
+    PRODUCTS_LIST = products
+    # the product listing replies are pre-rendered TwiML, rebuild them
+    warm_twiml()
 
 # Use an absolute path for the log file
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(SCRIPT_DIR, "Sales_Conversation_Twilio.xlsx")
-print(f" ‼ Logging conversations to: {LOG_FILE} ‼ ")
+# exported from the log store on demand (see /download-log)
+print(f" ‼ Logging conversations to: {log_store.path} ‼ ")
 
 
 # Helper function to log a turn in the conversation 
 def log_turn(ai_question, user_response, emotion, ai_reply, phone_number):
-    new_log = pd.DataFrame({
-        "Question": [ai_question],
-        "User_Response": [user_response],
-        "Emotion": [emotion],
-        "AI_Reply": [ai_reply],
-        "PhoneNumber": [phone_number],
-        "Timestamp": [datetime.now()]
+    # just a queue put; the log writer thread appends it to the log store
+    log_pipeline.submit("turns", {
+        "Question": ai_question,
+        "User_Response": user_response,
+        "Emotion": emotion,
+        "AI_Reply": ai_reply,
+        "PhoneNumber": phone_number,
     })
-    try:
-        # Check if openpyxl is installed 
-        try:
-            import openpyxl
-        except ImportError:
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            print("ERROR: 'openpyxl' library not found. Cannot write to Excel.")
-            print("Please install it: pip install openpyxl")
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            return
-
-        if os.path.exists(LOG_FILE):
-            old = pd.read_excel(LOG_FILE)
-            df_log = pd.concat([old, new_log], ignore_index=True)
-        else:
-            df_log = new_log
-        
-        # Save to the absolute path 
-        df_log.to_excel(LOG_FILE, index=False)
-        print(f"--- Logged turn for {phone_number} ---")
-    except Exception as e:
-        # Make errors much more visible in the server log 
-        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-        print(f"CRITICAL ERROR logging to Excel: {e}")
-        print(f"Attempted to write to file: {LOG_FILE}")
-        print("Please check file permissions.")
-        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
 
 # FastAPI SERVER & TWILIO LOGIC START HERE 
 # app = FastAPI()
 
 # This is the modified function to handle silence retries 
-def create_twiml_response(
+def _build_gather(
     text_to_say: str, 
     action_url: str, 
     speech_timeout: int = 7,  
@@ -208,12 +205,43 @@ def create_twiml_response(
     response.hangup()
     
     # Return as XML
-    return Response(content=str(response), media_type="application/xml")
+    return str(response)
+
+def _build_hangup(text: str, action_url: str = None):
+    response = VoiceResponse()
+    response.say(text)
+    response.hangup()
+    return str(response)
+
+# static prompts are rendered once (per text + options); only the action URL is spliced in
+GATHER_TWIML = TwimlCache(_build_gather, "link")
+HANGUP_TWIML = TwimlCache(_build_hangup, "link-hangup")
+
+def create_twiml_response(
+    text_to_say: str, 
+    action_url: str, 
+    speech_timeout: int = 7,  
+    num_retries: int = 2,
+    language: str = "en-IN",
+    static: bool = False,
+):
+    content = GATHER_TWIML.render(
+        text_to_say, action_url, static,
+        speech_timeout=speech_timeout, num_retries=num_retries, language=language,
+    )
+    return Response(content=content, media_type="application/xml")
 
 # This endpoint starts the call 
 # @app.post("/start-call")
 @router.post("/start-call")
-def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
+async def start_call(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    From: str = Form(None),
+    To: str = Form(None),
+    CallSid: str = Form(None),
+    campaign: str = Query(DEFAULT_CAMPAIGN),
+):
     """
     This is the first endpoint Twilio calls. 
     It greets the user and listens for the first "yes" or "no".
@@ -224,199 +252,269 @@ def start_call(request: Request, From: str = Form(None), To: str = Form(None)):
     # We pass the user's phone number in the state URL 
     user_phone = To if To else "Unknown"
     
-    # State is passed in the URL: persuasion=0, explained=0, phone=...
-    safe_phone = quote(user_phone)
-    action_url = f"/link/handle-conversation?persuasion=0&explained=0&phone={safe_phone}"
+    # the call was answered: mark it in the campaign's summary after the reply
+    if To:
+        background_tasks.add_task(
+            io_executor.run_logged, summary_store.upsert, To, campaign,
+            status="In progress", call_sid=CallSid, answered_at=True,
+        )
+
+    # State is passed in the URL as one signed token (persuasion, explained, phone, campaign)
+    action_url = build_next_url(0, 0, user_phone, campaign)
     
     # Get the intro message
     intro = intro_message()
     
-    # Log this first turn
+    # Log this first turn 
     log_turn(ai_question="[Call Started]", user_response="", emotion="", ai_reply=intro, phone_number=user_phone)
     
     # Create the TwiML to speak the intro and listen for a reply
-    return create_twiml_response(intro, action_url)
-
-# This endpoint handles the entire conversation loop 
-# @app.post("/handle-conversation")
-@router.post("/handle-conversation")
-def handle_conversation(
-    background_tasks: BackgroundTasks,
-    SpeechResult: str = Form(None),           
-    persuasion: int = Query(0),               
-    explained: int = Query(0),                
-    phone: str = Query("Unknown")             
-):
-    """
-    This is the main "loop". Twilio calls this endpoint every time
-    the user speaks. We read the state (persuasion, explained, phone) from
-    the URL, process the user's speech, and decide what to say next.
-    """
-    
-    response = VoiceResponse()
-    user_input = SpeechResult if SpeechResult else ""
-    user_input_lower = user_input.lower().strip()
-    emotion = detect_emotion(user_input)
-    
-    print(f"User ({phone}) said: {user_input} (Emotion: {emotion})")
-    print(f"Current state: persuasion={persuasion}, explained={explained}")
-    
-    #  Convert state variables from int (0/1) to bool 
-    product_explained = bool(explained)
-    persuasion_used = persuasion
-    
-    ai_reply_text = "" 
-    
-    # We build the next URL, carrying the state forward 
-    def build_next_url(pers, expl):
-        safe_phone = quote(phone)
-        return f"/link/handle-conversation?persuasion={pers}&explained={int(expl)}&phone={safe_phone}"
-
-    #  Exit 
-    if user_input_lower in ["exit", "quit", "stop", "bye", "ok bye", "goodbye"]:
-        ai_reply_text = "Thank you for your time! Have a great day."
+    return create_twiml_response(intro, action_url, static=True)
+
+#  Conversation state travels in one signed token (?s=...) 
+CAMPAIGN_FIELD = Text()
+LINK_STATE = StateCodec(2, [
+    ("persuasion", SmallInt()),
+    ("explained", Flag()),
+    ("phone", Phone()),
+    ("campaign", CAMPAIGN_FIELD),
+])
+
+# the campaign rides in the state token: refuse a name that doesn't fit
+# before any call is placed, instead of failing mid-call
+def _campaign_error(campaign):
+    if len(campaign.encode("utf-8")) > CAMPAIGN_FIELD.max_bytes:
+        return {"error": f"Campaign name is too long (at most {CAMPAIGN_FIELD.max_bytes} utf-8 bytes)"}
+    return None
+
+# We build the next URL, carrying the state forward 
+def build_next_url(pers, expl, phone, campaign=DEFAULT_CAMPAIGN):
+    token = LINK_STATE.encode({"persuasion": pers, "explained": expl, "phone": phone, "campaign": campaign})
+    return f"/link/handle-conversation?s={token}"
+
+#  Conversation flow (compiled once into a dispatch table) 
+EXIT_TEXT = "Thank you for your time! Have a great day."
+PERSUASION_END_TEXT = "No worries! Have a great day ahead."
+AGENT_LATER_TEXT = "Our agent will contact you later. Meanwhile, would you like to hear about our products?"
+INFO_ASK_TEXT = "Could you please specify which product you want more details about?"
+
+# state "intro" = products not listed yet, "catalog" = already listed
+def _hangup(turn, question, ai_reply_text, static=False):
+    log_turn(question, turn.speech, turn.emotion, ai_reply_text, turn.phone)
+    return Response(content=HANGUP_TWIML.render(ai_reply_text, static=static), media_type="application/xml")
+
+def _reply(turn, question, ai_reply_text, persuasion=None, explained=None, static=False):
+    # Loop back; state only changes when the caller passes a new value
+    pers = turn.extra["persuasion"] if persuasion is None else persuasion
+    expl = turn.extra["explained"] if explained is None else explained
+    next_action_url = build_next_url(pers, expl, turn.phone, turn.extra["campaign"])
+    log_turn(question, turn.speech, turn.emotion, ai_reply_text, turn.phone)
+    return create_twiml_response(ai_reply_text, next_action_url, static=static)
+
+def _is_exit(turn):
+    return turn.text in ["exit", "quit", "stop", "bye", "ok bye", "goodbye"]
+
+def _is_negative(turn):
+    return "negative" in turn.intents
+
+def _is_affirmative(turn):
+    return "affirmative" in turn.intents
+
+def _wants_agent(turn):
+    return "call" in turn.intents
+
+def _wants_info(turn):
+    return "info" in turn.intents
+
+def _find_product(turn):
+    #  Match Product Name (best ranked hit from the index, not the first loose match)
+    return PRODUCT_INDEX.best(turn.text)
+
+def _matches_product(turn):
+    turn.extra["product"] = _find_product(turn)
+    return turn.extra["product"] is not None
+
+#  Exit 
+def _exit(turn):
+    return _hangup(turn, "[Stateful check]", EXIT_TEXT, static=True)
+
+#  Handle NO with persuasion 
+def _persuade(turn):
+    persuasion_used = turn.extra["persuasion"] + 1
+    if persuasion_used <= len(OFFERS_LIST):
+        offer = OFFERS_LIST[persuasion_used - 1]
+        ai_reply_text = reply_bank.pick("offer", offer) or offer
+        # We update the state in the URL for the *next* turn 
+        return _reply(turn, "[Persuasion check]", ai_reply_text, persuasion=persuasion_used, static=True)
+    return _hangup(turn, "[Persuasion check]", PERSUASION_END_TEXT, static=True)
+
+#  Handle YES (start product listing) 
+def product_list_text():
+    product_text = "Here are our latest offers:\n"
+    for p in PRODUCTS_LIST:
+        product_text += f"- {p['product_name']}\n"
+    return product_text + "\nWhich product would you like to purchase?"
+
+def _list_products(turn):
+    # Update state, explained is now True (1) 
+    return _reply(turn, "[Intro response]", product_list_text(), explained=True, static=True)
+
+#  Handle CALL agent 
+def _agent(turn):
+    current_hour = datetime.now().hour
+    if 11 <= current_hour < 17:
+        response = VoiceResponse()
+        ai_reply_text = "Please wait until the agent is connected..."
         response.say(ai_reply_text)
+        response.pause(length=3) 
+        response.say("You are now connected to the agent. Ending the conversation. Thank you!")
+        # response.dial("+1234567890")
         response.hangup()
-        background_tasks.add_task(log_turn, "[Stateful check]", user_input, emotion, ai_reply_text, phone)
+        log_turn("[Agent check]", turn.speech, turn.emotion, ai_reply_text, turn.phone)
         return Response(content=str(response), media_type="application/xml")
+    #  We ask again, so we loop back to the same state 
+    return _reply(turn, "[Agent check]", AGENT_LATER_TEXT, static=True)
 
-    #  Handle NO with persuasion 
-    if any(word in user_input_lower for word in NEGATIVE):
-        persuasion_used += 1
-        if persuasion_used <= len(OFFERS_LIST):
-            ai_reply_text = OFFERS_LIST[persuasion_used - 1]
-            # We update the state in the URL for the *next* turn 
-            next_action_url = build_next_url(persuasion_used, product_explained)
-            background_tasks.add_task(log_turn, "[Persuasion check]", user_input, emotion, ai_reply_text, phone)
-            return create_twiml_response(ai_reply_text, next_action_url)
-        else:
-            ai_reply_text = "No worries! Have a great day ahead."
-            response.say(ai_reply_text)
-            response.hangup()
-            background_tasks.add_task(log_turn, "[Persuasion check]", user_input, emotion, ai_reply_text, phone)
-            return Response(content=str(response), media_type="application/xml")
-
-    #  Handle YES (start product listing) 
-    if any(word in user_input_lower for word in AFFIRMATIVE) and not product_explained:
-        product_explained = True
-        product_text = "Here are our latest offers:\n"
-        for p in PRODUCTS_LIST:
-            product_text += f"- {p['product_name']}\n"
-        ai_reply_text = product_text + "\nWhich product would you like to purchase?"
-        
-        # Update state, explained is now True (1) 
-        next_action_url = build_next_url(persuasion_used, product_explained)
-        background_tasks.add_task(log_turn, "[Intro response]", user_input, emotion, ai_reply_text, phone)
-        return create_twiml_response(ai_reply_text, next_action_url)
-
-    #  Handle CALL agent 
-    if any(kw in user_input_lower for kw in CALL_KEYWORDS):
-        current_hour = datetime.now().hour
-        if 11 <= current_hour < 17:
-            ai_reply_text = "Please wait until the agent is connected..."
-            response.say(ai_reply_text)
-            response.pause(length=3) 
-            response.say("You are now connected to the agent. Ending the conversation. Thank you!")
-            # response.dial("+1234567890")
-            response.hangup()
-        else:
-            ai_reply_text = "Our agent will contact you later. Meanwhile, would you like to hear about our products?"
-            #  We ask again, so we loop back to the same state 
-            next_action_url = build_next_url(persuasion_used, product_explained)
-            background_tasks.add_task(log_turn, "[Agent check]", user_input, emotion, ai_reply_text, phone)
-            return create_twiml_response(ai_reply_text, next_action_url)
-        
-        background_tasks.add_task(log_turn, "[Agent check]", user_input, emotion, ai_reply_text, phone)
-        return Response(content=str(response), media_type="application/xml")
-
-    #  Handle Info request 
-    if any(kw in user_input_lower for kw in INFO_KEYWORDS):
-        found_product = None
-        for p in PRODUCTS_LIST:
-            if p["product_name"].lower() in user_input_lower:
-                found_product = p
-                break
-        if found_product:
-            ai_reply_text = (
-                f"{found_product['product_name']} — {found_product['description']}. "
-                f"The price is ₹{found_product['price']}. "
-                f"You can check it out here: {found_product['product_link']}. "
-                "Would you like to purchase it?"
-            )
-        else:
-            ai_reply_text = "Could you please specify which product you want more details about?"
-        
-        #  Loop back, state doesn't change 
-        next_action_url = build_next_url(persuasion_used, product_explained)
-        background_tasks.add_task(log_turn, "[Intro request]", user_input, emotion, ai_reply_text, phone)
-        return create_twiml_response(ai_reply_text, next_action_url)
-
-    #  Match Product Name (This leads to an SMS and Hangup) 
-    selected_product = None
+#  Handle Info request 
+def _info(turn):
+    found_product = None
     for p in PRODUCTS_LIST:
-        name = p["product_name"].lower()
-        if similar(name, user_input_lower) > 0.6 or any(word in user_input_lower for word in name.split()):
-            selected_product = p
+        if p["product_name"].lower() in turn.text:
+            found_product = p
             break
-            
-    if selected_product:
-        # Use the phone number from our state 
-        mobile_number = phone 
-        product_link = selected_product["product_link"]
-        message = (
-           f"{product_link} is your OTP for login into your account. GGISKB"
-        )
-        #  This still runs on your server, so it works! 
-        send_sms_via_hsp(mobile_number, message) 
-        
-        # SAVE PRODUCT SELECTION + CALL STATUS 
-        summary_path = os.path.join(SCRIPT_DIR, "call_summary.xlsx")
-
-        entry = pd.DataFrame([{
-            "phone": mobile_number,
-            "product": selected_product["product_name"],
-            "call_status": "Completed",
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }])
-
-        # Append or create
-        if os.path.exists(summary_path):
-            old = pd.read_excel(summary_path)
-            df_out = pd.concat([old, entry], ignore_index=True)
-        else:
-            df_out = entry
-
-        df_out.to_excel(summary_path, index=False)
-        print("✅ Saved to call_summary.xlsx →", entry.to_dict(orient="records"))
-
-        last_digits = "".join(mobile_number[-4:])
+    if found_product:
         ai_reply_text = (
-            f"Great choice! I’ve sent the link of {selected_product['product_name']} "
-            f"to your phone number ending with {last_digits}. "
-            "Thank you for your time! I really appreciate it."
+            f"{found_product['product_name']} — {found_product['description']}. "
+            f"The price is ₹{found_product['price']}. "
+            f"You can check it out here: {found_product['product_link']}. "
+            "Would you like to purchase it?"
         )
-        response.say(ai_reply_text)
-        response.hangup()
-        background_tasks.add_task(log_turn, "[Product match]", user_input, emotion, ai_reply_text, phone)
-        return Response(content=str(response), media_type="application/xml")
+    else:
+        ai_reply_text = INFO_ASK_TEXT
+    return _reply(turn, "[Intro request]", ai_reply_text, static=found_product is None)
+
+#  Product matched -> SMS and Hangup 
+def _send_product(turn):
+    selected_product = turn.extra["product"]
+    # Use the phone number from our state 
+    mobile_number = turn.phone 
+    product_link = selected_product["product_link"]
+    message = (
+       f"{product_link} is your OTP for login into your account. GGISKB"
+    )
+    #  SMS and the summary write run after the reply, on their own pools 
+    turn.background_tasks.add_task(http_executor.run_logged, send_sms_via_hsp, mobile_number, message)
+    turn.background_tasks.add_task(
+        io_executor.run_logged, save_call_summary, mobile_number, selected_product["product_name"], turn.extra["campaign"]
+    )
 
-    #  Fallback: AI Response (Ollama) or list products 
-    # Using your original logic to list products as fallback 
+    last_digits = "".join(mobile_number[-4:])
+    ai_reply_text = (
+        f"Great choice! I’ve sent the link of {selected_product['product_name']} "
+        f"to your phone number ending with {last_digits}. "
+        "Thank you for your time! I really appreciate it."
+    )
+    return _hangup(turn, "[Product match]", ai_reply_text)
+
+# SAVE PRODUCT SELECTION + CALL STATUS 
+def save_call_summary(mobile_number, product_name, campaign=DEFAULT_CAMPAIGN):
+    log_pipeline.submit("summary", {"PhoneNumber": mobile_number, "Product": product_name, "Call_Status": "Completed"})
+    # one keyed upsert; call_summary.xlsx is only built on /download-summary
+    summary_store.upsert(mobile_number, campaign, status="Completed", product=product_name, completed_at=True)
+    print("✅ Call summary updated →", mobile_number, product_name, campaign)
+
+#  Fallback: list products 
+def fallback_text():
     ai_reply_text = "Sorry, we don’t have that product right now."
     product_text = "Here are our latest offers:\n"
     for p in PRODUCTS_LIST:
         product_text += f"- {p['product_name']}: {p['description']} at ₹{p['price']}\n"
-    ai_reply_text += "\n" + product_text + "\nWhich product would you like to purchase?"
+    return ai_reply_text + "\n" + product_text + "\nWhich product would you like to purchase?"
+
+def _fallback(turn):
+    return _reply(turn, "[Fallback]", fallback_text(), static=True)
+
+_COMMON = [
+    Transition("agent", _agent, _wants_agent),
+    Transition("info", _info, _wants_info),
+    Transition("product", _send_product, _matches_product),
+    Transition("fallback", _fallback),
+]
+
+LINK_FLOW = Flow(
+    "link",
+    {
+        "intro": [
+            Transition("exit", _exit, _is_exit),
+            Transition("no", _persuade, _is_negative),
+            Transition("yes", _list_products, _is_affirmative),
+        ] + _COMMON,
+        # products already listed: a "yes" can't restart the listing
+        "catalog": [
+            Transition("exit", _exit, _is_exit),
+            Transition("no", _persuade, _is_negative),
+        ] + _COMMON,
+    },
+    default=_fallback,
+)
+
+# pre-render every static reply; called again whenever the catalog changes
+def warm_twiml():
+    GATHER_TWIML.invalidate()
+    GATHER_TWIML.warm(
+        [intro_message(), AGENT_LATER_TEXT, INFO_ASK_TEXT, product_list_text(), fallback_text()] + OFFERS_LIST,
+        speech_timeout=7, num_retries=2, language="en-IN",
+    )
+    HANGUP_TWIML.warm([EXIT_TEXT, PERSUASION_END_TEXT])
+
+warm_twiml()
+
+# This endpoint handles the entire conversation loop 
+# @app.post("/handle-conversation")
+@router.post("/handle-conversation")
+async def handle_conversation(
+    background_tasks: BackgroundTasks,
+    SpeechResult: str = Form(None),           
+    s: str = Query(None),
+):
+    """
+    This is the main "loop". Twilio calls this endpoint every time
+    the user speaks. We read the state (persuasion, explained, phone) from
+    the signed token in the URL and let LINK_FLOW pick what to say next.
+    """
+    persuasion, explained, phone, campaign = 0, False, "Unknown", DEFAULT_CAMPAIGN
+    if s:
+        try:
+            decoded = LINK_STATE.decode(s)
+        except StateTokenError as e:
+            # tampered/expired token: don't trust anything in it
+            print(f"Rejected state token: {e}")
+            response = VoiceResponse()
+            response.say("I'm sorry, I seem to have lost my place. Goodbye.")
+            response.hangup()
+            return Response(content=str(response), media_type="application/xml")
+        persuasion, explained, phone = decoded["persuasion"], decoded["explained"], decoded["phone"]
+        campaign = decoded["campaign"]
+
+    turn = Turn(
+        "catalog" if explained else "intro",
+        SpeechResult, phone, background_tasks,
+        emotion_fn=detect_emotion,
+        matcher=INTENT_MATCHER,
+        persuasion=persuasion,
+        explained=bool(explained),
+        campaign=campaign,
+    )
+    
+    print(f"User ({phone}) said: {turn.speech} (Emotion: {turn.emotion})")
+    print(f"Current state: persuasion={persuasion}, explained={explained}")
     
-    #  Loop back, state doesn't change 
-    next_action_url = build_next_url(persuasion_used, product_explained)
-    background_tasks.add_task(log_turn, "[Fallback]", user_input, emotion, ai_reply_text, phone)
-    return create_twiml_response(ai_reply_text, next_action_url)
+    return await LINK_FLOW.adispatch(turn)
 
 # ENDPOINTS TO TRIGGER OUTBOUND CALLS
 
-def _initiate_call(user_number: str):
-    """Helper function to load env vars and make a single call."""
+def _place_call(user_number: str, campaign: str = DEFAULT_CAMPAIGN):
+    """Load env vars and dial one number; returns the call SID, raises on failure."""
     load_dotenv()
     
     account_sid = os.getenv("TWILIO_ACCOUNT_SID")
@@ -426,20 +524,29 @@ def _initiate_call(user_number: str):
 
     if not all([account_sid, auth_token, twilio_number, ngrok_url]):
         print(" ERROR: Missing .env variables ")
-        return {"error": "Missing one or more .env variables (SID, TOKEN, TWILIO_NUMBER, NGROK_URL)"}
+        raise RuntimeError("Missing one or more .env variables (SID, TOKEN, TWILIO_NUMBER, NGROK_URL)")
+
+    start_call_url = f"{ngrok_url}/link/start-call?campaign={quote(campaign)}"
+    client = Client(account_sid, auth_token)
+
+    print(f" Attempting to call: {user_number} ")
+    call = client.calls.create(
+        to=user_number,
+        from_=twilio_number,
+        url=start_call_url  
+    )
+    print(f"Successfully initiated call! SID: {call.sid}")
+    return call.sid
+
+def _initiate_call(user_number: str, campaign: str = DEFAULT_CAMPAIGN):
+    """Helper function to make a single call."""
+    # don't dial while the LLM is cold, the caller would hear silence
+    if not model_warmup.models_ready():
+        return {"status": "Failed", "error": "LLM models are still warming up, try again shortly", "to": user_number}
 
     try:
-        start_call_url = f"{ngrok_url}/link/start-call"
-        client = Client(account_sid, auth_token)
-
-        print(f" Attempting to call: {user_number} ")
-        call = client.calls.create(
-            to=user_number,
-            from_=twilio_number,
-            url=start_call_url  
-        )
-        print(f"Successfully initiated call! SID: {call.sid}")
-        return {"status": "Call initiated", "sid": call.sid, "to": user_number}
+        sid = _place_call(user_number, campaign)
+        return {"status": "Call initiated", "sid": sid, "to": user_number}
 
     except Exception as e:
         print(f" Error making call to {user_number}: {e} ")
@@ -459,42 +566,78 @@ def start_outbound_call(phone: str):
     
     return _initiate_call(phone)
 
-# phone normalizer
-def normalize_phone(num: str):
-    """ Convert phone number into clean format E.164 """
-    if num is None:
-        return None
-    
-    num = str(num).strip()
-    
-    # remove all the non-numberic character
-    cleaned = "".join(ch for ch in num if ch.isdigit())
-    
-    # Reject invalid lengths
-    if len(cleaned) < 10 or len(cleaned) > 13:
+#  Call summary rows for a campaign 
+def _queue_campaign(campaign, df_valid, invalid_numbers):
+    for original, normalized in zip(df_valid["phone"], df_valid["normalized_phone"]):
+        summary_store.upsert(normalized, campaign, original_phone=original, status="Queued")
+    for original in invalid_numbers:
+        summary_store.upsert(original, campaign, original_phone=original, status="Invalid number")
+
+def _record_dial(campaign, number, result):
+    summary_store.upsert(
+        number, campaign,
+        status=result.get("status"), call_sid=result.get("sid"), error=result.get("error"),
+        dialed_at=True if result.get("attempts", 1) else None,
+    )
+
+# bulk campaigns: dialed in the background at the Twilio CPS (see dialer.py)
+link_dialer = Dialer("link", _place_call, on_result=_record_dial)
+
+WARMING_UP = {"error": "LLM models are still warming up, try again shortly"}
+
+@router.get("/dial-status")
+def dial_status(job: str, results: bool = False):
+    """Progress of a bulk dial job (per-number results with results=true)."""
+    dial_job = link_dialer.job(job)
+    if dial_job is None:
+        return {"error": f"Unknown dial job {job}"}
+    return dial_job.snapshot(results=results)
+
+@router.post("/dial-cancel")
+def dial_cancel(job: str):
+    """Stop a bulk dial job; numbers not dialed yet are marked Cancelled."""
+    dial_job = link_dialer.cancel(job)
+    if dial_job is None:
+        return {"error": f"Unknown dial job {job}"}
+    return dial_job.snapshot()
+
+# uploads are written and parsed on the io pool, not on the event loop
+# that also serves the call webhooks
+def _save_upload(path, contents):
+    with open(path, "wb") as f:
+        f.write(contents)
+
+def _reload_products(path, contents):
+    _save_upload(path, contents)
+    set_products(load_products())
+
+def _read_customers(path, contents):
+    """ (valid rows, invalid numbers), or None without a 'phone' column """
+    _save_upload(path, contents)
+    df = pd.read_excel(path)
+
+    if "phone" not in df.columns:
         return None
-    
-    # remove leading zero 
-    if cleaned.startswith("0"):
-        cleaned = cleaned[1:]
-        
-    # if 10 digits assume India (+91)
-    if len(cleaned) == 10:
-        cleaned = "91" + cleaned
-        
-    # Verify if its start with +
-    if not cleaned.startswith("+"):
-        cleaned = "+" + cleaned
-        
-    return cleaned
+
+    # Clean whitespace
+    df["phone"] = df["phone"].astype(str).str.strip()
+
+    # Normalize numbers
+    df["normalized_phone"] = df["phone"].apply(normalize_phone)
+
+    # Invalid numbers
+    invalid_numbers = df[df["normalized_phone"].isna()]["phone"].tolist()
+
+    # Valid numbers
+    df_valid = df.dropna(subset=["normalized_phone"])
+    df_valid = df_valid.drop_duplicates(subset=["normalized_phone"])
+    return df_valid, invalid_numbers
 
 # upload product file 
 @router.post("/upload-products-files")
 async def upload_products_file(file: UploadFile = File(...)):
     """ Upload a new products.xlsx file → refresh PRODUCTS_LIST. """
     
-    global PRODUCTS_LIST
-    
     allowed_ext = ["xls","xlsx"]
     name = file.filename.lower()
     
@@ -504,13 +647,9 @@ async def upload_products_file(file: UploadFile = File(...)):
     save_path = os.path.join(SCRIPT_DIR, "products.xlsx")
     
     try:
-        # save uploaded excel
+        # save uploaded excel and reload product list
         contents = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(contents)
-
-        # reload product list
-        PRODUCTS_LIST = load_products()
+        await io_executor.run(_reload_products, save_path, contents)
 
         return {
             "status": "Product file uploaded successfully",
@@ -522,10 +661,16 @@ async def upload_products_file(file: UploadFile = File(...)):
     
 #  upload file 
 @router.post("/upload-customer-file")
-async def upload_customers_file(file: UploadFile = File(...)):
+async def upload_customers_file(file: UploadFile = File(...), campaign: str = Query(None)):
     """
     Upload Excel → Automatically start calling → Generate summary.
+    The campaign defaults to the file name; re-uploading it updates the same rows.
+    Calls are dialed in the background; follow them with /dial-status?job=...
     """
+    # don't dial while the LLM is cold, the callers would hear silence
+    if not model_warmup.models_ready():
+        return WARMING_UP
+
     allowed_ext = ["xls", "xlsx"]
     name = file.filename.lower()
     
@@ -533,85 +678,76 @@ async def upload_customers_file(file: UploadFile = File(...)):
         return {"error": "Only .xls or .xlsx files are allowed."}
 
     save_path = os.path.join(SCRIPT_DIR, "customers.xlsx")
+    campaign = campaign or os.path.splitext(os.path.basename(file.filename))[0]
+    if _campaign_error(campaign):
+        return _campaign_error(campaign)
 
     try:
-        # Save the uploaded file
+        # Save and read the uploaded file
         contents = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(contents)
-
-        # Read the Excel file
-        df = pd.read_excel(save_path)
+        parsed = await io_executor.run(_read_customers, save_path, contents)
 
-        if "phone" not in df.columns:
+        if parsed is None:
             return {"error": "Excel must contain a 'phone' column"}
-
-        # Clean whitespace
-        df["phone"] = df["phone"].astype(str).str.strip()
-
-        # Normalize numbers
-        df["normalized_phone"] = df["phone"].apply(normalize_phone)
-
-        # Invalid numbers
-        invalid_numbers = df[df["normalized_phone"].isna()]["phone"].tolist()
-
-        # Valid numbers
-        df_valid = df.dropna(subset=["normalized_phone"])
-        df_valid = df_valid.drop_duplicates(subset=["normalized_phone"])
+        df_valid, invalid_numbers = parsed
 
         phone_numbers = df_valid["normalized_phone"].tolist()
-        results = []
-
-        print(f"🚀 Starting Calls for {len(phone_numbers)} numbers...")
+        await io_executor.run(_queue_campaign, campaign, df_valid, invalid_numbers)
 
-        #  Start calling each number
-        for num in phone_numbers:
-            result = _initiate_call(str(num))
-            results.append(result)
-            time.sleep(1)  # Prevent rate limiting
+        print(f"🚀 Starting Calls for {len(phone_numbers)} numbers (campaign {campaign})...")
 
-        #Create call_summary.xlsx
-        summary_path = os.path.join(SCRIPT_DIR, "call_summary.xlsx")
-        summary_df = pd.DataFrame({
-            "original_phone": df["phone"],
-            "normalized_phone": df["normalized_phone"],
-            "invalid_numbers": [", ".join(invalid_numbers)] * len(df)
-        })
-
-        summary_df.to_excel(summary_path, index=False)
+        #  Queue every number on the dialer; returns right away
+        job = link_dialer.start([str(num) for num in phone_numbers], campaign)
 
         #Return Result
         return {
             "status": "Upload Successful, Calls Started",
             "numbers_called": len(phone_numbers),
             "invalid_numbers": invalid_numbers,
+            "campaign": campaign,
             "summary_file": "call_summary.xlsx",
-            "call_results": results
+            "dial_job": job.id,
         }
 
     except Exception as e:
         return {"error": f"Could not process file: {str(e)}"}
     
 @router.get("/download-summary")
-def download_summary():
+async def download_summary(
+    request: Request, campaign: str = None, since: str = None, until: str = None, outcome: str = None,
+):
     """
-    Allows downloading of call_summary.xlsx
+    Allows downloading of call_summary.xlsx, streamed from the summary store
+    (one campaign, or all of them). Same as /export/summary?format=xlsx.
     """
-    summary_path = os.path.join(SCRIPT_DIR, "call_summary.xlsx")
-
-    if not os.path.exists(summary_path):
-        return {"error": "Summary file not found. Please run /start-excel-call-list first."}
+    return await export_response(
+        request, "summary", "xlsx", filename="call_summary.xlsx",
+        campaign=campaign, since=since, until=until, outcome=outcome,
+    )
 
-    return FileResponse(summary_path, filename="call_summary.xlsx")
+@router.get("/download-log")
+async def download_log(request: Request, phone: str = None, since: str = None, until: str = None):
+    """
+    Conversation log as .xlsx, streamed from the log store on request
+    (optionally only one phone number / a time range).
+    """
+    return await export_response(
+        request, "turns", "xlsx", filename="Sales_Conversation_Twilio.xlsx", phone=phone, since=since, until=until,
+    )
 
 @router.get("/start-excel-call-list") 
-def start_excel_call_list():
+def start_excel_call_list(campaign: str = "customers"):
     """
     Reads 'customers.xlsx', validates phone column, normalizes numbers,
-    removes duplicates, auto-cleans data, and generates call_summary.xlsx.
+    removes duplicates, auto-cleans data, and records every number in the
+    call summary under `campaign`. Calls are dialed in the background.
     """
+    if not model_warmup.models_ready():
+        return WARMING_UP
+    if _campaign_error(campaign):
+        return _campaign_error(campaign)
+
     call_list_path = os.path.join(SCRIPT_DIR, "customers.xlsx")
-    summary_path = os.path.join(SCRIPT_DIR,"call_summary.xlsx")
     
     if not os.path.exists(call_list_path):
         return {"error": "call_list.xlsx not found.Please upload using /upload-customers-file"}
@@ -639,29 +775,18 @@ def start_excel_call_list():
             return {"error": "Excel file must have a 'phone' column."}
         
         phone_numbers = df_valid["normalized_phone"].dropna().tolist()
-        results = []
+        _queue_campaign(campaign, df_valid, invalid_numbers)
         
-        print(f" Starting Excel Call List ({len(phone_numbers)} numbers) ")
-        for number in phone_numbers:
-            result = _initiate_call(str(number))
-            results.append(result)
-            time.sleep(1) # Add a small delay between calls
-        
-        print(" Excel Call List Finished ")
-        summary_df = pd.DataFrame({
-            "original_phone": df["phone"],
-            "normalized_phone": df["normalized_phone"],
-            "invalid_numbers": [", ".join(invalid_numbers)] * len(df)
-        })
-
-        summary_df.to_excel(summary_path, index=False)
+        print(f" Starting Excel Call List ({len(phone_numbers)} numbers, campaign {campaign}) ")
+        job = link_dialer.start([str(number) for number in phone_numbers], campaign)
 
         return {
             "status": "Excel processed successfully",
             "valid_numbers": len(phone_numbers),
             "invalid_numbers": invalid_numbers,
+            "campaign": campaign,
             "summary_created": "call_summary.xlsx",
-            "results": results
+            "dial_job": job.id,
         }
         # return {"status": "Call list processed", "results": results}
         
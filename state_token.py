@@ -0,0 +1,232 @@
+import os
+import hmac
+import time
+import struct
+import base64
+import secrets
+import hashlib
+import threading
+
+from session_store import session_store, SESSION_BACKEND
+
+# Signed conversation-state token carried in the webhook URL (?s=...).
+# Layout (then base64url, no padding):
+#   version:1 | codec id:1 | issued_at:4 | packed fields | hmac-sha256[:8]
+# Fields are binary packed by a per-router StateCodec (enums and counters
+# are one byte, phone numbers are BCD), so a whole lead/link state is
+# ~25 URL characters. A state that would make the URL too long is kept
+# server side in the session store and the token only carries its id;
+# with several workers that needs a shared backend (SESSION_BACKEND=sqlite),
+# the default memory backend is per process.
+#
+# Every worker must sign with the same key: set STATE_TOKEN_SECRET (or
+# TWILIO_AUTH_TOKEN) in the environment or .env. STATE_TOKEN_STRICT=1
+# refuses to run without one.
+
+TOKEN_VERSION = 1
+SIG_BYTES = 8
+# tokens older than this are refused (a call never lasts that long)
+TOKEN_MAX_AGE = int(os.getenv("STATE_TOKEN_MAX_AGE", str(6 * 3600)))
+# longest token we put in a URL before switching to the server-side copy
+MAX_TOKEN_CHARS = int(os.getenv("STATE_TOKEN_MAX_CHARS", "256"))
+_REF_FLAG = 0x80
+_REF_ID_BYTES = 9
+
+
+STRICT_SECRET = os.getenv("STATE_TOKEN_STRICT", "0") == "1"
+
+_secret = None
+_secret_lock = threading.Lock()
+_warned_ref = False
+
+
+def _load_secret():
+    try:
+        # the routers call load_dotenv() after importing this module
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    value = os.getenv("STATE_TOKEN_SECRET") or os.getenv("TWILIO_AUTH_TOKEN")
+    if value:
+        return value.encode()
+    if STRICT_SECRET:
+        raise RuntimeError("STATE_TOKEN_SECRET (or TWILIO_AUTH_TOKEN) is not set")
+    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+    print("ERROR: STATE_TOKEN_SECRET / TWILIO_AUTH_TOKEN not set.")
+    print("Using a per-process random key: calls break across workers and restarts.")
+    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+    return secrets.token_bytes(32)
+
+
+def secret():
+    """The signing key, read on first use (so .env has been loaded by then)."""
+    global _secret
+    if _secret is None:
+        with _secret_lock:
+            if _secret is None:
+                _secret = _load_secret()
+    return _secret
+
+
+class StateTokenError(ValueError):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(token):
+    try:
+        return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError) as e:
+        raise StateTokenError(f"bad encoding: {e}")
+
+
+def _sign(body):
+    return hmac.new(secret(), body, hashlib.sha256).digest()[:SIG_BYTES]
+
+
+#  Field types
+class SmallInt:
+    """Small non-negative integer (0..255)."""
+
+    def pack(self, value):
+        return bytes([max(0, min(255, int(value)))])
+
+    def unpack(self, buf, pos):
+        return buf[pos], pos + 1
+
+
+class Flag:
+    def pack(self, value):
+        return b"\x01" if value else b"\x00"
+
+    def unpack(self, buf, pos):
+        return bool(buf[pos]), pos + 1
+
+
+class Enum:
+    def __init__(self, *values):
+        self.values = values
+        self._index = {v: i for i, v in enumerate(values)}
+
+    def pack(self, value):
+        if value not in self._index:
+            raise StateTokenError(f"unknown value {value!r}")
+        return bytes([self._index[value]])
+
+    def unpack(self, buf, pos):
+        i = buf[pos]
+        if i >= len(self.values):
+            raise StateTokenError(f"enum index {i} out of range")
+        return self.values[i], pos + 1
+
+
+class Text:
+    """utf-8 string up to max_bytes (at most 255); a longer one is refused, never cut."""
+
+    def __init__(self, max_bytes=255):
+        if not 0 < max_bytes <= 255:
+            raise ValueError("max_bytes must be 1..255")
+        self.max_bytes = max_bytes
+
+    def pack(self, value):
+        raw = str(value).encode("utf-8")
+        if len(raw) > self.max_bytes:
+            raise StateTokenError(f"text of {len(raw)} bytes, at most {self.max_bytes} fit")
+        return bytes([len(raw)]) + raw
+
+    def unpack(self, buf, pos):
+        n = buf[pos]
+        raw = buf[pos + 1:pos + 1 + n]
+        if len(raw) < n:
+            raise StateTokenError("truncated payload")
+        try:
+            return raw.decode("utf-8"), pos + 1 + n
+        except UnicodeDecodeError as e:
+            raise StateTokenError(f"bad text: {e}")
+
+
+class Phone(Text):
+    """E.164 numbers packed two digits per byte; anything else falls back to Text."""
+
+    _BCD = 0x80
+
+    def pack(self, value):
+        value = str(value)
+        digits = value[1:] if value.startswith("+") else value
+        if not digits.isdigit() or len(digits) > 30:
+            return b"\x00" + super().pack(value)
+        header = self._BCD | (0x40 if value.startswith("+") else 0) | (len(digits) & 0x3F)
+        padded = digits + "0" * (len(digits) % 2)
+        return bytes([header]) + bytes(int(padded[i]) << 4 | int(padded[i + 1]) for i in range(0, len(padded), 2))
+
+    def unpack(self, buf, pos):
+        header = buf[pos]
+        if not header & self._BCD:
+            return super().unpack(buf, pos + 1)
+        n = header & 0x3F
+        size = (n + 1) // 2
+        raw = buf[pos + 1:pos + 1 + size]
+        digits = "".join(f"{b >> 4}{b & 0x0F}" for b in raw)[:n]
+        return ("+" if header & 0x40 else "") + digits, pos + 1 + size
+
+
+class StateCodec:
+    def __init__(self, codec_id, fields):
+        """fields: [(name, field_type), ...] in wire order"""
+        if not 0 <= codec_id < _REF_FLAG:
+            raise ValueError("codec_id must be 0..127")
+        self.codec_id = codec_id
+        self.fields = list(fields)
+
+    def _header(self, codec_byte):
+        return struct.pack(">BBI", TOKEN_VERSION, codec_byte, int(time.time()))
+
+    def encode(self, state):
+        payload = b"".join(kind.pack(state[name]) for name, kind in self.fields)
+        body = self._header(self.codec_id) + payload
+        token = _b64encode(body + _sign(body))
+        if len(token) <= MAX_TOKEN_CHARS:
+            return token
+        # too long for a URL: keep the payload server side, sign the reference
+        global _warned_ref
+        if SESSION_BACKEND == "memory" and not _warned_ref:
+            _warned_ref = True
+            print("State token stored server side in the memory session store: "
+                  "use SESSION_BACKEND=sqlite when running several workers")
+        ref = secrets.token_bytes(_REF_ID_BYTES)
+        session_store.set("state:" + ref.hex(), {"p": _b64encode(payload)})
+        body = self._header(self.codec_id | _REF_FLAG) + ref
+        return _b64encode(body + _sign(body))
+
+    def decode(self, token):
+        raw = _b64decode(token or "")
+        if len(raw) < 6 + SIG_BYTES:
+            raise StateTokenError("token too short")
+        body, sig = raw[:-SIG_BYTES], raw[-SIG_BYTES:]
+        if not hmac.compare_digest(sig, _sign(body)):
+            raise StateTokenError("bad signature")
+        version, codec_byte, issued = struct.unpack(">BBI", body[:6])
+        if version != TOKEN_VERSION:
+            raise StateTokenError(f"unsupported version {version}")
+        if codec_byte & ~_REF_FLAG != self.codec_id:
+            raise StateTokenError("token belongs to another flow")
+        if time.time() - issued > TOKEN_MAX_AGE:
+            raise StateTokenError("token expired")
+        payload = body[6:]
+        if codec_byte & _REF_FLAG:
+            stored = session_store.get("state:" + payload.hex())
+            if stored is None:
+                raise StateTokenError("server-side state expired")
+            payload = _b64decode(stored["p"])
+        state = {}
+        pos = 0
+        try:
+            for name, kind in self.fields:
+                state[name], pos = kind.unpack(payload, pos)
+        except IndexError:
+            raise StateTokenError("truncated payload")
+        return state
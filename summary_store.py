@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from log_store import LOG_DB, TIMESTAMP_FORMAT, PAGE_SIZE
+
+# Per-call summary keyed by (normalized phone, campaign).
+# Every event of a call (queued, dialed, answered, product sent) is one
+# upsert of the fields it knows about, so campaigns never overwrite each
+# other and a product match doesn't rewrite a file. call_summary.xlsx is
+# only produced when someone downloads it (streamed by exports.py).
+
+SUMMARY_DB = os.getenv("SUMMARY_DB", LOG_DB)
+DEFAULT_CAMPAIGN = "default"
+
+# export order for call_summary.xlsx
+COLUMNS = [
+    "phone", "campaign", "original_phone", "status", "product", "call_sid", "error",
+    "created_at", "updated_at", "dialed_at", "answered_at", "completed_at",
+]
+_UPDATABLE = set(COLUMNS) - {"phone", "campaign", "created_at", "updated_at"}
+
+
+def normalize_phone(num):
+    """ Convert phone number into clean format E.164 """
+    if num is None:
+        return None
+
+    num = str(num).strip()
+
+    # remove all the non-numberic character
+    cleaned = "".join(ch for ch in num if ch.isdigit())
+
+    # Reject invalid lengths
+    if len(cleaned) < 10 or len(cleaned) > 13:
+        return None
+
+    # remove leading zero
+    if cleaned.startswith("0"):
+        cleaned = cleaned[1:]
+
+    # if 10 digits assume India (+91)
+    if len(cleaned) == 10:
+        cleaned = "91" + cleaned
+
+    return "+" + cleaned
+
+
+class SummaryStore:
+    def __init__(self, path=SUMMARY_DB):
+        self.path = path
+        self._local = threading.local()
+        cols = ", ".join(f"{c} TEXT" for c in COLUMNS)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS call_summary ({cols}, rev INTEGER, PRIMARY KEY (phone, campaign))"
+        )
+        if "rev" not in [r[1] for r in conn.execute("PRAGMA table_info(call_summary)")]:
+            conn.execute("ALTER TABLE call_summary ADD COLUMN rev INTEGER")
+        # rev = last change number, so "anything changed?" is one index lookup
+        conn.execute("CREATE INDEX IF NOT EXISTS call_summary_rev ON call_summary (rev)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(phone, campaign):
+        return normalize_phone(phone) or str(phone), campaign or DEFAULT_CAMPAIGN
+
+    def upsert(self, phone, campaign=None, **fields):
+        """
+        Insert or update one call's row; only the given fields change
+        (None values are ignored). A field ending in _at may be True for "now".
+        """
+        unknown = set(fields) - _UPDATABLE
+        if unknown:
+            raise ValueError(f"unknown summary fields: {sorted(unknown)}")
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        fields = {k: (now if v is True and k.endswith("_at") else str(v)) for k, v in fields.items() if v is not None}
+        phone, campaign = self._key(phone, campaign)
+        names = ["phone", "campaign", "created_at", "updated_at"] + list(fields)
+        values = [phone, campaign, now, now] + list(fields.values())
+        updates = ", ".join(["updated_at = excluded.updated_at", "rev = excluded.rev"] + [f"{k} = excluded.{k}" for k in fields])
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO call_summary ({', '.join(names)}, rev) "
+                f"VALUES ({', '.join('?' * len(names))}, (SELECT COALESCE(MAX(rev), 0) + 1 FROM call_summary)) "
+                f"ON CONFLICT (phone, campaign) DO UPDATE SET {updates}",
+                values,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, phone, campaign=None):
+        phone, campaign = self._key(phone, campaign)
+        cur = self._conn().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM call_summary WHERE phone = ? AND campaign = ?", (phone, campaign)
+        )
+        row = cur.fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def version(self):
+        """Changes on every upsert."""
+        return self._conn().execute("SELECT COALESCE(MAX(rev), 0) FROM call_summary").fetchone()[0]
+
+    def rows(self, campaign=None, phone=None, since=None, until=None, outcome=None, page_size=PAGE_SIZE):
+        """
+        Yield rows in the order they were first queued, optionally filtered
+        (since/until apply to updated_at, outcome to status). Read in pages
+        like LogStore.rows, so it can be resumed on another thread.
+        """
+        where, params = [], []
+        if campaign:
+            where.append("campaign = ?")
+            params.append(campaign)
+        if phone:
+            where.append("phone = ?")
+            params.append(normalize_phone(phone) or str(phone))
+        if since:
+            where.append("updated_at >= ?")
+            params.append(str(since))
+        if until:
+            where.append("updated_at < ?")
+            params.append(str(until))
+        if outcome:
+            where.append("status = ?")
+            params.append(outcome)
+        sql = f"SELECT rowid, {', '.join(COLUMNS)} FROM call_summary WHERE " + " AND ".join(where + ["rowid > ?"])
+        last_rowid = 0
+        while True:
+            page = self._conn().execute(sql + " ORDER BY rowid LIMIT ?", params + [last_rowid, page_size]).fetchall()
+            for values in page:
+                yield dict(zip(COLUMNS, values[1:]))
+            if len(page) < page_size:
+                return
+            last_rowid = page[-1][0]
+
+    def campaigns(self):
+        cur = self._conn().execute(
+            "SELECT campaign, status, COUNT(*) FROM call_summary GROUP BY campaign, status ORDER BY campaign"
+        )
+        out = {}
+        for campaign, status, n in cur:
+            out.setdefault(campaign, {})[status or ""] = n
+        return out
+
+    def stats(self):
+        count = self._conn().execute("SELECT COUNT(*) FROM call_summary").fetchone()[0]
+        return {"path": self.path, "rows": count, "campaigns": self.campaigns()}
+
+
+summary_store = SummaryStore()
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# the stores open their SQLite files on import: keep them out of the checkout
+_DATA = tempfile.mkdtemp(prefix="speechbot-tests-")
+os.environ.setdefault("LOG_DB", os.path.join(_DATA, "conversation_log.db"))
+os.environ.setdefault("SESSION_DB", os.path.join(_DATA, "sessions.db"))
+os.environ.setdefault("ANALYTICS_DIR", os.path.join(_DATA, "analytics_data"))
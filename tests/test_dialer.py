@@ -0,0 +1,93 @@
+import time
+import threading
+
+import pytest
+
+from dialer import Dialer
+
+
+class ApiError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class FakeTwilio:
+    """place_call stand-in: fails each number with the queued errors, then succeeds."""
+
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, number, campaign):
+        with self._lock:
+            self.calls.append((number, time.monotonic()))
+            pending = self.errors.get(number)
+            if pending:
+                raise pending.pop(0)
+        return "CA" + number
+
+
+def wait(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.finished is None:
+        assert time.monotonic() < deadline, job.snapshot()
+        time.sleep(0.01)
+    return job.snapshot(results=True)
+
+
+@pytest.fixture
+def make_dialer():
+    dialers = []
+
+    def make(place_call, **kwargs):
+        kwargs.setdefault("rate", 1000)
+        kwargs.setdefault("burst", 100)
+        kwargs.setdefault("backoff", 0.01)
+        dialers.append(Dialer("test", place_call, **kwargs))
+        return dialers[-1]
+
+    yield make
+    for d in dialers:
+        d.shutdown()
+
+
+def test_duplicate_numbers_are_dialed_once_and_the_job_finishes(make_dialer):
+    twilio = FakeTwilio()
+    job = make_dialer(twilio).start(["+911", "+912", "+911", "+913", "+912"], "c")
+    snap = wait(job)
+    assert snap["total"] == snap["done"] == 3
+    assert sorted(n for n, _ in twilio.calls) == ["+911", "+912", "+913"]
+
+
+def test_calls_are_paced_by_the_token_bucket(make_dialer):
+    twilio = FakeTwilio()
+    job = make_dialer(twilio, rate=20, burst=1, concurrency=4).start([f"+91{i}" for i in range(6)], "c")
+    wait(job)
+    stamps = sorted(t for _, t in twilio.calls)
+    # 6 calls at 20/s with no burst: at least 5 refill intervals
+    assert stamps[-1] - stamps[0] >= 5 / 20 * 0.9
+
+
+def test_rate_limited_call_is_retried(make_dialer):
+    twilio = FakeTwilio({"+911": [ApiError(429)]})
+    result = wait(make_dialer(twilio).start(["+911"], "c"))["results"]["+911"]
+    assert result["status"] == "Call initiated"
+    assert result["attempts"] == 2
+
+
+def test_server_error_is_not_retried(make_dialer):
+    # the call may have been created: dialing again could ring twice
+    twilio = FakeTwilio({"+911": [ApiError(503)]})
+    result = wait(make_dialer(twilio).start(["+911"], "c"))["results"]["+911"]
+    assert result["status"] == "Failed"
+    assert result["attempts"] == 1
+    assert len(twilio.calls) == 1
+
+
+def test_results_reach_on_result(make_dialer):
+    seen = []
+    job = make_dialer(FakeTwilio(), on_result=lambda c, n, r: seen.append((c, n, r["status"]))).start(["+911"], "c")
+    wait(job)
+    assert seen == [("c", "+911", "Call initiated")]
@@ -0,0 +1,15 @@
+from keyword_matcher import KeywordMatcher
+
+
+MATCHER = KeywordMatcher({"affirmative": ["हाँ", "yes"], "negative": ["नहीं", "no"]})
+
+
+def test_phrase_ending_in_danda():
+    assert MATCHER.intents("नहीं।") == {"negative"}
+    assert MATCHER.intents("हाँ।") == {"affirmative"}
+    assert MATCHER.intents("हाँ॥") == {"affirmative"}
+
+
+def test_no_match_inside_a_word():
+    assert MATCHER.intents("I don't know") == set()
+    assert MATCHER.intents("yesterday") == set()
@@ -0,0 +1,25 @@
+from product_index import ProductIndex
+
+
+CATALOG = ProductIndex([{"product_name": name} for name in [
+    "iPhone 15 Pro", "Galaxy S23", "Laptop Pro", "Smart Watch", "Bluetooth Earbuds", "Power Bank",
+    "Phone Case", "Phone Stand", "Phone Ring Holder", "Wireless Phone Charger", "Phone Screen Guard",
+]])
+
+
+def name(product):
+    return product["product_name"] if product else None
+
+
+def test_one_distinctive_word_is_enough():
+    assert name(CATALOG.best("i want iphone")) == "iPhone 15 Pro"
+
+
+def test_run_together_words_match_on_trigrams():
+    assert name(CATALOG.best("galaxys23")) == "Galaxy S23"
+    assert name(CATALOG.best("i want the galaxys23")) == "Galaxy S23"
+
+
+def test_common_word_alone_is_not_a_match():
+    assert CATALOG.best("call me on my phone") is None
+    assert name(CATALOG.search("call me on my phone")[0][0]).startswith("Phone")
@@ -0,0 +1,65 @@
+import pytest
+
+import state_token
+from state_token import StateCodec, StateTokenError, SmallInt, Flag, Enum, Text, Phone
+
+
+CODEC = StateCodec(9, [
+    ("step", Enum("intro", "awaiting_name")),
+    ("retries", SmallInt()),
+    ("explained", Flag()),
+    ("phone", Phone()),
+    ("campaign", Text()),
+])
+STATE = {"step": "awaiting_name", "retries": 3, "explained": True, "phone": "+919876543210", "campaign": "दिवाली sale"}
+
+
+@pytest.fixture(autouse=True)
+def signing_key(monkeypatch):
+    monkeypatch.setattr(state_token, "_secret", b"test-key")
+
+
+def test_round_trip():
+    token = CODEC.encode(STATE)
+    assert CODEC.decode(token) == STATE
+    assert len(token) <= state_token.MAX_TOKEN_CHARS     # carried in the URL, no server-side copy
+
+
+def test_long_state_round_trips_through_the_server_side_copy(monkeypatch):
+    monkeypatch.setattr(state_token, "MAX_TOKEN_CHARS", 20)
+    token = CODEC.encode(STATE)
+    assert len(token) <= 40
+    assert CODEC.decode(token) == STATE
+
+
+def test_tampered_token_is_refused():
+    token = CODEC.encode(STATE)
+    i = len(token) // 2
+    tampered = token[:i] + ("A" if token[i] != "A" else "B") + token[i + 1:]
+    with pytest.raises(StateTokenError):
+        CODEC.decode(tampered)
+
+
+def test_token_signed_with_another_key_is_refused(monkeypatch):
+    token = CODEC.encode(STATE)
+    monkeypatch.setattr(state_token, "_secret", b"other-key")
+    with pytest.raises(StateTokenError, match="signature"):
+        CODEC.decode(token)
+
+
+def test_token_of_another_flow_is_refused():
+    other = StateCodec(10, CODEC.fields)
+    with pytest.raises(StateTokenError, match="another flow"):
+        CODEC.decode(other.encode(STATE))
+
+
+def test_expired_token_is_refused(monkeypatch):
+    token = CODEC.encode(STATE)
+    monkeypatch.setattr(state_token, "TOKEN_MAX_AGE", -1)
+    with pytest.raises(StateTokenError, match="expired"):
+        CODEC.decode(token)
+
+
+def test_oversized_text_is_refused_not_cut():
+    with pytest.raises(StateTokenError):
+        CODEC.encode({**STATE, "campaign": "ब" * 100})     # 300 utf-8 bytes
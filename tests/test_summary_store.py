@@ -0,0 +1,54 @@
+import pytest
+
+from summary_store import SummaryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SummaryStore(path=str(tmp_path / "summary.db"))
+
+
+def test_upsert_only_changes_the_given_fields(store):
+    store.upsert("9876543210", "diwali", original_phone="9876543210", status="Queued")
+    first = store.get("+919876543210", "diwali")
+    store.upsert("+919876543210", "diwali", status="Completed", product="Laptop Pro", error=None)
+    row = store.get("9876543210", "diwali")
+    assert row["phone"] == "+919876543210"
+    assert row["status"] == "Completed"
+    assert row["product"] == "Laptop Pro"
+    assert row["original_phone"] == "9876543210"
+    assert row["created_at"] == first["created_at"]
+    assert row["error"] is None
+
+
+def test_campaigns_do_not_overwrite_each_other(store):
+    store.upsert("9876543210", "diwali", status="Completed")
+    store.upsert("9876543210", None, status="Queued")
+    assert store.get("9876543210", "diwali")["status"] == "Completed"
+    assert store.get("9876543210")["campaign"] == "default"
+    assert store.campaigns() == {"default": {"Queued": 1}, "diwali": {"Completed": 1}}
+
+
+def test_version_changes_on_every_upsert(store):
+    versions = [store.version()]
+    for status in ("Queued", "Call initiated", "Completed"):
+        store.upsert("9876543210", "diwali", status=status)
+        versions.append(store.version())
+    assert versions == sorted(set(versions))
+
+
+def test_true_timestamp_means_now(store):
+    store.upsert("9876543210", "diwali", answered_at=True)
+    assert store.get("9876543210", "diwali")["answered_at"][:2] == "20"
+
+
+def test_unknown_field_is_refused(store):
+    with pytest.raises(ValueError):
+        store.upsert("9876543210", "diwali", created_at="2020-01-01 00:00:00")
+
+
+def test_rows_filter_and_page(store):
+    for i in range(7):
+        store.upsert(f"98765432{i:02d}", "diwali" if i % 2 else "holi", status="Queued")
+    rows = list(store.rows(campaign="diwali", page_size=2))
+    assert [r["phone"] for r in rows] == ["+919876543201", "+919876543203", "+919876543205"]
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import atexit
+import threading
+from collections import OrderedDict
+
+# Persistent English -> Hindi translation memory.
+# Static bot lines (greeting, offers, retry prompts) are translated once and
+# pinned; dynamic lines go through a bounded LRU. Both are saved to disk so
+# a restart doesn't re-translate anything the 9B model already did.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MEMORY_FILE = os.getenv("TRANSLATION_MEMORY_FILE", os.path.join(SCRIPT_DIR, "translation_memory.json"))
+MEMORY_SIZE = int(os.getenv("TRANSLATION_MEMORY_SIZE", "5000"))
+# write to disk after this many new dynamic translations
+SAVE_EVERY = int(os.getenv("TRANSLATION_MEMORY_SAVE_EVERY", "20"))
+
+MEMORY_VERSION = 1
+
+
+def _key(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class TranslationMemory:
+    def __init__(self, path=MEMORY_FILE, max_size=MEMORY_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._static = {}              # pinned, never evicted
+        self._lru = OrderedDict()      # dynamic strings
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MEMORY_VERSION:
+                print(f"Ignoring translation memory {self.path} (version {data.get('version')})")
+                return
+            with self._lock:
+                self._static.update(data.get("static", {}))
+                for en, hi in data.get("dynamic", {}).items():
+                    self._lru[en] = hi
+                while len(self._lru) > self.max_size:
+                    self._lru.popitem(last=False)
+            print(f"Loaded {len(self._static)} static + {len(self._lru)} cached translations from {self.path}")
+        except Exception as e:
+            print("Could not load translation memory:", e)
+
+    def save(self):
+        with self._lock:
+            data = {
+                "version": MEMORY_VERSION,
+                "static": dict(self._static),
+                "dynamic": dict(self._lru),
+            }
+            self._unsaved = 0
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print("Could not save translation memory:", e)
+
+    def flush(self):
+        """Save only if there are dynamic translations not on disk yet."""
+        if self._unsaved:
+            self.save()
+
+    def get(self, text):
+        key = _key(text)
+        with self._lock:
+            if key in self._static:
+                self.hits += 1
+                return self._static[key]
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+            self.misses += 1
+            return None
+
+    def put(self, text, translated, static=False):
+        key = _key(text)
+        if not translated or translated == text:
+            # failed translation (translator returned the English) isn't remembered
+            return
+        save_now = False
+        with self._lock:
+            if static:
+                self._static[key] = translated
+                self._lru.pop(key, None)
+            else:
+                self._lru[key] = translated
+                self._lru.move_to_end(key)
+                while len(self._lru) > self.max_size:
+                    self._lru.popitem(last=False)
+                self._unsaved += 1
+                save_now = self._unsaved >= SAVE_EVERY
+        if save_now:
+            self.save()
+
+    def translate(self, text, translator):
+        """Return the remembered translation or call translator(text) and remember it."""
+        hit = self.get(text)
+        if hit is not None:
+            return hit
+        translated = translator(text)
+        self.put(text, translated)
+        return translated
+
+    def warm_static(self, texts, translator):
+        """Translate every static string that isn't pinned yet, then save."""
+        new = 0
+        for text in texts:
+            key = _key(text)
+            with self._lock:
+                if key in self._static:
+                    continue
+                cached = self._lru.get(key)
+            translated = cached or translator(text)
+            if translated and translated != text:
+                self.put(text, translated, static=True)
+                new += 1
+        if new:
+            self.save()
+        print(f"Translation memory: {new} static strings translated, {len(self._static)} pinned")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "static": len(self._static),
+                "dynamic": len(self._lru),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+translation_memory = TranslationMemory()
+# flush whatever is left when the process exits
+atexit.register(translation_memory.flush)
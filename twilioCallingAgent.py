@@ -7,13 +7,14 @@ import asyncio
 import edge_tts
 import tempfile
 import pygame
-import spacy
-from textblob import TextBlob
+import nlp_registry
+from emotion import detect_emotion
 import requests
 import string
 from twilio.rest import Client
 from dotenv import load_dotenv
 from fastapi import FastAPI, BackgroundTasks
+import llm_client
 
 load_dotenv()
 
@@ -21,16 +22,13 @@ load_dotenv()
 app = FastAPI(title="AI Sales ", description="Voice-enabled Sales Agent", version="1.0")
 
 # --- NLP + TTS + Models ---
-nlp = spacy.load("en_core_web_sm")
+# loaded on first use and shared by every router (see nlp_registry)
+nlp = nlp_registry.lazy("en_core_web_sm")
 
 # Ollama text generation (fallback)
-def ai_response(prompt, model_name="phi3:mini"):
+def ai_response(prompt, model_name=llm_client.CHAT_MODEL):
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": model_name, "prompt": prompt}
-        )
-        return response.json()["response"].strip()
+        return llm_client.generate(prompt, model=model_name)
     except Exception as e:
         print("Ollama Error:", e)
         return "I'm sorry, I didn't catch that."
@@ -96,15 +94,6 @@ def listen(source, lang="en-IN"):
         return "No response"
 
 
-# --- SENTIMENT / EMOTION ---
-def detect_emotion(text):
-    blob = TextBlob(text)
-    s = blob.sentiment.polarity
-    if s > 0.3:
-        return "happy"
-    elif s < -0.3:
-        return "angry"
-    return "neutral"
 
 
 # --- LOAD PRODUCTS ---
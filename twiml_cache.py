@@ -0,0 +1,78 @@
+import threading
+from xml.sax.saxutils import escape
+
+# Pre-rendered TwiML for static prompts.
+# Building a VoiceResponse/Gather tree and serializing it costs far more
+# than the webhook's own logic. Most replies are fixed strings (greeting,
+# retry chain, offers, product listing), so each one is rendered once with
+# a placeholder action URL and kept as byte chunks; a request only joins
+# the chunks around its own (escaped) action URL.
+
+ACTION_SLOT = "__ACTION_URL__"
+# templates remembered on first use (on top of the warmed ones)
+MAX_TEMPLATES = 512
+
+
+class TwimlCache:
+    def __init__(self, builder, name="twiml", max_size=MAX_TEMPLATES):
+        """builder(text, action_url, **opts) -> TwiML string"""
+        self.builder = builder
+        self.name = name
+        self.max_size = max_size
+        self._templates = {}     # (text, opts) -> tuple of byte chunks
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text, opts):
+        return (text, tuple(sorted(opts.items())))
+
+    def _compile(self, text, opts):
+        xml = self.builder(text, ACTION_SLOT, **opts)
+        return tuple(part.encode("utf-8") for part in xml.split(ACTION_SLOT))
+
+    def warm(self, texts, **opts):
+        """Pre-render static responses (startup / after a catalog reload)."""
+        compiled = {self._key(t, opts): self._compile(t, opts) for t in texts if t}
+        with self._lock:
+            self._templates.update(compiled)
+        return len(compiled)
+
+    def render(self, text, action_url=None, static=False, **opts):
+        """
+        TwiML bytes for text. static=True remembers the template for next
+        time; dynamic text (LLM replies, names) is built directly.
+        """
+        key = self._key(text, opts)
+        parts = self._templates.get(key)
+        if parts is None:
+            with self._lock:
+                self.misses += 1
+            if not static:
+                return self.builder(text, action_url, **opts).encode("utf-8")
+            parts = self._compile(text, opts)
+            with self._lock:
+                if len(self._templates) < self.max_size:
+                    self._templates[key] = parts
+        else:
+            with self._lock:
+                self.hits += 1
+        if len(parts) == 1:
+            return parts[0]
+        # same escaping the XML serializer would apply to the attribute
+        return escape(action_url or "", {'"': "&quot;"}).encode("utf-8").join(parts)
+
+    def invalidate(self):
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "templates": len(self._templates),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }